@@ -7,7 +7,8 @@ import argparse
 import numpy as np 
 import matplotlib.pyplot as plt 
 from matplotlib import rc 
-from collections import OrderedDict
+from MolSci_analysis.readers import CHUNK_ROWS
+from MolSci_analysis.states import iter_states, count_states, get_flatness, TransitionCounter, CheckpointCounter
 
 def initialize():
     
@@ -16,7 +17,19 @@ def initialize():
         histogram of the discrete collective variables.')
     parser.add_argument('-i',
                         '--dat',
-                        help='The file name of the PLUMED output file.')
+                        nargs='+',
+                        help='The file name(s) of the PLUMED output file(s). The counts of the states \
+                            in multiple files are added up.')
+    parser.add_argument('-c',
+                        '--column',
+                        default='1',
+                        help='The column (python index or name) of the discrete CV. Default: 1.')
+    parser.add_argument('-cr',
+                        '--chunk_rows',
+                        type=int,
+                        default=CHUNK_ROWS,
+                        help='The number of rows of each chunk, in which the files are read and the \
+                            states are counted.')
     parser.add_argument('-x',
                         '--xlabel',
                         help='The name and units of x-axis.')
@@ -30,6 +43,34 @@ def initialize():
                         '--pngname',
                         default='Final_hist_COLVAR.png',
                         help='The filename of the figure.')
+    parser.add_argument('-rt',
+                        '--round_trip',
+                        type=int,
+                        nargs=2,
+                        help='The lower and upper end states of the round trips, e.g. -rt 0 39 for 40 \
+                            states. If specified, the round-trip times (from the lower end state to the \
+                            upper one and back) are analyzed.')
+    parser.add_argument('-tm',
+                        '--transitions',
+                        help='The name of the output file of the transition-count matrix, whose element \
+                            (i, j) is the number of pairs of consecutive frames in states i and j.')
+    parser.add_argument('-dt',
+                        '--dwell_times',
+                        help='The name of the output file of the dwell times, i.e. the state and the \
+                            duration of each complete run of consecutive frames in the same state.')
+    parser.add_argument('-st',
+                        '--stride_time',
+                        type=float,
+                        help='The time between two checkpoints at which the cumulative histogram of \
+                            the states is recorded to track its flatness over time. Multiple input \
+                            files are treated as consecutive parts of one simulation in this case.')
+    parser.add_argument('-fl',
+                        '--flatness',
+                        default='flatness',
+                        help='The prefix of the outputs of the flatness tracking (-st): prefix.dat \
+                            (time, N_ratio, maximum and minimum count at each checkpoint), \
+                            prefix_counts.dat (time and the counts of all states at each checkpoint) \
+                            and prefix.png. Default: flatness.')
 
     args_parse = parser.parse_args()
 
@@ -47,34 +88,70 @@ def main():
 
     args = initialize()
 
-    time, data, counts = [], [], {}
-    infile = open(args.dat)
-    lines = infile.readlines()
-    infile.close
+    # Count the states and their transitions chunk by chunk (counts[i] is the number of frames in state i)
+    counts, t_max = np.zeros(0, dtype=int), 0
+    counter = TransitionCounter(args.round_trip)
+    checkpoints = None if args.stride_time is None else CheckpointCounter(args.stride_time)
+    for fname in args.dat:
+        for time, states in iter_states([fname], args.column, args.chunk_rows):
+            time, states = time[time != 0], states[time != 0]
+            counts = count_states(states, counts)
+            counter.update(time, states)
+            if checkpoints is not None:
+                checkpoints.update(time, states)
+            if len(time) > 0:
+                t_max = max(t_max, np.max(time))
+        counter.end()  # no transitions between the files
 
-    line_n = 0
-    for line in lines:
-        line_n += 1
-        if line[0] != '#':
-            if float(line.split()[0]) != 0:
-                time.append(float(line.split()[0]))
-                data.append(float(line.split()[1]))
-    
-    examined_CV = []
-    for i in data:
-        if i not in examined_CV:
-            examined_CV.append(i)
-            counts[f'{int(i)}'] = data.count(i)
-    counts = OrderedDict(sorted(counts.items()))
+    # Kinetics of the states
+    n_transitions = np.sum(counter.transitions) - np.trace(counter.transitions)
+    print(f'Number of transitions between different states: {n_transitions}')
+    mean_dwell = counter.get_mean_dwell_times()
+    for i in np.flatnonzero(counts):
+        print(f'State {i}: {counts[i]} frames, average dwell time: {mean_dwell[i]:.3f}')
+    if args.round_trip is not None:
+        round_trips = counter.get_round_trips()
+        if len(round_trips) == 0:
+            print('No round trips between states %s and %s were found.' % tuple(args.round_trip))
+        else:
+            print(f'Number of round trips: {len(round_trips)}, average round-trip time: {np.mean(round_trips):.3f}')
+    if args.transitions is not None:
+        np.savetxt(args.transitions, counter.transitions, fmt='%d')
+    if args.dwell_times is not None:
+        dwell_states, dwell_times = counter.get_dwell_times()
+        np.savetxt(args.dwell_times, np.column_stack((dwell_states, dwell_times)), fmt=['%d', '%.6f'],
+                   header='state dwell_time')
+
+    # Flatness of the histogram over time
+    if checkpoints is not None:
+        times, cumulative = checkpoints.get_counts()
+        n_ratio, c_max, c_min = get_flatness(cumulative)
+        np.savetxt(f'{args.flatness}.dat', np.column_stack((times, n_ratio, c_max, c_min)), fmt='%.6f',
+                   header='time N_ratio max_count min_count')
+        np.savetxt(f'{args.flatness}_counts.dat', np.column_stack((times, cumulative)),
+                   fmt=['%.6f'] + ['%d'] * cumulative.shape[1],
+                   header='time ' + ' '.join(f'state_{i}' for i in range(cumulative.shape[1])))
+        fig, axes = plt.subplots(2, 1, sharex=True)
+        axes[0].plot(times / 1000, n_ratio)
+        axes[0].set_ylabel('N_ratio')
+        axes[0].grid()
+        axes[1].plot(times / 1000, c_max, label='Maximum count')
+        axes[1].plot(times / 1000, c_min, label='Minimum count')
+        axes[1].set_xlabel('Time (ns)')
+        axes[1].set_ylabel('Counts')
+        axes[1].legend()
+        axes[1].grid()
+        axes[0].set_title('The flatness of the histogram over time')
+        fig.savefig(f'{args.flatness}.png', dpi=600)
 
     # Plot the final histogram
     plt.figure()
-    plt.bar(list(counts.keys()), height=list(counts.values()))
+    plt.bar(np.arange(len(counts)), height=counts)
     plt.xlabel('States')
     plt.ylabel('Counts')
     plt.minorticks_on()
-    plt.title(f'The final histogram of the simulation (at {max(time) / 1000} ns)')
-    if max(list(counts.values())) >= 10000:
+    plt.title(f'The final histogram of the simulation (at {t_max / 1000} ns)')
+    if np.max(counts, initial=0) >= 10000:
         plt.ticklabel_format(style='sci', axis='y', scilimits=(0, 0))
     plt.grid()
     plt.savefig(args.pngname, dpi=600)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+"""This is a Python script for estimating the correlation times and the
+uncertainties of the averages of the time series in a GROMACS/PLUMED output
+file, using autocorrelation functions and block averaging.
+"""
+import argparse
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib import rc
+from MolSci_analysis.readers import read_columns, resolve_columns
+from MolSci_analysis.correlation import analyze_columns
+
+
+def initialize():
+
+    parser = argparse.ArgumentParser(
+        description='This script computes the autocorrelation functions, the statistical inefficiencies, \
+            the integrated correlation times and the standard errors of the averages (from the \
+            statistical inefficiencies and from block averaging) of the columns of a GROMACS/PLUMED \
+            output file.')
+    parser.add_argument('-f',
+                        '--dat',
+                        help='The name of the input file, whose first column is the time.')
+    parser.add_argument('-c',
+                        '--columns',
+                        nargs='+',
+                        help='The columns (python indices or names) to be analyzed. Default: all the \
+                            columns except the first one.')
+    parser.add_argument('-b',
+                        '--begin',
+                        type=float,
+                        help='The first time (in the units of the input file) to be analyzed.')
+    parser.add_argument('-e',
+                        '--end',
+                        type=float,
+                        help='The last time (in the units of the input file) to be analyzed.')
+    parser.add_argument('-s',
+                        '--stride',
+                        type=int,
+                        default=1,
+                        help='Only every stride-th row is analyzed. Default: 1.')
+    parser.add_argument('-ml',
+                        '--max_lag',
+                        type=int,
+                        default=1000,
+                        help='The maximum lag (in frames) of the autocorrelation functions to be \
+                            plotted. Default: 1000.')
+    parser.add_argument('-j',
+                        '--jobs',
+                        type=int,
+                        default=1,
+                        help='The number of worker processes analyzing the columns in parallel.')
+    parser.add_argument('-n',
+                        '--pngname',
+                        default='acf',
+                        help='The filename of the figure of the autocorrelation functions, not \
+                            including the extension.')
+
+    args_parse = parser.parse_args()
+
+    return args_parse
+
+
+def main():
+    rc('font', **{
+        'family': 'sans-serif',
+        'sans-serif': ['DejaVu Sans'],
+        'size': 10
+    })
+    # Set the font used for MathJax - more on this later
+    rc('mathtext', **{'default': 'regular'})
+    plt.rc('font', family='serif')
+
+    args = initialize()
+
+    columns = None if args.columns is None else [0] + args.columns
+    data, header = read_columns(args.dat, columns=columns, begin=args.begin, end=args.end, stride=args.stride)
+    if header['fields']:
+        indices = range(1, len(header['fields'])) if args.columns is None else \
+            resolve_columns(args.columns, header['fields'])
+        names = [header['fields'][i] for i in indices]
+    else:
+        names = args.columns or ['column %s' % i for i in range(1, data.shape[1])]
+    time = data[:, 0]
+    dt = np.median(np.diff(time)) if len(time) > 1 else 1.0
+    results = analyze_columns(data[:, 1:], dt, args.max_lag, args.jobs)
+
+    result_str = 'Data analysis of the file %s:' % args.dat
+    print(result_str)
+    print('=' * len(result_str))
+    print('The time between two frames: %s' % dt)
+    for name, r in zip(names, results):
+        line = '%s: average %.5g +/- %.2g (block averaging: +/- %.2g), ' % (
+            name, r['mean'], r['error'], r['error_block'])
+        line += 'statistical inefficiency %.3f, integrated correlation time %.5g, %.1f effective samples' % (
+            r['g'], r['tau'], r['n_eff'])
+        print(line)
+
+    plt.figure()
+    for name, r in zip(names, results):
+        plt.plot(np.arange(len(r['acf'])) * dt, r['acf'], label=name)
+    plt.xlabel('Lag time')
+    plt.ylabel('Autocorrelation function')
+    plt.title('Autocorrelation functions')
+    plt.legend(ncol=2)
+    plt.grid()
+    plt.savefig('%s.png' % args.pngname)
+    plt.show()
@@ -4,6 +4,8 @@ import argparse
 import numpy as np
 import matplotlib.pyplot as plt 
 from matplotlib import rc
+from MolSci_analysis.hills import load_hills
+from MolSci_analysis.readers import find_walkers, read_columns
 
 def initialize():
 
@@ -11,9 +13,19 @@ def initialize():
         description='This script plot the bias as a function of time for MetaD-EXE.')
     parser.add_argument('--hills',
                         help='The name of PLUMED HILLS file.')
+    parser.add_argument('-w',
+                        '--walkers',
+                        action='store_true',
+                        help='Whether the HILLS files were written by multiple walkers, in which case \
+                            the files named by the --hills argument followed by the walker IDs (e.g. \
+                            HILLS.0, HILLS.1, ...) are read one by one and plotted as one curve per \
+                            walker. Default: HILLS.')
     
     args_parse = parser.parse_args()
 
+    if args_parse.walkers is True and args_parse.hills is None:
+        args_parse.hills = 'HILLS'
+
     if args_parse.hills is None:
         for file in os.listdir('.'):
             if 'HILLS' in file:
@@ -34,18 +46,21 @@ def main():
     args = initialize()
 
     # First parse the PLUMED HILLS file
-    t1, h = [], []
-    infile = open(args.hills)
-    lines = infile.readlines()
-    infile.close()
-
-    for line in lines:
-        if line[0] != '#':
-            t1.append(float(line.split()[0])) # ps
-            h.append(float(line.split()[3]))
-
     plt.figure()
-    plt.plot(np.array(t1)/1000, h)
+    if args.walkers is True:
+        walkers, fnames = find_walkers(args.hills)
+        if len(fnames) == 0:
+            print('No HILLS files of multiple walkers (%s.0, %s.1, ...) found!' % (args.hills, args.hills))
+            return
+        for w, fname in zip(walkers, fnames):
+            data = read_columns(fname, columns=['time', 'height'])[0]  # only one walker in memory at a time
+            t1, h = data[:, 0], data[:, 1]  # ps
+            plt.plot(np.array(t1)/1000, h, label='Walker %s' % w)
+        plt.legend(ncol=2)
+    else:
+        hills = load_hills(args.hills)
+        t1, h = hills['time'], hills['height']  # ps
+        plt.plot(np.array(t1)/1000, h)
     plt.xlabel('Time (ns)')
     plt.ylabel('Height of the Gaussian biasing potential')
     plt.title('Height of the biasing potential as function of time')
@@ -0,0 +1,177 @@
+"""
+cache.py
+Binary cache of the parsed columns of GROMACS/PLUMED output files.
+
+The parsed (and restart-merged) columns of a file are saved as an .npz file
+in a cache directory, so that later analyses of the same file do not need to
+parse the text again. The cache directory and its maximum size can be set by
+the environment variables MOLSCI_CACHE_DIR (default: ~/.cache/MolSci_analysis)
+and MOLSCI_CACHE_SIZE (in bytes, default: 4 GB). Setting MOLSCI_CACHE_SIZE to
+0 disables the cache. When the cache exceeds its maximum size, the least
+recently used entries are removed. An entry records the byte offset up to
+which the file was parsed, so that the entry of a file that has grown by
+appends can be extended by parsing only the new bytes.
+"""
+import os
+import json
+import hashlib
+import tempfile
+import numpy as np
+
+CACHE_SIZE = 4 * 1024 ** 3  # default maximum size of the cache in bytes
+HASH_SIZE = 2 ** 20  # number of bytes hashed at the beginning and the end of the file
+
+
+def get_cache_dir():
+    """
+    Gets the cache directory.
+
+    Returns
+    -------
+    cache_dir (str): The path of the cache directory.
+    """
+    default = os.path.join(os.path.expanduser('~'), '.cache', 'MolSci_analysis')
+    return os.environ.get('MOLSCI_CACHE_DIR', default)
+
+
+def get_cache_size():
+    """
+    Gets the maximum size of the cache.
+
+    Returns
+    -------
+    max_size (int): The maximum size of the cache in bytes. 0 means that the
+        cache is disabled.
+    """
+    return int(os.environ.get('MOLSCI_CACHE_SIZE', CACHE_SIZE))
+
+
+def content_hash(fname, end=None):
+    """
+    Hashes the first and the last HASH_SIZE bytes of a file (or of its first
+    end bytes). Together with the size and the modification time of the file,
+    this identifies the content of a (possibly huge) file without reading all
+    of it. Hashing the first end bytes allows checking whether a file has only
+    been appended to since it was parsed.
+
+    Parameters
+    ----------
+    fname (str): The name of the file.
+    end (int): The number of bytes at the beginning of the file to be
+        considered. If None, the whole file is considered.
+
+    Returns
+    -------
+    digest (str): The hexadecimal SHA-1 digest.
+    """
+    h = hashlib.sha1()
+    size = os.path.getsize(fname) if end is None else end
+    with open(fname, 'rb') as f:
+        h.update(f.read(min(size, HASH_SIZE)))
+        if size > HASH_SIZE:
+            start = max(size - HASH_SIZE, HASH_SIZE)
+            f.seek(start)
+            h.update(f.read(size - start))
+
+    return h.hexdigest()
+
+
+def get_key(fname, *args):
+    """
+    Gets the cache key of a file, which depends on its path and on how the
+    file is parsed. The size, the modification time and the content hash of
+    the file are saved with the entry and checked when it is loaded, so that
+    an entry of a file which has only been appended to can be extended
+    instead of being replaced.
+
+    Parameters
+    ----------
+    fname (str): The name of the file.
+    *args: Any other parameters affecting the parsed results (e.g. the
+        requested columns).
+
+    Returns
+    -------
+    key (str): The cache key.
+    """
+    info = [os.path.abspath(fname)] + [repr(a) for a in args]
+
+    return hashlib.sha1(json.dumps(info).encode()).hexdigest()
+
+
+def load(key):
+    """
+    Loads a cache entry and marks it as recently used.
+
+    Parameters
+    ----------
+    key (str): The cache key.
+
+    Returns
+    -------
+    arrays (dict): The arrays of the cache entry, or None if the entry does
+        not exist (or can not be read).
+    meta (dict): The metadata of the cache entry, or None.
+    """
+    if get_cache_size() <= 0:
+        return None, None
+    path = os.path.join(get_cache_dir(), '%s.npz' % key)
+    try:
+        with np.load(path) as f:
+            arrays = {k: f[k] for k in f.files if k != '_meta'}
+            meta = json.loads(str(f['_meta']))
+        os.utime(path)  # for LRU eviction
+    except (OSError, ValueError, KeyError):
+        return None, None
+
+    return arrays, meta
+
+
+def save(key, arrays, meta):
+    """
+    Saves a cache entry and evicts the least recently used entries if the
+    cache gets too large. Failures (e.g. a read-only file system) are ignored
+    since the cache is only an optimization.
+
+    Parameters
+    ----------
+    key (str): The cache key.
+    arrays (dict): The arrays to be saved.
+    meta (dict): The metadata to be saved, which must be JSON serializable.
+    """
+    max_size = get_cache_size()
+    if max_size <= 0:
+        return
+    cache_dir = get_cache_dir()
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, _meta=np.array(json.dumps(meta)), **arrays)
+        os.replace(tmp, os.path.join(cache_dir, '%s.npz' % key))
+        evict(max_size)
+    except OSError:
+        pass
+
+
+def evict(max_size):
+    """
+    Removes the least recently used cache entries until the total size of the
+    cache is no larger than max_size.
+
+    Parameters
+    ----------
+    max_size (int): The maximum size of the cache in bytes.
+    """
+    cache_dir = get_cache_dir()
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith('.npz'):
+            stat = os.stat(os.path.join(cache_dir, name))
+            entries.append((stat.st_mtime, stat.st_size, name))
+    total = sum(e[1] for e in entries)
+    for _, size, name in sorted(entries):
+        if total <= max_size:
+            break
+        os.remove(os.path.join(cache_dir, name))
+        total -= size
@@ -0,0 +1,227 @@
+"""
+correlation.py
+Uncertainties of the averages of correlated time series, such as the CVs in
+a PLUMED COLVAR file or the energies in a GROMACS .xvg file.
+
+The normalized autocorrelation function C(t) is computed by FFT in
+O(n log n), from which the statistical inefficiency g = 1 + 2 sum_t (1 - t/n)
+C(t) is obtained by summing C(t) up to its first non-positive value (as
+pymbar does). The integrated correlation time is (g - 1) / 2 in units of the
+time between frames, and the standard error of the average is
+std * sqrt(g / n).
+
+Independently of C(t), the standard error is also estimated by block
+averaging (Flyvbjerg and Petersen, J. Chem. Phys. 1989, 91, 461): the time
+series is repeatedly coarsened by averaging pairs of neighbouring blocks, and
+the standard error of the average computed from the block averages reaches a
+plateau once the blocks are longer than the correlation time. The blocking
+only needs O(log n) memory, so it is done chunk by chunk (see BlockAverager)
+and also works in the out-of-core mode of the scripts.
+"""
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from MolSci_analysis.stats import RunningStats
+
+MIN_BLOCKS = 16  # minimum number of blocks of a level of block averaging used for the standard error
+
+
+def autocorrelation(y, max_lag=None):
+    """
+    Computes the normalized autocorrelation function of a time series by FFT.
+    The autocovariance at lag t is averaged over the n - t pairs of frames.
+
+    Parameters
+    ----------
+    y (np.ndarray): The time series.
+    max_lag (int): The maximum lag (in frames). If None, all the lags up to
+        n - 1 are returned.
+
+    Returns
+    -------
+    acf (np.ndarray): The autocorrelation function, with acf[0] = 1. It is 1
+        at all lags for a constant time series.
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    max_lag = n - 1 if max_lag is None else min(max_lag, n - 1)
+    if n == 0 or np.ptp(y) == 0:
+        return np.ones(max_lag + 1)
+    size = 2 ** int(np.ceil(np.log2(2 * n - 1)))  # zero padding against the circular correlation
+    f = np.fft.rfft(y - np.mean(y), size)
+    acov = np.fft.irfft(f * np.conj(f), size)[:max_lag + 1] / (n - np.arange(max_lag + 1))
+
+    return acov / acov[0]
+
+
+def statistical_inefficiency(acf, n):
+    """
+    Computes the statistical inefficiency from the autocorrelation function,
+    summed up to (and excluding) its first non-positive value.
+
+    Parameters
+    ----------
+    acf (np.ndarray): The autocorrelation function (see autocorrelation).
+    n (int): The number of frames of the time series.
+
+    Returns
+    -------
+    g (float): The statistical inefficiency, which is at least 1.
+    """
+    t = np.arange(1, len(acf))
+    positive = acf[1:] > 0
+    cut = np.argmin(positive) if not np.all(positive) else len(t)
+    g = 1 + 2 * np.sum((1 - t[:cut] / n) * acf[1:cut + 1])
+
+    return max(g, 1.0)
+
+
+class BlockAverager:
+    """
+    Accumulates block averaging of a time series chunk by chunk. Level k
+    holds the averages of blocks of 2^k frames, whose statistics are kept by
+    a RunningStats (see stats.py), and a leftover block waiting for its
+    neighbour is carried over to the next chunk.
+
+    Attributes
+    ----------
+    levels (list of RunningStats): The statistics of the block averages of
+        each level.
+    """
+    def __init__(self):
+        self.levels = []
+        self._carry = []
+
+    def update(self, y):
+        """
+        Adds a chunk of the time series.
+
+        Parameters
+        ----------
+        y (np.ndarray): The chunk, in the order of time.
+
+        Returns
+        -------
+        self (BlockAverager): The updated accumulator.
+        """
+        blocks, k = np.asarray(y, dtype=float), 0
+        while len(blocks) > 0:
+            if k == len(self.levels):
+                self.levels.append(RunningStats())
+                self._carry.append(np.zeros(0))
+            self.levels[k].update(blocks)
+            pending = np.concatenate((self._carry[k], blocks))
+            m = len(pending) // 2 * 2
+            self._carry[k] = pending[m:]
+            blocks = (pending[0:m:2] + pending[1:m:2]) / 2
+            k += 1
+
+        return self
+
+    def get_errors(self):
+        """
+        Gets the standard error of the average estimated at each level.
+
+        Returns
+        -------
+        sizes (np.ndarray): The number of frames of the blocks of each level.
+        errors (np.ndarray): The standard error of the average at each level.
+        errors_err (np.ndarray): The uncertainty of each standard error.
+        """
+        n = np.array([level.n for level in self.levels], dtype=float)
+        var = np.array([level.m2 for level in self.levels]) / n
+        with np.errstate(divide='ignore', invalid='ignore'):
+            errors = np.sqrt(var / (n - 1))
+            errors_err = errors / np.sqrt(2 * (n - 1))
+
+        return 2 ** np.arange(len(n)), errors, errors_err
+
+    def get_error(self):
+        """
+        Gets the standard error of the average at the plateau of block
+        averaging, i.e. at the first level whose estimate agrees with that of
+        the next level within its uncertainty. Only the levels with at least
+        MIN_BLOCKS blocks are considered, and the last of them is used if no
+        plateau is found.
+
+        Returns
+        -------
+        error (float): The standard error of the average, which is NaN if the
+            time series is too short.
+        """
+        sizes, errors, errors_err = self.get_errors()
+        usable = [k for k, level in enumerate(self.levels) if level.n >= MIN_BLOCKS]
+        if len(usable) == 0:
+            return np.nan
+        for k in usable[:-1]:
+            if errors[k + 1] - errors[k] < errors_err[k]:
+                return errors[k]
+
+        return errors[usable[-1]]
+
+
+def analyze_column(y, dt=1.0, max_lag=None):
+    """
+    Computes the uncertainty of the average of a time series.
+
+    Parameters
+    ----------
+    y (np.ndarray): The time series.
+    dt (float): The time between two frames.
+    max_lag (int): The maximum lag (in frames) of the returned
+        autocorrelation function. The statistical inefficiency is always
+        computed from the full autocorrelation function.
+
+    Returns
+    -------
+    results (dict): A dictionary with the following keys
+        - mean (float): The average.
+        - std (float): The standard deviation.
+        - g (float): The statistical inefficiency.
+        - tau (float): The integrated correlation time, in the units of dt.
+        - n_eff (float): The number of effectively uncorrelated frames.
+        - error (float): The standard error of the average from g.
+        - error_block (float): The standard error of the average from block
+          averaging.
+        - acf (np.ndarray): The autocorrelation function up to max_lag.
+    """
+    y = np.asarray(y, dtype=float)
+    acf = autocorrelation(y)
+    g = statistical_inefficiency(acf, len(y))
+    stats = RunningStats().update(y)
+    results = {
+        'mean': stats.mean,
+        'std': stats.std,
+        'g': g,
+        'tau': (g - 1) / 2 * dt,
+        'n_eff': len(y) / g,
+        'error': stats.std * np.sqrt(g / len(y)) if len(y) > 0 else np.nan,
+        'error_block': BlockAverager().update(y).get_error(),
+        'acf': acf if max_lag is None else acf[:max_lag + 1]
+    }
+
+    return results
+
+
+def analyze_columns(data, dt=1.0, max_lag=None, jobs=1):
+    """
+    Computes the uncertainties of the averages of multiple time series, in
+    parallel over the columns if jobs > 1.
+
+    Parameters
+    ----------
+    data (np.ndarray): The time series, with shape (n_frames, n_columns).
+    dt (float): The time between two frames.
+    max_lag (int): The maximum lag of the returned autocorrelation functions.
+    jobs (int): The number of worker processes.
+
+    Returns
+    -------
+    results (list of dict): The results of each column (see analyze_column).
+    """
+    columns = [np.ascontiguousarray(data[:, i]) for i in range(data.shape[1])]
+    n = len(columns)
+    if jobs > 1 and n > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            return list(pool.map(analyze_column, columns, [dt] * n, [max_lag] * n))
+
+    return [analyze_column(y, dt, max_lag) for y in columns]
@@ -0,0 +1,289 @@
+"""
+fes.py
+Reconstruction of free energy surfaces from the Gaussians of a MetaD
+simulation, which does what "plumed sum_hills" does with NumPy.
+
+The Gaussians are deposited on a regular grid in batches. Each Gaussian only
+touches the grid points within a cutoff (in units of its width) from its
+center, and the contributions of a whole batch are summed onto the grid by
+one call of np.bincount, so no Python loop over the Gaussians or the grid
+points is needed. The batch size is chosen such that the temporary arrays
+of a batch have at most BATCH_SIZE elements, so the memory does not grow
+with the number of Gaussians.
+
+For a periodic CV (e.g. a torsion angle whose domain is given by the "#! SET
+min_" and "#! SET max_" lines of the HILLS file), the grid covers the domain
+and the grid indices touched by a Gaussian are wrapped around the domain,
+so the Gaussians near the boundaries are not cut off and no image copies of
+the Gaussians are needed.
+"""
+import numpy as np
+
+CUTOFF = np.sqrt(2 * 6.25)  # in units of sigma, same as the default of PLUMED
+BATCH_SIZE = 2 ** 21  # maximum number of (Gaussian, grid point) pairs in a batch
+
+
+def get_grid(hills, nbins, lower=None, upper=None, cutoff=CUTOFF):
+    """
+    Gets the grid points of the CVs. By default, the grid of a non-periodic
+    CV covers the centers of all the Gaussians plus the cutoff of the widest
+    Gaussian. The grid of a periodic CV always covers its domain, excluding
+    the upper bound (which is the same point as the lower bound).
+
+    Parameters
+    ----------
+    hills (dict): The Gaussians returned by hills.load_hills. The periodic
+        domains of the CVs are given by hills['periodic'] (if any).
+    nbins (int or list of int): The number of grid points of each CV.
+    lower (list of float): The lower bound of each non-periodic CV. If None,
+        the lower bounds are determined from the Gaussians.
+    upper (list of float): The upper bound of each non-periodic CV. If None,
+        the upper bounds are determined from the Gaussians.
+    cutoff (float): The cutoff of the Gaussians in units of their widths.
+
+    Returns
+    -------
+    grid (list of np.ndarray): The grid points of each CV.
+    """
+    n_cvs = hills['center'].shape[1]
+    nbins = [nbins] * n_cvs if np.isscalar(nbins) else list(nbins)
+    width = cutoff * np.max(hills['sigma'], axis=0)
+    if lower is None:
+        lower = np.min(hills['center'], axis=0) - width
+    if upper is None:
+        upper = np.max(hills['center'], axis=0) + width
+    grid = []
+    for d, domain in enumerate(get_periodic(hills)):
+        if domain is None:
+            grid.append(np.linspace(lower[d], upper[d], nbins[d]))
+        else:
+            grid.append(domain[0] + np.arange(nbins[d]) * (domain[1] - domain[0]) / nbins[d])
+
+    return grid
+
+
+def get_periodic(hills):
+    """
+    Gets the periodic domains of the CVs of the Gaussians.
+
+    Parameters
+    ----------
+    hills (dict): The Gaussians returned by hills.load_hills.
+
+    Returns
+    -------
+    periodic (list): The lower and upper bounds of each periodic CV, or None
+        for each non-periodic CV.
+    """
+    return hills.get('periodic') or [None] * hills['center'].shape[1]
+
+
+def get_heights(hills, bias=False):
+    """
+    Gets the heights of the Gaussians to be summed. For well-tempered MetaD,
+    PLUMED writes the heights multiplied by biasf / (biasf - 1) to the HILLS
+    file, so that the sum of the Gaussians is the negative of the free
+    energy. The heights of the bias potential are therefore obtained by
+    multiplying them by (biasf - 1) / biasf.
+
+    Parameters
+    ----------
+    hills (dict): The Gaussians returned by hills.load_hills.
+    bias (bool): Whether to get the heights of the bias potential rather than
+        those of the negative free energy.
+
+    Returns
+    -------
+    heights (np.ndarray): The heights of the Gaussians.
+    """
+    heights = hills['height']
+    if bias:
+        biasf = hills['biasf']
+        heights = heights * np.where(biasf > 1, (biasf - 1) / biasf, 1)
+
+    return heights
+
+
+def deposit(values, grid, center, sigma, height, cutoff=CUTOFF, periodic=None, rows=None):
+    """
+    Adds Gaussians to the values on a grid (in place).
+
+    Parameters
+    ----------
+    values (np.ndarray): The values on the grid, with one dimension per CV.
+    grid (list of np.ndarray): The (evenly spaced) grid points of each CV.
+    center (np.ndarray): The centers of the Gaussians, with shape
+        (n_hills, n_cvs).
+    sigma (np.ndarray): The widths of the Gaussians, with shape
+        (n_hills, n_cvs).
+    height (np.ndarray): The heights of the Gaussians, with shape (n_hills,).
+    cutoff (float): The cutoff of the Gaussians in units of their widths.
+    periodic (list of bool): Whether each CV is periodic, in which case the
+        grid should cover its domain (see get_grid). If None, all the CVs are
+        non-periodic.
+    rows (np.ndarray): The index of the grid that each Gaussian is added to,
+        in which case values is a stack of grids with shape (n_grids, ...).
+        If None, values is a single grid.
+    """
+    if len(height) == 0:
+        return
+    if sigma.shape != center.shape:
+        raise ValueError('Multivariate Gaussians are not supported.')
+    n_cvs = len(grid)
+    periodic = [False] * n_cvs if periodic is None else periodic
+    shape = tuple(len(g) for g in grid)
+    spacing = np.array([g[1] - g[0] if len(g) > 1 else 1.0 for g in grid])
+    origin = np.array([g[0] for g in grid])
+    half = np.ceil(cutoff * np.max(sigma, axis=0) / spacing).astype(int)  # in grid points
+    offsets = [np.arange(-h, h + 1) for h in half]
+    batch = max(BATCH_SIZE // int(np.prod([len(o) for o in offsets])), 1)
+
+    for i in range(0, len(height), batch):
+        c, s, h = center[i:i + batch], sigma[i:i + batch], height[i:i + batch]
+        n = len(h)
+        nearest = np.rint((c - origin) / spacing).astype(int)
+        for d in range(n_cvs):
+            # Grid points around the centers along CV d, with shape (n, m_d). The
+            # Gaussians are separable, so only n * m_d exponentials are computed.
+            idx = nearest[:, d, None] + offsets[d]
+            z2_d = ((origin[d] + idx * spacing[d] - c[:, d, None]) / s[:, d, None]) ** 2
+            g_d = np.exp(-0.5 * z2_d)
+            if periodic[d]:
+                idx %= shape[d]  # wrap around the domain
+            else:
+                g_d *= (idx >= 0) & (idx < shape[d])
+                idx = np.clip(idx, 0, shape[d] - 1)  # with zero weights if outside the grid
+            # Outer sums/products with the previous CVs, with shape (n, m_0, ..., m_d)
+            expand = (n,) + (1,) * d + (len(offsets[d]),)
+            if d == 0:
+                flat, z2, weights = idx, z2_d, g_d * h[:, None]
+            else:
+                flat = flat[..., None] * shape[d] + idx.reshape(expand)
+                z2 = z2[..., None] + z2_d.reshape(expand)
+                weights = weights[..., None] * g_d.reshape(expand)
+        weights *= z2 < cutoff ** 2
+        if rows is not None:
+            flat = flat + (rows[i:i + batch] * int(np.prod(shape))).reshape((n,) + (1,) * n_cvs)
+        values += np.bincount(flat.reshape(-1), weights=weights.reshape(-1),
+                              minlength=values.size).reshape(values.shape)
+
+
+def sum_hills(hills, grid, cutoff=CUTOFF, bias=False, start=0, stop=None, values=None):
+    """
+    Sums the Gaussians on a grid.
+
+    Parameters
+    ----------
+    hills (dict): The Gaussians returned by hills.load_hills. The CVs with
+        periodic domains (see get_periodic) are treated as periodic.
+    grid (list of np.ndarray): The grid points of each CV (see get_grid).
+    cutoff (float): The cutoff of the Gaussians in units of their widths.
+    bias (bool): Whether to sum the bias potential rather than the negative
+        of the free energy. See get_heights.
+    start (int): The first Gaussian to be summed.
+    stop (int): The Gaussian after the last one to be summed. If None, the
+        Gaussians until the last one are summed.
+    values (np.ndarray): The values on the grid to which the Gaussians are
+        added. If None, the Gaussians are added to zeros.
+
+    Returns
+    -------
+    values (np.ndarray): The sum of the Gaussians on the grid, with shape
+        (n_1, ..., n_cvs), where n_d is the number of grid points of CV d.
+    """
+    if values is None:
+        values = np.zeros(tuple(len(g) for g in grid))
+    heights = get_heights(hills, bias)
+    periodic = [domain is not None for domain in get_periodic(hills)]
+    deposit(values, grid, hills['center'][start:stop], hills['sigma'][start:stop], heights[start:stop], cutoff,
+            periodic)
+
+    return values
+
+
+def iter_slices(hills, grid, stride_time, cutoff=CUTOFF, bias=False):
+    """
+    Sums the Gaussians on a grid incrementally in time slices, which is useful
+    for checking the convergence of the free energy surface. The sum on the
+    grid is kept between the slices and only the Gaussians deposited since
+    the previous slice are added, so the cost of each slice is proportional
+    to the number of new Gaussians rather than the number of all Gaussians
+    deposited so far.
+
+    Parameters
+    ----------
+    hills (dict): The Gaussians returned by hills.load_hills, in the order of
+        time.
+    grid (list of np.ndarray): The grid points of each CV (see get_grid).
+    stride_time (float): The time between two slices.
+    cutoff (float): The cutoff of the Gaussians in units of their widths.
+    bias (bool): Whether to sum the bias potential rather than the negative
+        of the free energy. See get_heights.
+
+    Yields
+    ------
+    time (float): The time of the slice. The last slice includes all the
+        Gaussians.
+    values (np.ndarray): The sum of the Gaussians deposited up to the time of
+        the slice. The same array is updated for the next slice, so it should
+        be copied if it is to be kept.
+    """
+    values = np.zeros(tuple(len(g) for g in grid))
+    time = hills['time']
+    if len(time) == 0:
+        return
+    times = np.arange(time[0] + stride_time, time[-1], stride_time)
+    stops = np.searchsorted(time, times, side='right')
+    start = 0
+    for t, stop in zip(list(times) + [time[-1]], list(stops) + [len(time)]):
+        sum_hills(hills, grid, cutoff, bias, start, stop, values)
+        start = stop
+        yield t, values
+
+
+def get_slices(hills, grid, stride_time, cutoff=CUTOFF, bias=False):
+    """
+    Gets the free energy surfaces of all the time slices (see iter_slices).
+
+    Parameters
+    ----------
+    hills (dict): The Gaussians returned by hills.load_hills, in the order of
+        time.
+    grid (list of np.ndarray): The grid points of each CV (see get_grid).
+    stride_time (float): The time between two slices.
+    cutoff (float): The cutoff of the Gaussians in units of their widths.
+    bias (bool): Whether to get the bias potential rather than the free
+        energy.
+
+    Returns
+    -------
+    times (np.ndarray): The times of the slices.
+    slices (np.ndarray): The stacked free energy surfaces (or the bias), with
+        shape (n_slices, n_1, ..., n_cvs).
+    """
+    times, slices = [], []
+    for t, values in iter_slices(hills, grid, stride_time, cutoff, bias):
+        times.append(t)
+        slices.append(values.copy() if bias else get_fes(values))
+
+    return np.array(times), np.array(slices)
+
+
+def get_fes(values):
+    """
+    Gets the free energy surface from the sum of the Gaussians (see
+    sum_hills), shifted such that its minimum is 0.
+
+    Parameters
+    ----------
+    values (np.ndarray): The sum of the Gaussians on the grid.
+
+    Returns
+    -------
+    fes (np.ndarray): The free energy on the grid.
+    """
+    fes = -values
+    if fes.size > 0:
+        fes -= np.min(fes)
+
+    return fes
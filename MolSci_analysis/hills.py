@@ -0,0 +1,157 @@
+"""
+hills.py
+Loader of the HILLS files written by the METAD action of PLUMED.
+
+A HILLS file has the following columns (as given by its "#! FIELDS" line):
+time, the centers of the Gaussians in each CV, the widths (sigma_*) of the
+Gaussians, the height and (for well-tempered MetaD) the bias factor. The
+columns are located by their names rather than by their positions, so the
+same loader works for any number of CVs. The numeric data is parsed in bulk
+by the shared reader (see readers.py), which also handles restarts and
+caches the parsed results.
+"""
+import numpy as np
+from MolSci_analysis.readers import read_columns, read_header, merge_walkers, get_domain
+
+
+def get_layout(fields):
+    """
+    Locates the columns of a HILLS file from the names in its "#! FIELDS" line.
+
+    Parameters
+    ----------
+    fields (list of str): The names in the "#! FIELDS" line.
+
+    Returns
+    -------
+    layout (dict): A dictionary with the following keys
+        - cvs (list of str): The names of the CVs.
+        - time (int): The column index of the time.
+        - center (list of int): The column indices of the centers.
+        - sigma (list of int): The column indices of the widths. For a
+          multivariate HILLS file, these are the elements of the lower
+          triangle of the covariance matrix.
+        - height (int): The column index of the height.
+        - biasf (int): The column index of the bias factor, or None if the
+          column is absent.
+        - multivariate (bool): Whether the Gaussians are multivariate.
+    """
+    if 'time' not in fields or 'height' not in fields:
+        raise ValueError('The FIELDS of a HILLS file should include time and height: %s' % ' '.join(fields))
+    sigma = [i for i, name in enumerate(fields) if name.startswith('sigma_')]
+    if len(sigma) == 0:
+        raise ValueError('No sigma_ columns found in the FIELDS of the HILLS file: %s' % ' '.join(fields))
+    center = list(range(fields.index('time') + 1, sigma[0]))
+    cvs = [fields[i] for i in center]
+    layout = {
+        'cvs': cvs,
+        'time': fields.index('time'),
+        'center': center,
+        'sigma': sigma,
+        'height': fields.index('height'),
+        'biasf': fields.index('biasf') if 'biasf' in fields else None,
+        'multivariate': len(sigma) != len(cvs)
+    }
+
+    return layout
+
+
+def load_hills(fname, begin=None, end=None, stride=1, use_cache=True):
+    """
+    Loads a PLUMED HILLS file into typed arrays. Multiple walkers writing to
+    the same HILLS file are supported, in which case the rows of different
+    walkers are kept in the order in which they were written.
+
+    Parameters
+    ----------
+    fname (str): The name of the HILLS file.
+    begin (float): The first time to be read. If None, the file is read from
+        the start.
+    end (float): The last time to be read. If None, the file is read until the
+        end.
+    stride (int): Only every stride-th Gaussian is read.
+    use_cache (bool): Whether to use the binary cache of the reader.
+
+    Returns
+    -------
+    hills (dict): A dictionary with the following keys
+        - time (np.ndarray): The deposition times, with shape (n_hills,).
+        - center (np.ndarray): The centers, with shape (n_hills, n_cvs).
+        - sigma (np.ndarray): The widths, with shape (n_hills, n_sigma), where
+          n_sigma is n_cvs unless the Gaussians are multivariate.
+        - height (np.ndarray): The heights, with shape (n_hills,).
+        - biasf (np.ndarray): The bias factors, with shape (n_hills,). The
+          bias factors are 1 if the file has no biasf column.
+        - cvs (list of str): The names of the CVs.
+        - multivariate (bool): Whether the Gaussians are multivariate.
+        - periodic (list): The lower and upper bounds of each periodic CV
+          given by the "#! SET min_" and "#! SET max_" lines, or None for
+          each non-periodic CV.
+        - set (dict): The constants given by the "#! SET" lines (e.g. the
+          periodicity of the CVs).
+    """
+    data, header = read_columns(fname, begin=begin, end=end, stride=stride, use_cache=use_cache)
+
+    return split_columns(data, header)
+
+
+def load_walkers(fnames, walkers=None, begin=None, end=None, stride=1):
+    """
+    Loads the HILLS files of multiple walkers as a single set of Gaussians
+    ordered by their deposition times (see readers.merge_walkers).
+
+    Parameters
+    ----------
+    fnames (list of str): The names of the HILLS files of the walkers, which
+        should have the same FIELDS.
+    walkers (list of int): The walker IDs of the files. If None, the files are
+        numbered from 0.
+    begin (float): The first time to be read. If None, the files are read
+        from the start.
+    end (float): The last time to be read. If None, the files are read until
+        the end.
+    stride (int): Only every stride-th Gaussian of each walker is read.
+
+    Returns
+    -------
+    hills (dict): The Gaussians (see load_hills), with an additional key
+        "walker" giving the walker ID of each Gaussian.
+    """
+    header = read_header(fnames[0])
+    chunks = list(merge_walkers(fnames, walkers=walkers, begin=begin, end=end, stride=stride))
+    data = np.concatenate(chunks) if chunks else np.empty((0, len(header['fields']) + 1))
+    hills = split_columns(data[:, :-1], header)
+    hills['walker'] = data[:, -1].astype(int)
+
+    return hills
+
+
+def split_columns(data, header):
+    """
+    Splits the columns of the data of a HILLS file.
+
+    Parameters
+    ----------
+    data (np.ndarray): All the columns of the HILLS file.
+    header (dict): The header of the HILLS file.
+
+    Returns
+    -------
+    hills (dict): The Gaussians. See load_hills for details.
+    """
+    layout = get_layout(header['fields'])
+    if data.size == 0:
+        data = np.empty((0, len(header['fields'])))
+    hills = {
+        'time': data[:, layout['time']].copy(),
+        'center': data[:, layout['center']],
+        'sigma': data[:, layout['sigma']],
+        'height': data[:, layout['height']].copy(),
+        'biasf': np.ones(len(data)) if layout['biasf'] is None else data[:, layout['biasf']].copy(),
+        'cvs': layout['cvs'],
+        'multivariate': layout['multivariate'],
+        'periodic': [get_domain(header, cv) for cv in layout['cvs']],
+        'set': header['set']
+    }
+
+    return hills
@@ -0,0 +1,406 @@
+"""
+histogram.py
+Histogram engine independent of matplotlib, which bins (optionally weighted)
+data chunk by chunk into a counts buffer.
+
+The bins are evenly spaced, so the bin index of each data point is computed
+arithmetically (and corrected against the bin edges for rounding errors, as
+np.histogram does) and the counts are added up by np.bincount. Like
+np.histogram, the last bin includes its upper edge and the data outside the
+edges is ignored.
+
+For data that does not fit in memory, the number of bins can be chosen
+automatically by the rules of np.histogram (see get_nbins). The quantiles
+needed by the Freedman-Diaconis rule are estimated in one pass by a
+mergeable quantile sketch (see QuantileSketch), so the data never has to be
+held in memory as a whole.
+"""
+import numpy as np
+
+BIN_RULES = ('auto', 'fd', 'sturges')  # rules of the number of bins (see get_nbins)
+SKETCH_SIZE = 4096  # maximum number of values kept at each level of a quantile sketch
+
+
+def get_edges(lower, upper, nbins):
+    """
+    Gets evenly spaced bin edges. As np.histogram does, an empty range is
+    extended by 0.5 on both sides.
+
+    Parameters
+    ----------
+    lower (float): The lower edge of the first bin.
+    upper (float): The upper edge of the last bin.
+    nbins (int): The number of bins.
+
+    Returns
+    -------
+    edges (np.ndarray): The bin edges, with shape (nbins + 1,).
+    """
+    if lower == upper:
+        lower, upper = lower - 0.5, upper + 0.5
+
+    return np.linspace(lower, upper, nbins + 1)
+
+
+def get_nbins(rule, lower, upper, n, iqr=None):
+    """
+    Gets the number of bins by the same rules as np.histogram.
+
+    Parameters
+    ----------
+    rule (str): The rule, which is one of the following
+        - fd: The Freedman-Diaconis rule, with a bin width of
+          2 IQR / n^(1/3).
+        - sturges: The Sturges rule, with log2(n) + 1 bins over the range of
+          the data.
+        - auto: The smaller bin width of the two rules above (or the Sturges
+          rule if the IQR is 0).
+    lower (float): The lower edge of the first bin.
+    upper (float): The upper edge of the last bin.
+    n (int): The number of data points.
+    iqr (float): The interquartile range of the data, which is required by
+        the fd and auto rules.
+
+    Returns
+    -------
+    nbins (int): The number of bins.
+    """
+    if rule not in BIN_RULES:
+        raise ValueError('Unknown rule of the number of bins: %s (should be one of %s)' % (rule, ', '.join(BIN_RULES)))
+    if n == 0 or upper <= lower:
+        return 1
+    sturges = (upper - lower) / (np.log2(n) + 1)
+    fd = 2 * iqr * n ** (-1 / 3) if rule != 'sturges' else 0
+    if rule == 'fd':
+        width = fd
+    elif rule == 'sturges' or fd == 0:
+        width = sturges
+    else:
+        width = min(fd, sturges)
+
+    return max(int(np.ceil((upper - lower) / width)), 1) if width > 0 else 1
+
+
+def get_bin_indices(y, edges):
+    """
+    Computes the bin indices of the data for evenly spaced bin edges.
+
+    Parameters
+    ----------
+    y (np.ndarray): The data.
+    edges (np.ndarray): The evenly spaced bin edges.
+
+    Returns
+    -------
+    indices (np.ndarray): The bin index of each data point, which is -1 for
+        the data outside the edges (or NaN).
+    """
+    nbins = len(edges) - 1
+    y = np.asarray(y, dtype=float)
+    inside = (y >= edges[0]) & (y <= edges[-1])
+    scaled = np.where(inside, (y - edges[0]) * (nbins / (edges[-1] - edges[0])), 0)
+    indices = np.minimum(scaled.astype(int), nbins - 1)
+    # Corrections of rounding errors, such that edges[i] <= y < edges[i + 1]
+    indices -= y < edges[indices]
+    indices += (y >= edges[indices + 1]) & (indices < nbins - 1)
+
+    return np.where(inside, indices, -1)
+
+
+def bin_counts(indices, nbins, weights=None, counts=None):
+    """
+    Adds up the (weighted) counts of the data in each bin.
+
+    Parameters
+    ----------
+    indices (np.ndarray): The bin indices of the data (see get_bin_indices).
+    nbins (int): The number of bins.
+    weights (np.ndarray): The weight of each data point. If None, each data
+        point counts as 1.
+    counts (np.ndarray): The counts buffer, to which the counts are added in
+        place. If None, a new buffer is created.
+
+    Returns
+    -------
+    counts (np.ndarray): The counts buffer.
+    """
+    if counts is None:
+        counts = np.zeros(nbins)
+    valid = indices >= 0
+    if weights is not None:
+        weights = np.asarray(weights, dtype=float)[valid]
+    counts += np.bincount(indices[valid], weights=weights, minlength=nbins)
+
+    return counts
+
+
+def get_ratios(counts, edges, x1, x2):
+    """
+    Computes the ratios of the counts between pairs of bins, which are looked
+    up arithmetically from any x values within the bins (e.g. their centers).
+    The counts of many histograms with the same edges can be queried at once.
+
+    Parameters
+    ----------
+    counts (np.ndarray): The counts, with shape (..., nbins).
+    edges (np.ndarray): The evenly spaced bin edges.
+    x1 (float or np.ndarray): The x values in the bins of the numerators.
+    x2 (float or np.ndarray): The x values in the bins of the denominators.
+
+    Returns
+    -------
+    ratios (np.ndarray): The ratios, with shape (..., n_pairs). The ratios
+        of the pairs with any x value outside the edges are NaN.
+    """
+    i, j = get_bin_indices(np.atleast_1d(x1), edges), get_bin_indices(np.atleast_1d(x2), edges)
+    counts = np.asarray(counts, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratios = counts[..., i] / counts[..., j]
+    ratios[..., (i < 0) | (j < 0)] = np.nan
+
+    return ratios
+
+
+def get_extrema(counts, edges, lower=None, upper=None):
+    """
+    Gets the maximum and the minimum of the counts over the bins whose
+    centers are within a range.
+
+    Parameters
+    ----------
+    counts (np.ndarray): The counts, with shape (..., nbins).
+    edges (np.ndarray): The bin edges.
+    lower (float): The lower bound of the range. If None, the range is not
+        bounded below.
+    upper (float): The upper bound of the range. If None, the range is not
+        bounded above.
+
+    Returns
+    -------
+    c_max (np.ndarray): The maximum, with shape (...). NaN if no bins are in
+        the range.
+    c_min (np.ndarray): The minimum, with shape (...). NaN if no bins are in
+        the range.
+    """
+    centers = (edges[:-1] + edges[1:]) / 2
+    inside = np.ones(len(centers), dtype=bool)
+    if lower is not None:
+        inside &= centers >= lower
+    if upper is not None:
+        inside &= centers <= upper
+    counts = np.asarray(counts, dtype=float)[..., inside]
+    if counts.shape[-1] == 0:
+        return np.full(counts.shape[:-1], np.nan), np.full(counts.shape[:-1], np.nan)
+
+    return np.max(counts, axis=-1), np.min(counts, axis=-1)
+
+
+def get_n_ratio(counts, edges, lower=None, upper=None):
+    """
+    Computes the flatness N_ratio = max / min of the counts over the bins
+    whose centers are within a range (see get_extrema).
+
+    Parameters
+    ----------
+    counts (np.ndarray): The counts, with shape (..., nbins).
+    edges (np.ndarray): The bin edges.
+    lower (float): The lower bound of the range. If None, the range is not
+        bounded below.
+    upper (float): The upper bound of the range. If None, the range is not
+        bounded above.
+
+    Returns
+    -------
+    n_ratio (np.ndarray): The N_ratio, with shape (...). It is inf if any
+        bin in the range is empty.
+    """
+    c_max, c_min = get_extrema(counts, edges, lower, upper)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return c_max / c_min
+
+
+class Histogram:
+    """
+    A histogram with fixed, evenly spaced bin edges that accumulates the
+    counts of the data chunk by chunk. Histograms with the same edges can be
+    merged, so the data of different chunks, files or worker processes can be
+    binned separately and reduced afterwards. Unweighted counts are kept as
+    integers, so the results do not depend on how the data is split.
+
+    Attributes
+    ----------
+    edges (np.ndarray): The bin edges, with shape (nbins + 1,).
+    counts (np.ndarray): The (weighted) counts of the data in each bin.
+    n_outside (int): The number of data points outside the edges (or NaN),
+        which are not counted in any bin.
+    """
+    def __init__(self, edges, counts=None):
+        """
+        Parameters
+        ----------
+        edges (np.ndarray): The evenly spaced bin edges (see get_edges).
+        counts (np.ndarray): The initial counts. If None, the counts are
+            zeros.
+        """
+        self.edges = np.asarray(edges, dtype=float)
+        self.counts = np.zeros(len(self.edges) - 1, dtype=int) if counts is None else np.array(counts)
+        self.n_outside = 0
+
+    @property
+    def nbins(self):
+        return len(self.edges) - 1
+
+    @property
+    def centers(self):
+        return (self.edges[:-1] + self.edges[1:]) / 2
+
+    def update(self, y, weights=None):
+        """
+        Adds the counts of a chunk of data.
+
+        Parameters
+        ----------
+        y (np.ndarray): The data.
+        weights (np.ndarray): The weight of each data point. If None, each
+            data point counts as 1.
+
+        Returns
+        -------
+        self (Histogram): The updated histogram.
+        """
+        indices = get_bin_indices(y, self.edges)
+        if weights is not None and self.counts.dtype.kind != 'f':
+            self.counts = self.counts.astype(float)
+        bin_counts(indices, self.nbins, weights, self.counts)
+        self.n_outside += int(np.count_nonzero(indices < 0))
+
+        return self
+
+    def merge(self, other):
+        """
+        Adds the counts of another histogram with the same edges.
+
+        Parameters
+        ----------
+        other (Histogram): The histogram to be merged.
+
+        Returns
+        -------
+        self (Histogram): The merged histogram.
+        """
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError('Histograms with different bin edges cannot be merged.')
+        self.counts = self.counts + other.counts
+        self.n_outside += other.n_outside
+
+        return self
+
+
+class QuantileSketch:
+    """
+    A streaming, mergeable sketch for estimating the quantiles of data that
+    is seen chunk by chunk. The values are kept in levels, where each value
+    at level i stands for 2^i data points. Whenever a level holds more than
+    SKETCH_SIZE values, they are sorted and every other one is promoted to
+    the next level (with alternating offsets so that the compactions do not
+    bias the quantiles). The relative rank error of the quantiles is of the
+    order of log2(n / SKETCH_SIZE) / SKETCH_SIZE, which is far more accurate
+    than needed to choose bin widths, while the memory is bounded.
+
+    Attributes
+    ----------
+    n (int): The number of data points seen.
+    levels (list of np.ndarray): The values kept at each level.
+    """
+    def __init__(self, size=SKETCH_SIZE):
+        """
+        Parameters
+        ----------
+        size (int): The maximum number of values kept at each level.
+        """
+        self.size = size
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self._offsets = [0]
+
+    def update(self, y):
+        """
+        Adds a chunk of data (NaN is ignored).
+
+        Parameters
+        ----------
+        y (np.ndarray): The data.
+
+        Returns
+        -------
+        self (QuantileSketch): The updated sketch.
+        """
+        y = np.asarray(y, dtype=float).reshape(-1)
+        y = y[~np.isnan(y)]
+        self.n += len(y)
+        self.levels[0] = np.concatenate((self.levels[0], y))
+        self._compact()
+
+        return self
+
+    def merge(self, other):
+        """
+        Adds the data summarized by another sketch.
+
+        Parameters
+        ----------
+        other (QuantileSketch): The sketch to be merged.
+
+        Returns
+        -------
+        self (QuantileSketch): The merged sketch.
+        """
+        self.n += other.n
+        for i, values in enumerate(other.levels):
+            if i == len(self.levels):
+                self.levels.append(np.empty(0))
+                self._offsets.append(0)
+            self.levels[i] = np.concatenate((self.levels[i], values))
+        self._compact()
+
+        return self
+
+    def _compact(self):
+        i = 0
+        while i < len(self.levels):
+            values = self.levels[i]
+            if len(values) > self.size:
+                values = np.sort(values)
+                n_pairs = len(values) // 2
+                promoted = values[self._offsets[i]:2 * n_pairs:2]
+                self._offsets[i] = 1 - self._offsets[i]
+                # An odd value out stays at this level
+                self.levels[i] = values[2 * n_pairs:]
+                if i + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                    self._offsets.append(0)
+                self.levels[i + 1] = np.concatenate((self.levels[i + 1], promoted))
+            i += 1
+
+    def quantile(self, q):
+        """
+        Estimates the quantiles of the data.
+
+        Parameters
+        ----------
+        q (float or np.ndarray): The quantiles, between 0 and 1.
+
+        Returns
+        -------
+        quantiles (float or np.ndarray): The estimated quantiles, which are
+            NaN if no data has been seen.
+        """
+        values = np.concatenate(self.levels)
+        if len(values) == 0:
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else np.nan
+        weights = np.concatenate([np.full(len(v), 2.0 ** i) for i, v in enumerate(self.levels)])
+        order = np.argsort(values, kind='mergesort')
+        values, ranks = values[order], np.cumsum(weights[order])
+        k = np.searchsorted(ranks, np.asarray(q) * ranks[-1], side='left')
+
+        return values[np.minimum(k, len(values) - 1)]
@@ -1,12 +1,18 @@
 #!/usr/bin/env python
 """This is a Python code for the plotting of 2-dimensional data.
 """
+import copy
 import natsort
 import argparse
+import functools
 import os.path
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib import rc
+from concurrent.futures import ProcessPoolExecutor
+from MolSci_analysis.readers import read_columns, read_rows, load_index, read_header, iter_chunks, CHUNK_ROWS
+from MolSci_analysis.stats import RunningStats
+from MolSci_analysis.correlation import BlockAverager
 
 
 def initialize():
@@ -29,10 +35,11 @@ def initialize():
                         '--ylabel',
                         type=str,
                         help='The name and units of y-axis')
-    parser.add_argument('-c', '--column', 
-                        type=int, 
-                        default=1,
-                        help='The column (python) index of the dependent variable.')
+    parser.add_argument('-c',
+                        '--column',
+                        default='1',
+                        help='The column (python) index or the name (in the #! FIELDS line of \
+                            a PLUMED output) of the dependent variable.')
     parser.add_argument('-t', 
                         '--title', 
                         type=str, 
@@ -71,12 +78,314 @@ def initialize():
                         type=int,
                         default=1,
                         help='The number of columns of the legends.')
+    parser.add_argument('-b',
+                        '--begin',
+                        type=float,
+                        help='The first time (in the units of the input file) to be analyzed. The rows \
+                            before it are skipped by the reader without being converted.')
+    parser.add_argument('-e',
+                        '--end',
+                        type=float,
+                        help='The last time (in the units of the input file) to be analyzed.')
+    parser.add_argument('-s',
+                        '--stride',
+                        type=int,
+                        default=1,
+                        help='Only every stride-th data point is analyzed. The skipped rows are not \
+                            converted by the reader.')
+    parser.add_argument('-ba',
+                        '--block_average',
+                        action='store_true',
+                        help='Whether to estimate the standard error of the average by block averaging, \
+                            which is done chunk by chunk in the out-of-core mode as well. See also the \
+                            autocorr command for the correlation times.')
+    parser.add_argument('-j',
+                        '--jobs',
+                        type=int,
+                        default=1,
+                        help='The number of worker processes parsing and analyzing the input files \
+                            in parallel. Only the plotting is done in the main process.')
+    parser.add_argument('-cr',
+                        '--chunk_rows',
+                        type=int,
+                        help='The number of rows of each chunk in the out-of-core mode, where the data \
+                            is parsed, converted and analyzed chunk by chunk to bound the peak memory. \
+                            In this mode, at most one chunk of (evenly strided) data points is plotted.')
+    parser.add_argument('-mm',
+                        '--max_memory',
+                        type=float,
+                        help='The memory budget (in MB) of the out-of-core mode, which determines the \
+                            size of the chunks. This overrides -cr.')
     
     args_parse = parser.parse_args()
 
     return args_parse
 
 
+def convert_units(x, y, args, x_unit, y_unit):
+    """
+    Converts the units of the data (and multiplies the data by the factors)
+    as specified by the arguments. Since the conversion is elementwise, it
+    can be applied to the whole data or chunk by chunk.
+
+    Parameters
+    ----------
+    x (np.ndarray): The data in x-axis.
+    y (np.ndarray): The data in y-axis.
+    args (argparse.Namespace): The arguments of the command.
+    x_unit (str): The unit of x.
+    y_unit (str): The unit of y.
+
+    Returns
+    -------
+    x (np.ndarray): The converted data in x-axis.
+    y (np.ndarray): The converted data in y-axis.
+    x_unit (str): The unit of x after the conversion.
+    y_unit (str): The unit of y after the conversion.
+    """
+    if args.temp is None:
+        args.temp = 298.15
+    conversion1 = 1.38064852 * 6.02 * args.temp / 1000  # multiply to convert from kT to kJ/mol
+    conversion2 = np.pi/180 # multiply to convert from degree to radian
+    conversion3 = 0.239005736  # multiply to convert from kJ/mol to kcal/mol
+
+    if args.x_conversion == 'ps to ns':
+        x = x / 1000
+        x_unit = ' ns'
+
+    if args.x_conversion == 'ns to ps':
+        x = x * 1000
+        x_unit = ' ps'
+
+    if args.x_conversion == 'kT to kJ/mol':
+        x = x * conversion1
+        x_unit = ' kcal/mol'
+    if args.x_conversion == 'kJ/mol to kT':
+        x = x / conversion1
+        x_unit = ' kT'
+    if args.x_conversion == 'kT to kcal/mol':
+        x = x * conversion1 * conversion3
+        x_unit = ' kcal/mol'
+    if args.x_conversion == 'kcal/mol to kT':
+        x = x / (conversion1 * conversion3)
+        x_unit = ' kT'
+    if args.x_conversion == 'kJ/mol to kcal/mol':
+        x = x * conversion3
+        x_unit = 'kcal/mol'
+    if args.x_conversion == 'kcal/mol to kJ/mol':
+        x = x / conversion3
+        x_unit = 'kJ/mol'
+    if args.x_conversion == 'degree to radian':
+        x = x * conversion2
+        x_unit = ' radian'
+    if args.x_conversion == 'radian to degree':
+        x = x / conversion2
+        x_unit = ' degree'
+
+
+    if args.y_conversion == 'kT to kcal/mol':
+        y = y * conversion1
+        y_unit = ' kcal/mol'
+    if args.y_conversion == 'kcal/mol to kT':
+        y = y / conversion1
+        y_unit = ' kT'
+    if args.y_conversion == 'kT to kcal/mol':
+        y = y * conversion1 * conversion3
+        y_unit = 'kcal/mol'
+    if args.y_conversion == 'kcal/mol to kT':
+        y = y / (conversion1 * conversion3)
+        y_unit = 'kcal/mol'
+    if args.y_conversion == 'kJ/mol to kcal/mol':
+        y = y * conversion3
+        y_unit = 'kcal/mol'
+    if args.y_conversion == 'kcal/mol to kJ/mol':
+        y = y / conversion3
+        y_unit = 'kcal/mol'
+    if args.y_conversion == 'kJ/mol to kT':
+        y = y / conversion1
+        y_unit = 'kT'
+    if args.y_conversion == 'kT to kJ/mol':
+        y = y * conversion1
+        y_unit = 'kJ/mol'
+    if args.y_conversion == 'degree to radian':
+        y = y * conversion2
+        y_unit = ' radian'
+    if args.y_conversion == 'radian to degree':
+        y = y / conversion2
+        y_unit = ' degree'
+
+    if args.factor_x is not None:
+        x = x * args.factor_x
+    if args.factor_y is not None:
+        y = y * args.factor_y
+
+    return x, y, x_unit, y_unit
+
+
+def analyze_chunks(get_chunks, args, x_unit, y_unit, n_rows, blocks=None):
+    """
+    Computes the statistics of the data in the out-of-core mode. The chunks
+    are read twice: the first pass computes the average, the maximum and the
+    minimum, and the second pass finds the data point closest to the average.
+    Only evenly strided data points (at most one chunk) are kept for plotting.
+
+    Parameters
+    ----------
+    get_chunks (callable): A function returning a new iterator over the chunks,
+        each of which is an array of shape (n_rows, 2) containing x and y.
+    args (argparse.Namespace): The arguments of the command.
+    x_unit (str): The unit of x.
+    y_unit (str): The unit of y.
+    n_rows (int): The total number of rows of the chunks.
+    blocks (BlockAverager): The block averaging of y, which is updated in
+        place. If None, no block averaging is done.
+
+    Returns
+    -------
+    stats (RunningStats): The statistics of y (see stats.py).
+    x (np.ndarray): The strided data in x-axis for plotting.
+    y (np.ndarray): The strided data in y-axis for plotting.
+    x_unit (str): The unit of x after the conversion.
+    y_unit (str): The unit of y after the conversion.
+    """
+    stride = max(int(np.ceil(n_rows / (args.chunk_rows or CHUNK_ROWS))), 1)
+    n, stats = 0, RunningStats()
+    x_plot, y_plot = [], []
+    for chunk in get_chunks():
+        x, y, x_unit, y_unit = convert_units(chunk[:, 0], chunk[:, 1], args, x_unit, y_unit)
+        if len(y) == 0:
+            continue
+        x_plot.append(x[(-n) % stride::stride])
+        y_plot.append(y[(-n) % stride::stride])
+        n += len(y)
+        stats.update(y, x)
+        if blocks is not None:
+            blocks.update(y)
+
+    for chunk in get_chunks():
+        x, y = convert_units(chunk[:, 0], chunk[:, 1], args, x_unit, y_unit)[:2]
+        stats.find_closest(y, x)
+
+    return stats, np.concatenate(x_plot), np.concatenate(y_plot), x_unit, y_unit
+
+
+def analyze_file(fname, args):
+    """
+    Parses, converts and analyzes the data of one file. This function only
+    returns the results (instead of printing or plotting them), so that the
+    files can be analyzed by worker processes (see the option -j) while the
+    figure is drawn in the main process.
+
+    Parameters
+    ----------
+    fname (str): The name of the input file.
+    args (argparse.Namespace): The arguments of the command.
+
+    Returns
+    -------
+    lines (list): The lines of the analysis results to be printed.
+    x (np.ndarray): The (converted) data in x-axis to be plotted.
+    y (np.ndarray): The (converted) data in y-axis to be plotted.
+    """
+    args = copy.copy(args)  # the default of the unit conversion only applies to this file
+    lines = []
+    result_str = '\nData analysis of the file: %s' % fname
+    lines.append(result_str)
+    lines.append('=' * (len(result_str) - 1))  # len(result_str) includes \n
+    lines.append('Analyzing the file ... ')
+    lines.append('Plotting and saving figure ...')
+
+    # Parse data. Restarts of extended MetaD simulations are handled by the reader.
+    chunked = args.chunk_rows is not None or args.max_memory is not None
+    if args.truncate is None and args.retain is None and not chunked:
+        data, header = read_columns(fname, columns=[0, args.column], begin=args.begin, end=args.end,
+                                    stride=args.stride)
+    else:
+        # Only decode the rows to be analyzed with the help of the sidecar index of the file
+        index = load_index(fname)
+        n_rows = int(index['n_rows'])
+        start = 0 if args.truncate is None else int(0.01 * float(args.truncate) * n_rows)
+        stop = n_rows if args.retain is None else start + int(0.01 * float(args.retain) * (n_rows - start))
+        if chunked:
+            # Out-of-core mode: the data is only read chunk by chunk in analyze_chunks
+            header = read_header(fname)
+            max_memory = None if args.max_memory is None else args.max_memory * 1024 ** 2
+            get_chunks = functools.partial(iter_chunks, fname, columns=[0, args.column], start=start, stop=stop,
+                                           index=index, chunk_rows=args.chunk_rows or CHUNK_ROWS,
+                                           max_memory=max_memory, begin=args.begin, end=args.end,
+                                           stride=args.stride)
+        else:
+            data, header = read_rows(fname, start, stop, columns=[0, args.column], index=index,
+                                     begin=args.begin, end=args.end, stride=args.stride)
+    for line in header['comments']:
+        if 'xaxis  label "Time (ps)"' in line and args.x_conversion is None:
+            args.x_conversion = 'ps to ns'
+    if not chunked:
+        x, y = data[:, 0], data[:, 1]
+
+    # Unit conversion
+    if args.xlabel is not None:
+        if '(' in args.xlabel:
+            if '$' in args.xlabel.split('(')[1]:
+                x_unit = args.xlabel.split('$')[1].split('$')[0]
+            else:
+                x_unit = args.xlabel.split('(')[1].split(')')[0]
+            x_var = args.xlabel.split('(')[0].lower()
+            if x_var[-1] == ' ':
+                x_var = x_var.split(' ')[0].lower()
+        else:
+            x_unit = ''
+            x_var = args.xlabel.lower()
+    else:
+        x_unit = ''
+        x_var = None 
+
+
+    if args.ylabel is not None:
+        if '(' in args.ylabel:
+            if '$' in args.ylabel.split('(')[1]:
+                y_unit = args.ylabel.split('$')[1].split('$')[0]
+            else:
+                y_unit = args.ylabel.split('(')[1].split(')')[0]
+            y_var = args.ylabel.split('(')[0].lower()
+            if y_var[-1] == ' ':
+                y_var = y_var.split(' ')[0].lower()
+        else:
+            y_unit = ''
+            y_var = args.ylabel.lower()
+    else:
+        y_unit = ''
+        y_var = None
+
+    blocks = BlockAverager() if args.block_average else None
+    if chunked:
+        stats, x, y, x_unit, y_unit = analyze_chunks(get_chunks, args, x_unit, y_unit, stop - start, blocks)
+    else:
+        x, y, x_unit, y_unit = convert_units(x, y, args, x_unit, y_unit)
+        stats = RunningStats().update(y, x)
+        if blocks is not None:
+            blocks.update(y)
+        stats.find_closest(y, x)
+
+    # Some simple data analysis
+    if args.truncate is None:
+        # no truncation required
+        pass
+    else:
+        # The first truncate% of the data has been skipped by the reader
+        lines.append('Note that the first %s of the data is truncated, which is the data that the following statistics is based on.' % args.truncate)
+
+    lines.append('The average of %s: %5.3f%s (RMSF: %5.3f%s max: %5.3f%s, min: %5.3f%s)' % (y_var, stats.mean, y_unit, stats.rmsf, y_unit, stats.max, y_unit, stats.min, y_unit))
+    if x_unit == ' ns' or x_unit == ' ps':
+        lines.append('The maximum occurs at %5.4f%s, while the minimum occurs at %5.4f%s.' % (stats.x_max, x_unit, stats.x_min, x_unit))
+        lines.append('The configuration at %s%s has the %s (%s%s) that is cloest to the average volume.' % (stats.x_avg, x_unit, y_var, stats.y_avg, y_unit))
+
+    if blocks is not None:
+        lines.append('The standard error of the average of %s (block averaging): %5.3f%s' % (y_var, blocks.get_error(), y_unit))
+
+    return lines, x, y
+
+
 def main():
 
     args = initialize()
@@ -103,184 +412,15 @@ def main():
     if args.legend is None:
         args.legend = args.xvg
 
-    for i in range(len(args.xvg)):
-        result_str = '\nData analysis of the file: %s' % args.xvg[i]
-        print(result_str)
-        print('=' * (len(result_str) - 1))  # len(result_str) includes \n
-        print('Analyzing the file ... ')
-        print('Plotting and saving figure ...')
-
-        x, y = [], []
-        infile = open('%s' % args.xvg[i], 'r')
-        lines = infile.readlines()
-        infile.close
-        # Parse data
-        m = 0
-        for line in lines:
-            if line[0] == '#' or line[0] == '@':
-                m += 1  # number of parameter lines
-                if 'xaxis  label "Time (ps)"' in line and args.x_conversion is None:
-                    args.x_conversion = 'ps to ns'    
-
-        # read in data starting from (m+1)-th line to the end
-        n = m   # line number
-        for line in lines[m:-1]:
-            n += 1
-            if '#' not in line and line[0] != '@':
-                # Note that when extending MetaD, COLVAR might append #! FIELDS ... 
-                # to an incomplete row of data. Also, when the simulation is extended
-                # it might rerun the last portion of the simulation (which might give
-                # slightly differen result). We'll just use the results in the extended
-                # simulation if this is the case. Note the the quantity of the time frame
-                # where the extended simulation starts is should the same as the one of 
-                # the same time frame of before the simulation gest extended.
-                tokens = line.split()
-                x.append(float(tokens[0]))
-                y.append(float(tokens[args.column]))
-            elif '#' in line:  # the case the MetaD is extended
-                tokens = lines[n].split()  # the next line of #! FIELDS ...
-                x = np.array(x)
-                x = x[x < float(tokens[0])]
-                x = list(x)
-                y = y[:len(x)]
-        x, y = np.array(x), np.array(y)
-
-        # Unit conversion
-        if args.xlabel is not None:
-            if '(' in args.xlabel:
-                if '$' in args.xlabel.split('(')[1]:
-                    x_unit = args.xlabel.split('$')[1].split('$')[0]
-                else:
-                    x_unit = args.xlabel.split('(')[1].split(')')[0]
-                x_var = args.xlabel.split('(')[0].lower()
-                if x_var[-1] == ' ':
-                    x_var = x_var.split(' ')[0].lower()
-            else:
-                x_unit = ''
-                x_var = args.xlabel.lower()
-        else:
-            x_unit = ''
-            x_var = None 
-
-
-        if args.ylabel is not None:
-            if '(' in args.ylabel:
-                if '$' in args.ylabel.split('(')[1]:
-                    y_unit = args.ylabel.split('$')[1].split('$')[0]
-                else:
-                    y_unit = args.ylabel.split('(')[1].split(')')[0]
-                y_var = args.ylabel.split('(')[0].lower()
-                if y_var[-1] == ' ':
-                    y_var = y_var.split(' ')[0].lower()
-            else:
-                y_unit = ''
-                y_var = args.ylabel.lower()
-        else:
-            y_unit = ''
-            y_var = None
-
-        if args.temp is None:
-            args.temp = 298.15
-        conversion1 = 1.38064852 * 6.02 * args.temp / 1000  # multiply to convert from kT to kJ/mol
-        conversion2 = np.pi/180 # multiply to convert from degree to radian
-        conversion3 = 0.239005736  # multiply to convert from kJ/mol to kcal/mol
-        
-        if args.x_conversion == 'ps to ns':
-            x = x / 1000
-            x_unit = ' ns'
-
-        if args.x_conversion == 'ns to ps':
-            x = x * 1000
-            x_unit = ' ps'
-
-        if args.x_conversion == 'kT to kJ/mol':
-            x = x * conversion1
-            x_unit = ' kcal/mol'
-        if args.x_conversion == 'kJ/mol to kT':
-            x = x / conversion1
-            x_unit = ' kT'
-        if args.x_conversion == 'kT to kcal/mol':
-            x = x * conversion1 * conversion3
-            x_unit = ' kcal/mol'
-        if args.x_conversion == 'kcal/mol to kT':
-            x = x / (conversion1 * conversion3)
-            x_unit = ' kT'
-        if args.x_conversion == 'kJ/mol to kcal/mol':
-            x = x * conversion3
-            x_unit = 'kcal/mol'
-        if args.x_conversion == 'kcal/mol to kJ/mol':
-            x = x / conversion3
-            x_unit = 'kJ/mol'
-        if args.x_conversion == 'degree to radian':
-            x = x * conversion2
-            x_unit = ' radian'
-        if args.x_conversion == 'radian to degree':
-            x = x / conversion2
-            x_unit = ' degree'
-
-
-        if args.y_conversion == 'kT to kcal/mol':
-            y = y * conversion1
-            y_unit = ' kcal/mol'
-        if args.y_conversion == 'kcal/mol to kT':
-            y = y / conversion1
-            y_unit = ' kT'
-        if args.y_conversion == 'kT to kcal/mol':
-            y = y * conversion1 * conversion3
-            y_unit = 'kcal/mol'
-        if args.y_conversion == 'kcal/mol to kT':
-            y = y / (conversion1 * conversion3)
-            y_unit = 'kcal/mol'
-        if args.y_conversion == 'kJ/mol to kcal/mol':
-            y = y * conversion3
-            y_unit = 'kcal/mol'
-        if args.y_conversion == 'kcal/mol to kJ/mol':
-            y = y / conversion3
-            y_unit = 'kcal/mol'
-        if args.y_conversion == 'kJ/mol to kT':
-            y = y / conversion1
-            y_unit = 'kT'
-        if args.y_conversion == 'kT to kJ/mol':
-            y = y * conversion1
-            y_unit = 'kJ/mol'
-        if args.y_conversion == 'degree to radian':
-            y = y * conversion2
-            y_unit = ' radian'
-        if args.y_conversion == 'radian to degree':
-            y = y / conversion2
-            y_unit = ' degree'
-
-        if args.factor_x is not None:
-            x = x * args.factor_x
-        if args.factor_y is not None:
-            y = y * args.factor_y
-
-        # Some simple data analysis
-        if args.truncate is None:
-            # no truncation required
-            pass
-        else:
-            y = y[int(0.01 * float(args.truncate) * len(y)):]  # truncate the first 1% of the data
-            x = x[int(0.01 * float(args.truncate) * len(x)):]  
-            print('Note that the first %s of the data is truncated, which is the data that the following statistics is based on.' % args.truncate)
-        
-        if args.retain is None:
-            pass
-        else:
-            y = y[:int(0.01 * float(args.retain) * len(y))]
-            x = x[:int(0.01 * float(args.retain) * len(x))]
-        
-        y_avg = np.mean(y)
-        y2_avg = np.mean(np.power(y, 2))
-        RMSF = np.sqrt((y2_avg - y_avg ** 2)) / y_avg
-        print('The average of %s: %5.3f%s (RMSF: %5.3f%s max: %5.3f%s, min: %5.3f%s)' % (y_var, y_avg, y_unit, RMSF, y_unit, np.max(y), y_unit, np.min(y), y_unit))
-        if x_unit == ' ns' or x_unit == ' ps':
-            y = list(y)
-            print('The maximum occurs at %5.4f%s, while the minimum occurs at %5.4f%s.' % (x[y.index(max(y))], x_unit, x[y.index(min(y))], x_unit))
-            y = np.array(y)
-            diff = np.abs(y - y_avg)
-            t_avg = x[np.argmin(diff)]
-            print('The configuration at %s%s has the %s (%s%s) that is cloest to the average volume.' % (t_avg, x_unit, y_var, y[np.argmin(diff)], y_unit))
+    if args.jobs > 1 and len(args.xvg) > 1:
+        # Parse and analyze the files in worker processes and only plot in this process
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            results = list(pool.map(analyze_file, args.xvg, [args] * len(args.xvg)))
+    else:
+        results = (analyze_file(fname, args) for fname in args.xvg)
+
+    for i, (lines, x, y) in enumerate(results):
+        print('\n'.join(lines))
         if args.legend is None:
             plt.plot(x, y)
         else:
@@ -298,7 +438,7 @@ def main():
 
     if args.legend is not None:
         if len(args.xvg) > 1:
-            plt.legend(ncol=args.lengend_col)
+            plt.legend(ncol=args.legend_col)
 
     plt.savefig('%s.png' % args.pngname)
     plt.show()
@@ -3,10 +3,21 @@
 """
 import natsort
 import argparse
+import functools
 import os.path
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib import rc
+from concurrent.futures import ProcessPoolExecutor
+from MolSci_analysis.readers import read_columns, read_rows, read_header, load_index, iter_chunks, CHUNK_ROWS
+from MolSci_analysis.readers import resolve_columns, get_domain, parse_domains
+from MolSci_analysis.hills import load_hills
+from MolSci_analysis.fes import get_grid
+from MolSci_analysis.reweight import get_kT, iter_weights
+from MolSci_analysis.histogram import Histogram, QuantileSketch, get_edges, get_nbins, BIN_RULES
+from MolSci_analysis.histogram import get_ratios, get_n_ratio
+from MolSci_analysis.stats import RunningStats
+from MolSci_analysis.correlation import BlockAverager
 
 
 def initialize():
@@ -30,11 +41,11 @@ def initialize():
                         type=str,
                         default='Count',
                         help='The name and units of y-axis')
-    parser.add_argument('-c', 
-                        '--column', 
-                        type=int, 
-                        default=1,
-                        help='The column index of the dependent variable.')
+    parser.add_argument('-c',
+                        '--column',
+                        default='1',
+                        help='The column (python) index or the name (in the #! FIELDS line of \
+                            a PLUMED output) of the dependent variable.')
     parser.add_argument('-t', 
                         '--title', 
                         type=str, 
@@ -45,9 +56,12 @@ def initialize():
                         help='The filename of the figure, not including the extension')
     parser.add_argument('-nb',
                         '--nbins',
-                        type=int,
+                        type=parse_nbins,
                         default=200,
-                        help='The number of bins for the histogram.')
+                        help='The number of bins for the histogram, or the rule (auto, fd or sturges, \
+                            same as np.histogram) to choose the number of bins from the data. In the \
+                            out-of-core mode, the quantiles needed by the rules are estimated by a \
+                            streaming sketch, so the data is never held in memory as a whole.')
     parser.add_argument('-cc',
                         '--conversion',
                         choices=['degree to radian', 'radian to degree', 'kT to kcal/mol', 'kcal/mol to kT', 'kT to kJ/mol', 'kJ/mol to kT', 'kJ/mol to kcal/mol', 'kcal/mol to kJ/mol', 'ns to ps', 'ps to ns'],
@@ -58,6 +72,7 @@ def initialize():
                         help='The factor to be multiplied to the x values of the histogram.')
     parser.add_argument('-T',
                         '--temp',
+                        type=float,
                         help='Temperature for unit convesion involving kT. Default: 298.15.')
     parser.add_argument('-o',
                         '--outline',
@@ -77,13 +92,485 @@ def initialize():
                         type=float,
                         nargs='+',
                         help='The x values/centers of the bins (x1, x2) for calculating N_ratio = x1/x2. \
-                            If this is not specified, x1=max of x and x2=min of x.')
+                            Multiple pairs (x1 x2 x3 x4 ...) can be given, for which the ratios are \
+                            computed at once. If this is not specified, x1=max of x and x2=min of x.')
+    parser.add_argument('-b',
+                        '--begin',
+                        type=float,
+                        help='The first time (in the units of the input file) to be analyzed. The rows \
+                            before it are skipped by the reader without being converted.')
+    parser.add_argument('-e',
+                        '--end',
+                        type=float,
+                        help='The last time (in the units of the input file) to be analyzed.')
+    parser.add_argument('-s',
+                        '--stride',
+                        type=int,
+                        default=1,
+                        help='Only every stride-th data point is analyzed. The skipped rows are not \
+                            converted by the reader.')
+    parser.add_argument('-pd',
+                        '--periodic',
+                        nargs=2,
+                        help='The periodic domain (lower and upper bounds, e.g. -pd -3.14159265 pi) of \
+                            the data, which overrides the #! SET min_ and max_ lines of a PLUMED output \
+                            file. The data is binned in the domain with wrapping. Use -pd none none \
+                            for non-periodic data.')
+    parser.add_argument('-r',
+                        '--range',
+                        type=float,
+                        nargs=2,
+                        help='The lower and upper bounds of the bins, which fix the bin edges of all \
+                            the input files. Default: the range of the data in each file (or the \
+                            periodic domain of the data if -Nb is not specified).')
+    parser.add_argument('-m',
+                        '--merge',
+                        action='store_true',
+                        help='Whether to add up the histograms of all the input files into one \
+                            histogram, which requires the same bin edges for all the files (given by \
+                            -r or by the periodic domain).')
+    parser.add_argument('-wc',
+                        '--weight_column',
+                        help='The column (python index or name) of the weights of the data points in \
+                            the histogram, e.g. a reweighting factor in a COLVAR file.')
+    parser.add_argument('-bw',
+                        '--bias_weight',
+                        action='store_true',
+                        help='Whether the column given by -wc is a bias potential V in kJ/mol (e.g. \
+                            metad.rbias), in which case the weights are exp(V / kT).')
+    parser.add_argument('-hi',
+                        '--hills',
+                        help='The PLUMED HILLS file of the MetaD simulation that generated the COLVAR \
+                            file(s). If specified, the histogram is reweighted by the weights \
+                            exp[(V(s, t) - c(t)) / kT] of the frames to give the unbiased distribution, \
+                            where the energy unit of the HILLS file is assumed to be kJ/mol.')
+    parser.add_argument('-rc',
+                        '--rw_cvs',
+                        nargs='+',
+                        help='The columns (python indices or names) of the CVs of the Gaussians in \
+                            the COLVAR file(s) for reweighting. Default: the CVs in the HILLS file.')
+    parser.add_argument('-rb',
+                        '--rw_bins',
+                        type=int,
+                        nargs='+',
+                        default=[100],
+                        help='The number of grid points of each CV of the bias potential for \
+                            reweighting. Default: 100.')
+    parser.add_argument('-re',
+                        '--rw_every',
+                        type=int,
+                        default=1,
+                        help='The bias potential for reweighting is updated every this number of \
+                            Gaussians. Default: 1 (exact).')
+    parser.add_argument('-ba',
+                        '--block_average',
+                        action='store_true',
+                        help='Whether to estimate the standard error of the average by block averaging, \
+                            which is done chunk by chunk in the out-of-core mode as well. See also the \
+                            autocorr command for the correlation times.')
+    parser.add_argument('-j',
+                        '--jobs',
+                        type=int,
+                        default=1,
+                        help='The number of worker processes parsing, analyzing and binning the input \
+                            files in parallel. Only the plotting is done in the main process.')
+    parser.add_argument('-cr',
+                        '--chunk_rows',
+                        type=int,
+                        help='The number of rows of each chunk in the out-of-core mode, where the data \
+                            is parsed, converted and histogrammed chunk by chunk to bound the peak memory.')
+    parser.add_argument('-mm',
+                        '--max_memory',
+                        type=float,
+                        help='The memory budget (in MB) of the out-of-core mode, which determines the \
+                            size of the chunks. This overrides -cr.')
 
     args_parse = parser.parse_args()
 
     return args_parse
 
 
+def parse_nbins(value):
+    """
+    Parses the argument of the number of bins, which is either an integer or
+    the name of a rule (see histogram.get_nbins).
+
+    Parameters
+    ----------
+    value (str): The argument.
+
+    Returns
+    -------
+    nbins (int or str): The number of bins or the name of the rule.
+    """
+    if value in BIN_RULES:
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError('%s is neither an integer nor one of %s.' % (value, ', '.join(BIN_RULES)))
+
+
+def convert_units(y, args, x_unit, y_unit):
+    """
+    Converts the units of the data (and multiplies the data by the factor)
+    as specified by the arguments. Since the conversion is elementwise, it
+    can be applied to the whole data or chunk by chunk.
+
+    Parameters
+    ----------
+    y (np.ndarray): The data to be converted.
+    args (argparse.Namespace): The arguments of the command.
+    x_unit (str): The unit of x.
+    y_unit (str): The unit of y.
+
+    Returns
+    -------
+    y (np.ndarray): The converted data.
+    x_unit (str): The unit of x after the conversion.
+    y_unit (str): The unit of y after the conversion.
+    """
+    if args.temp is None:
+        args.temp = 298.15
+    conversion1 = 1.38064852 * 6.02 * args.temp / 1000  # multiply to convert from kT to kJ/mol
+    conversion2 = np.pi/180 # multiply to convert from degree to radian
+    conversion3 = 0.239005736  # multiply to convert from kJ/mol to kcal/mol
+
+    if args.conversion == 'ps to ns':
+        y = y / 1000
+        x_unit = ' ns'
+
+    if args.conversion == 'ns to ps':
+        y = y * 1000
+        y_unit = ' ps'
+
+    if args.conversion == 'kT to kJ/mol':
+        y = y * conversion1
+        y_unit = ' kcal/mol'
+    if args.conversion == 'kJ/mol to kT':
+        y = y / conversion1
+        y_unit = ' kT'
+    if args.conversion == 'kT to kcal/mol':
+        y = y * conversion1 * conversion3
+        y_unit = ' kcal/mol'
+    if args.conversion == 'kcal/mol to kT':
+        y = y / (conversion1 * conversion3)
+        y_unit = ' kT'
+    if args.conversion == 'kJ/mol to kcal/mol':
+        y = y * conversion3
+        y_unit = 'kcal/mol'
+    if args.conversion == 'kcal/mol to kJ/mol':
+        y = y / conversion3
+        y_unit = 'kJ/mol'
+    if args.conversion == 'degree to radian':
+        y = y * conversion2
+        y_unit = ' radian'
+    if args.conversion == 'radian to degree':
+        y = y / conversion2
+        y_unit = ' degree'
+
+    if args.factor is not None:
+        y = y * args.factor
+
+    return y, x_unit, y_unit
+
+
+def wrap(y, domain):
+    """
+    Wraps periodic data into its domain, so that the data can be binned with
+    bins covering the domain without creating image copies of the data.
+
+    Parameters
+    ----------
+    y (np.ndarray): The data.
+    domain (tuple): The lower and upper bounds of the periodic domain.
+
+    Returns
+    -------
+    y (np.ndarray): The wrapped data.
+    """
+    return domain[0] + np.mod(y - domain[0], domain[1] - domain[0])
+
+
+def weigh_chunks(chunks, args, hills=None, grid=None):
+    """
+    Pairs the chunks of the data with the weights of their frames, which are
+    given by the weight column (-wc) and/or by MetaD reweighting (see
+    reweight.py).
+
+    Parameters
+    ----------
+    chunks (iterable of np.ndarray): The chunks of the data in the order of
+        time, each of which contains x, y, the CVs of the Gaussians (if any)
+        and the weight column (if any).
+    args (argparse.Namespace): The arguments of the command.
+    hills (dict): The Gaussians of the MetaD simulation. If None, the frames
+        are not reweighted.
+    grid (list of np.ndarray): The grid points of each CV of the bias.
+
+    Yields
+    ------
+    chunk (np.ndarray): The chunk of the data.
+    weights (np.ndarray): The weights of the frames, or None if the frames are
+        not weighted.
+    """
+    kT = get_kT(298.15 if args.temp is None else args.temp)
+    if hills is None:
+        pairs = ((chunk, None) for chunk in chunks)
+    else:
+        cvs = range(2, 2 + len(grid))
+        pairs = ((r[0], r[3]) for r in iter_weights(chunks, hills, grid, kT, cvs, every=args.rw_every))
+    for chunk, weights in pairs:
+        if args.weight_column is not None:
+            column = np.exp(chunk[:, -1] / kT) if args.bias_weight else chunk[:, -1]
+            weights = column if weights is None else weights * column
+        yield chunk, weights
+
+
+def analyze_chunks(get_chunks, args, x_unit, y_unit, domain=None, weigh=None, blocks=None):
+    """
+    Computes the statistics and the histogram of the data in the out-of-core
+    mode. The chunks are read twice: the first pass computes the statistics
+    and the range of the histogram (and sketches the quantiles if the number
+    of bins is chosen by a rule), and the second pass bins the data and
+    finds the configuration closest to the average.
+
+    Parameters
+    ----------
+    get_chunks (callable): A function returning a new iterator over the chunks,
+        each of which is an array whose first two columns are x and y.
+    args (argparse.Namespace): The arguments of the command.
+    x_unit (str): The unit of x.
+    y_unit (str): The unit of y.
+    domain (tuple): The lower and upper bounds (after the unit conversion) of
+        periodic data, which are used as the range of the histogram unless the
+        data is bounded by -Nb. If None, the data is not periodic.
+    weigh (callable): A function pairing the chunks with the weights of their
+        frames in the histogram (see weigh_chunks). If None, the frames are
+        not weighted.
+    blocks (BlockAverager): The block averaging of y, which is updated in
+        place. If None, no block averaging is done.
+
+    Returns
+    -------
+    stats (RunningStats): The statistics of y (see stats.py).
+    hist (Histogram): The histogram of the data.
+    x_unit (str): The unit of x after the conversion.
+    y_unit (str): The unit of y after the conversion.
+    """
+    stats = RunningStats()
+    lower, upper = np.inf, -np.inf  # range of the histogram
+    sketch = QuantileSketch() if isinstance(args.nbins, str) else None
+    bounded = args.n_ratio is None and args.Nr_bound is not None
+
+    def histogram_data(y, weights=None):
+        if bounded:
+            mask = (y > args.Nr_bound[0]) & (y < args.Nr_bound[1])
+            y, weights = y[mask], None if weights is None else weights[mask]
+        return y, weights
+
+    for chunk in get_chunks():
+        x, y = chunk[:, 0], chunk[:, 1]
+        y, x_unit, y_unit = convert_units(y, args, x_unit, y_unit)
+        if len(y) == 0:
+            continue
+        stats.update(y, x)
+        if blocks is not None:
+            blocks.update(y)
+        if domain is not None:
+            y = wrap(y, domain)
+        y = histogram_data(y)[0]
+        if len(y) > 0:
+            lower, upper = min(lower, np.min(y)), max(upper, np.max(y))
+        if sketch is not None:
+            sketch.update(y)
+
+    if args.range is not None:
+        lower, upper = args.range
+    elif domain is not None and not bounded:
+        lower, upper = domain
+    elif lower > upper:
+        lower, upper = 0, 1  # no data, same as np.histogram
+    if sketch is None:
+        nbins = args.nbins
+    else:
+        q25, q75 = sketch.quantile([0.25, 0.75])
+        nbins = get_nbins(args.nbins, lower, upper, sketch.n, q75 - q25)
+    hist = Histogram(get_edges(lower, upper, nbins))
+    if weigh is None:
+        def weigh(chunks):
+            return ((chunk, None) for chunk in chunks)
+    for chunk, weights in weigh(get_chunks()):
+        x, y = chunk[:, 0], chunk[:, 1]
+        y = convert_units(y, args, x_unit, y_unit)[0]
+        if len(y) == 0:
+            continue
+        stats.find_closest(y, x)
+        if domain is not None:
+            y = wrap(y, domain)
+        y, weights = histogram_data(y, weights)
+        hist.update(y, weights)
+
+    return stats, hist, x_unit, y_unit
+
+
+def analyze_file(fname, args):
+    """
+    Parses, converts and analyzes the data of one file and bins it into a
+    histogram. This function only returns the results (instead of printing
+    or plotting them), so that the files can be analyzed by worker processes
+    (see the option -j) while the histograms are drawn in the main process.
+
+    Parameters
+    ----------
+    fname (str): The name of the input file.
+    args (argparse.Namespace): The arguments of the command.
+
+    Returns
+    -------
+    lines (list): The lines of the analysis results to be printed.
+    hist (Histogram): The histogram of the data.
+    """
+    lines = []
+    result_str = '\nData analysis of the file: %s' % fname
+    lines.append(result_str)
+    lines.append('=' * (len(result_str) - 1))  # len(result_str) includes \n
+    lines.append('Analyzing the file ... ')
+    lines.append('Plotting and saving figure ...')
+
+    # The Gaussians for reweighting, whose CVs are read as additional columns
+    columns, hills, grid = [0, args.column], None, None
+    if args.hills is not None:
+        hills = load_hills(args.hills)
+        columns += args.rw_cvs or hills['cvs']
+        rw_bins = args.rw_bins * len(hills['cvs']) if len(args.rw_bins) == 1 else args.rw_bins
+        grid = get_grid(hills, rw_bins)
+    if args.weight_column is not None:
+        columns.append(args.weight_column)  # always the last column
+    weigh = functools.partial(weigh_chunks, args=args, hills=hills, grid=grid)
+
+    # Parse data. Restarts of extended MetaD simulations are handled by the reader.
+    chunked = args.chunk_rows is not None or args.max_memory is not None
+    if chunked:
+        # Out-of-core mode: the data is only read chunk by chunk in analyze_chunks
+        header = read_header(fname)
+        index = load_index(fname)
+        start = 0 if args.truncate is None else int(0.01 * float(args.truncate) * int(index['n_rows']))
+        max_memory = None if args.max_memory is None else args.max_memory * 1024 ** 2
+        get_chunks = functools.partial(iter_chunks, fname, columns=columns, start=start, index=index,
+                                       chunk_rows=args.chunk_rows or CHUNK_ROWS, max_memory=max_memory,
+                                       begin=args.begin, end=args.end, stride=args.stride)
+    elif args.truncate is None:
+        data, header = read_columns(fname, columns=columns, begin=args.begin, end=args.end,
+                                    stride=args.stride)
+    else:
+        # Only decode the rows to be analyzed with the help of the sidecar index of the file
+        index = load_index(fname)
+        n_rows = int(index['n_rows'])
+        start = int(0.01 * float(args.truncate) * n_rows)
+        data, header = read_rows(fname, start, n_rows, columns=columns, index=index,
+                                 begin=args.begin, end=args.end, stride=args.stride)
+    if not chunked:
+        x, y = data[:, 0], data[:, 1]
+
+    # The periodic domain of the data (in the units after the conversion)
+    if args.periodic is not None:
+        domain = parse_domains(args.periodic)[0]
+    elif header['fields']:
+        domain = get_domain(header, header['fields'][resolve_columns([args.column], header['fields'])[0]])
+    else:
+        domain = None
+    if domain is not None:
+        domain = tuple(np.sort(convert_units(np.array(domain), args, '', '')[0]))
+    
+    # Unit conversion
+    if args.xlabel is not None:
+        if '(' in args.xlabel:
+            if '$' in args.xlabel.split('(')[1]:
+                x_unit = args.xlabel.split('$')[1].split('$')[0]
+            else:
+                x_unit = args.xlabel.split('(')[1].split(')')[0]
+            x_var = args.xlabel.split('(')[0].lower()
+            if x_var[-1] == ' ':
+                x_var = x_var.split(' ')[0].lower()
+        else:
+            x_unit = ''
+            x_var = args.xlabel.lower()
+    else:
+        x_unit = ''
+        x_var = None 
+
+
+    if args.ylabel is not None:
+        if '(' in args.ylabel:
+            if '$' in args.ylabel.split('(')[1]:
+                y_unit = args.ylabel.split('$')[1].split('$')[0]
+            else:
+                y_unit = args.ylabel.split('(')[1].split(')')[0]
+            y_var = args.ylabel.split('(')[0].lower()
+            if y_var[-1] == ' ':
+                y_var = y_var.split(' ')[0].lower()
+        else:
+            y_unit = ''
+            y_var = args.ylabel.lower()
+    else:
+        y_unit = ''
+        y_var = None
+
+    blocks = BlockAverager() if args.block_average else None
+    if chunked:
+        stats, hist, x_unit, y_unit = analyze_chunks(get_chunks, args, x_unit, y_unit, domain, weigh, blocks)
+    else:
+        y, x_unit, y_unit = convert_units(y, args, x_unit, y_unit)
+        stats = RunningStats().update(y, x)
+        if blocks is not None:
+            blocks.update(y)
+        stats.find_closest(y, x)
+
+    # Some simple data analysis
+    if args.truncate is None:
+        # no truncation required
+        pass
+    else:
+        # The first truncate% of the data has been skipped by the reader
+        lines.append('Note that the first %s of the data is truncated, which is the data that the following statistics is based on.' % args.truncate)
+    lines.append('The average of %s: %5.3f%s (RMSF: %5.3f%s max: %5.3f%s, min: %5.3f%s)' % (y_var, stats.mean, y_unit, stats.rmsf, y_unit, stats.max, y_unit, stats.min, y_unit))
+    if x_unit == ' ns' or x_unit == ' ps':
+        lines.append('The maximum occurs at %5.4f%s, while the minimum occurs at %5.4f%s.' % (stats.x_max, x_unit, stats.x_min, x_unit))
+        lines.append('The configuration at %s%s has the %s (%s%s) that is cloest to the average volume.' % (stats.x_avg, x_unit, y_var, stats.y_avg, y_unit))
+
+    if blocks is not None:
+        lines.append('The standard error of the average of %s (block averaging): %5.3f%s' % (y_var, blocks.get_error(), y_unit))
+
+    # Bin the data (the out-of-core mode has binned the data in analyze_chunks)
+    if not chunked:
+        weights = next(weigh([data]))[1]
+        if domain is not None:
+            y = wrap(y, domain)
+        bounded = args.n_ratio is None and args.Nr_bound is not None
+        if bounded:
+            lower_b, upper_b = args.Nr_bound[0], args.Nr_bound[1]
+            mask = (y < upper_b) & (y > lower_b)
+            y, weights = y[mask], None if weights is None else weights[mask]
+        if args.range is not None:
+            lower, upper = args.range
+        elif domain is not None and not bounded:  # the bins of the data bounded by -Nb span the data only
+            lower, upper = domain
+        elif len(y) > 0:
+            lower, upper = np.min(y), np.max(y)
+        else:
+            lower, upper = 0, 1  # same as np.histogram
+        if isinstance(args.nbins, str):
+            q25, q75 = np.percentile(y, [25, 75]) if len(y) > 0 else (0, 0)
+            nbins = get_nbins(args.nbins, lower, upper, len(y), q75 - q25)
+        else:
+            nbins = args.nbins
+        edges = get_edges(lower, upper, nbins)
+        hist = Histogram(edges).update(y, weights)
+
+    return lines, hist
+
+
 def main():
 
     args = initialize()
@@ -110,168 +597,50 @@ def main():
     if args.legend is None:
         args.legend = args.xvg
 
-    for i in range(len(args.xvg)):
-        result_str = '\nData analysis of the file: %s' % args.xvg[i]
-        print(result_str)
-        print('=' * (len(result_str) - 1))  # len(result_str) includes \n
-        print('Analyzing the file ... ')
-        print('Plotting and saving figure ...')
-
-        x, y = [], []
-        infile = open('%s' % args.xvg[i], 'r')
-        lines = infile.readlines()
-        infile.close
-        # Parse data
-        m = 0
-        for line in lines:
-            if line[0] == '#' or line[0] == '@':
-                m += 1  # number of parameter lines
-                if 'xaxis  label "Time (ps)"' in line and args.x_conversion is None:
-                    args.x_conversion = 'ps to ns'    
-
-        # read in data starting from (m+1)-th line to the end
-        n = m   # line number
-        for line in lines[m:-1]:
-            n += 1
-            if '#' not in line and line[0] != '@':
-                # Note that when extending MetaD, COLVAR might append #! FIELDS ... 
-                # to an incomplete row of data. Also, when the simulation is extended
-                # it might rerun the last portion of the simulation (which might give
-                # slightly differen result). We'll just use the results in the extended
-                # simulation if this is the case. Note the the quantity of the time frame
-                # where the extended simulation starts is should the same as the one of 
-                # the same time frame of before the simulation gest extended.
-                tokens = line.split()
-                x.append(float(tokens[0]))
-                y.append(float(tokens[args.column]))
-            elif '#' in line:  # the case the MetaD is extended
-                tokens = lines[n].split()  # the next line of #! FIELDS ...
-                x = np.array(x)
-                x = x[x < float(tokens[0])]
-                x = list(x)
-                y = y[:len(x)]
-        x, y = np.array(x), np.array(y)
-        
-        # Unit conversion
-        if args.xlabel is not None:
-            if '(' in args.xlabel:
-                if '$' in args.xlabel.split('(')[1]:
-                    x_unit = args.xlabel.split('$')[1].split('$')[0]
-                else:
-                    x_unit = args.xlabel.split('(')[1].split(')')[0]
-                x_var = args.xlabel.split('(')[0].lower()
-                if x_var[-1] == ' ':
-                    x_var = x_var.split(' ')[0].lower()
-            else:
-                x_unit = ''
-                x_var = args.xlabel.lower()
-        else:
-            x_unit = ''
-            x_var = None 
+    if args.jobs > 1 and len(args.xvg) > 1:
+        # Parse and analyze the files in worker processes and only plot in this process
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            analyses = list(pool.map(analyze_file, args.xvg, [args] * len(args.xvg)))
+    else:
+        analyses = (analyze_file(fname, args) for fname in args.xvg)
 
+    if args.merge:
+        # Add up the histograms of all the files (map-reduce over the files)
+        lines, hists = [], []
+        for analysis in analyses:
+            lines += analysis[0]
+            hists.append(analysis[1])
+        try:
+            analyses = [(lines, functools.reduce(Histogram.merge, hists))]
+        except ValueError:
+            print('The histograms of the input files have different bin edges and cannot be merged. \
+Please specify the range of the bins by -r.')
+            return
+        args.xvg = args.xvg[:1]
 
-        if args.ylabel is not None:
-            if '(' in args.ylabel:
-                if '$' in args.ylabel.split('(')[1]:
-                    y_unit = args.ylabel.split('$')[1].split('$')[0]
-                else:
-                    y_unit = args.ylabel.split('(')[1].split(')')[0]
-                y_var = args.ylabel.split('(')[0].lower()
-                if y_var[-1] == ' ':
-                    y_var = y_var.split(' ')[0].lower()
-            else:
-                y_unit = ''
-                y_var = args.ylabel.lower()
-        else:
-            y_unit = ''
-            y_var = None
-
-        if args.temp is None:
-            args.temp = 298.15
-        conversion1 = 1.38064852 * 6.02 * args.temp / 1000  # multiply to convert from kT to kJ/mol
-        conversion2 = np.pi/180 # multiply to convert from degree to radian
-        conversion3 = 0.239005736  # multiply to convert from kJ/mol to kcal/mol
-        
-        if args.conversion == 'ps to ns':
-            y = y / 1000
-            x_unit = ' ns'
-
-        if args.conversion == 'ns to ps':
-            y = y * 1000
-            y_unit = ' ps'
-
-        if args.conversion == 'kT to kJ/mol':
-            y = y * conversion1
-            y_unit = ' kcal/mol'
-        if args.conversion == 'kJ/mol to kT':
-            y = y / conversion1
-            y_unit = ' kT'
-        if args.conversion == 'kT to kcal/mol':
-            y = y * conversion1 * conversion3
-            y_unit = ' kcal/mol'
-        if args.conversion == 'kcal/mol to kT':
-            y = y / (conversion1 * conversion3)
-            y_unit = ' kT'
-        if args.conversion == 'kJ/mol to kcal/mol':
-            y = y * conversion3
-            y_unit = 'kcal/mol'
-        if args.conversion == 'kcal/mol to kJ/mol':
-            y = y / conversion3
-            y_unit = 'kJ/mol'
-        if args.conversion == 'degree to radian':
-            y = y * conversion2
-            y_unit = ' radian'
-        if args.conversion == 'radian to degree':
-            y = y / conversion2
-            y_unit = ' degree'
-
-        if args.factor is not None:
-            y = y * args.factor
-
-        # Some simple data analysis
-        if args.truncate is None:
-            # no truncation required
-            pass
-        else:
-            y = y[int(0.01 * float(args.truncate) * len(y)):]  # truncate the first 1% of the data
-            x = x[int(0.01 * float(args.truncate) * len(x)):]  
-            print('Note that the first %s of the data is truncated, which is the data that the following statistics is based on.' % args.truncate)
-        y_avg = np.mean(y)
-        y2_avg = np.mean(np.power(y, 2))
-        RMSF = np.sqrt((y2_avg - y_avg ** 2)) / y_avg
-        print('The average of %s: %5.3f%s (RMSF: %5.3f%s max: %5.3f%s, min: %5.3f%s)' % (y_var, y_avg, y_unit, RMSF, y_unit, np.max(y), y_unit, np.min(y), y_unit))
-        if x_unit == ' ns' or x_unit == ' ps':
-            y = list(y)
-            print('The maximum occurs at %5.4f%s, while the minimum occurs at %5.4f%s.' % (x[y.index(max(y))], x_unit, x[y.index(min(y))], x_unit))
-            y = np.array(y)
-            diff = np.abs(y - y_avg)
-            t_avg = x[np.argmin(diff)]
-            print('The configuration at %s%s has the %s (%s%s) that is cloest to the average volume.' % (t_avg, x_unit, y_var, y[np.argmin(diff)], y_unit))
-
-        # Calculate the N_ratio and plot the histogram
+    for lines, hist in analyses:
+        print('\n'.join(lines))
+
+        # Calculate the N_ratio and plot the histogram (of the precomputed counts)
+        counts, edges = hist.counts, hist.edges
+        results = (counts, edges)
+        if args.outline is True:
+            plt.bar(edges[:-1], counts, width=np.diff(edges), align='edge', edgecolor='black', linewidth=1.2)
+        elif args.outline is False:
+            plt.bar(edges[:-1], counts, width=np.diff(edges), align='edge')
         if args.n_ratio is None:   # N_ratio = x(max) / x(min)
-            if args.Nr_bound is not None:
-                lower_b, upper_b = args.Nr_bound[0], args.Nr_bound[1]
-                y = y[y < upper_b]
-                y = y[y > lower_b]
-            if args.outline is True:
-                results = plt.hist(y, bins=args.nbins, edgecolor='black', linewidth=1.2)
-            elif args.outline is False:
-                results = plt.hist(y, bins=args.nbins)
-            N_ratio = np.max(results[0])/np.min(results[0])
+            print(f'N_ratio = {get_n_ratio(counts, edges): .3f}')
+        elif len(args.n_ratio) % 2 == 1:
+            print('The x values for N_ratio calculation should be given in pairs! Calculation of N_ratio is skipped.')
         else:
-            if args.outline is True:
-                results = plt.hist(y, bins=args.nbins, edgecolor='black', linewidth=1.2)
-            elif args.outline is False:
-                results = plt.hist(y, bins=args.nbins)
-            centers = list(results[1])
-            for c in args.n_ratio:
-                if c not in centers:
-                    print('Centers specified for N_ratio calculation not found! Calculation of N_ratio is skipped.')
-                    break
-            c1, c2 = args.n_ratio[0], args.n_ratio[1]
-            N_ratio = results[0][centers.index(c1)] / results[0][centers.index(c2)]
-        print(f'N_ratio = {N_ratio: .3f}')
+            x1, x2 = args.n_ratio[0::2], args.n_ratio[1::2]
+            for c1, c2, N_ratio in zip(x1, x2, get_ratios(counts, edges, x1, x2)):
+                if np.isnan(N_ratio):
+                    print(f'The x values ({c1}, {c2}) for N_ratio calculation are out of the range of the bins! Calculation of N_ratio is skipped.')
+                elif len(x1) == 1:
+                    print(f'N_ratio = {N_ratio: .3f}')
+                else:
+                    print(f'N_ratio ({c1}, {c2}) = {N_ratio: .3f}')
 
     if args.title is not None:
         plt.title('%s' % args.title)
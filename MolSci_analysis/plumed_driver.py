@@ -7,6 +7,8 @@ import argparse
 import numpy as np 
 import matplotlib.pyplot as plt 
 from matplotlib import rc
+from MolSci_analysis.readers import read_columns
+from MolSci_analysis.stats import RunningStats
 
 def initialize():
 
@@ -59,35 +61,14 @@ def main():
     args = initialize()
 
     # Part 1: Parse the file
-    x, y = [], []
-    infile = open(args.dat)
-    lines = infile.readlines()
-    infile.close
-
-    line_n = 0
-    for line in lines:
-        line_n += 1
-        if '#! FIELDS' in line:   # lines[line_n - 1]
-            variables = line.split('FIELDS')[1].split()
-            n_vars = len(variables)  # min of n_vars: 2 (x and y)
-
-            if n_vars > 2:        # multiple y variables
-                for i in range(n_vars - 1):  # not including x
-                    y.append([])
-            break
-        
-    for line in lines[line_n:]:
-        if line[0] != 'P' and line[0] != '#':     # in case of including "PLUMED:   "
-            data = line.split()
-            x.append(float(data[0]))
-
-            if n_vars == 2:
-                y.append(float(data[1]))
-            else:
-                for i in range(n_vars - 1):
-                    y[i].append(float(data[i + 1]))
-
-    x, y = np.array(x), np.array(y)
+    data, header = read_columns(args.dat)
+    variables = header['fields']
+    n_vars = len(variables)  # min of n_vars: 2 (x and y)
+    x = data[:, 0]
+    if n_vars == 2:
+        y = data[:, 1]
+    else:                    # multiple y variables
+        y = data[:, 1:n_vars].T
     if variables[0] == 'time':
         x /= 1000     # convert from ps to ns
         x *= float(args.timestep)
@@ -102,19 +83,13 @@ def main():
     print(result_str)
     print('=' * len(result_str))
     if n_vars == 2:
-        y_avg = np.mean(y)
-        y2_avg = np.mean(np.power(y, 2))
-        RMSF = np.sqrt((y2_avg - y_avg ** 2)) / y_avg
-        print('The average of %s: %5.3f %s (RMSF: %5.3f %s max: %5.3f %s, min: %5.3f %s)' %(variables[1], np.mean(y), y_unit, RMSF, y_unit, np.max(y), y_unit, np.min(y), y_unit))
-        y = list(y)
-        print('The maximum occurs at %s ns, while the minimum occurs at %s ns.' %(x[y.index(max(y))], x[y.index(min(y))]))
-        y = np.array(y)
+        stats = RunningStats().update(y, x)
+        print('The average of %s: %5.3f %s (RMSF: %5.3f %s max: %5.3f %s, min: %5.3f %s)' %(variables[1], stats.mean, y_unit, stats.rmsf, y_unit, stats.max, y_unit, stats.min, y_unit))
+        print('The maximum occurs at %s ns, while the minimum occurs at %s ns.' %(stats.x_max, stats.x_min))
     else:
         for i in range(n_vars - 1):
-            y_avg = np.mean(y[i])
-            y2_avg = np.mean(np.power(y[i], 2))
-            RMSF = np.sqrt((y2_avg - y_avg ** 2)) / y_avg
-            print('The average of %s: %5.3f %s (RMSF: %5.3f %s max: %5.3f %s, min: %5.3f %s)' %(variables[i + 1], np.mean(y[i]), y_unit, RMSF, y_unit, np.max(y[i]), y_unit, np.min(y[i]), y_unit))
+            stats = RunningStats().update(y[i], x)
+            print('The average of %s: %5.3f %s (RMSF: %5.3f %s max: %5.3f %s, min: %5.3f %s)' %(variables[i + 1], stats.mean, y_unit, stats.rmsf, y_unit, stats.max, y_unit, stats.min, y_unit))
 
     # Part 3: Plot and save the figure
     plt.figure()
@@ -0,0 +1,1179 @@
+"""
+readers.py
+Shared reader for the text outputs analyzed in this package, including the
+.xvg files of GROMACS and the COLVAR/HILLS files of PLUMED.
+
+The files are read in large binary blocks and the numeric rows of each block
+are converted to NumPy arrays in bulk, so no Python list of floats is ever
+built. Lines starting with #, @ or PLUMED: are treated as non-data lines.
+Files compressed by gzip, bzip2, xz or zstd (which requires the zstandard
+package) are detected from their magic bytes and decompressed while being
+read, so no decompressed copy of the file is ever written or held in memory.
+"""
+import io
+import os
+import re
+import bz2
+import gzip
+import lzma
+import mmap
+import heapq
+import numpy as np
+from MolSci_analysis import cache
+
+BLOCK_SIZE = 2 ** 24  # number of bytes read from the file at a time
+INDEX_EVERY = 10000  # number of data rows between two checkpoints of the index
+CHUNK_ROWS = 10 ** 6  # default number of rows of the chunks in the out-of-core mode
+MARKERS = (b'#', b'@', b'PLUMED:')  # markers of the non-data lines
+MAGIC = {b'\x1f\x8b': 'gzip', b'BZh': 'bz2', b'\xfd7zXZ\x00': 'xz', b'\x28\xb5\x2f\xfd': 'zstd'}
+
+
+def detect_compression(fname):
+    """
+    Detects the compression of a file from its magic bytes.
+
+    Parameters
+    ----------
+    fname (str): The name of the file.
+
+    Returns
+    -------
+    compression (str): 'gzip', 'bz2', 'xz' or 'zstd', or None if the file is
+        not compressed.
+    """
+    with open(fname, 'rb') as f:
+        magic = f.read(6)
+    for m in MAGIC:
+        if magic.startswith(m):
+            return MAGIC[m]
+
+    return None
+
+
+def open_file(fname):
+    """
+    Opens a (possibly compressed) file in binary mode. Compressed files are
+    decompressed while being read.
+
+    Parameters
+    ----------
+    fname (str): The name of the file.
+
+    Returns
+    -------
+    f (file object): The file object of the decompressed stream.
+    """
+    compression = detect_compression(fname)
+    if compression is None:
+        return open(fname, 'rb')
+    elif compression == 'gzip':
+        return gzip.open(fname, 'rb')
+    elif compression == 'bz2':
+        return bz2.open(fname, 'rb')
+    elif compression == 'xz':
+        return lzma.open(fname, 'rb')
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError('The Python package zstandard is required to read the zstd-compressed file %s.' % fname)
+
+    return zstandard.ZstdDecompressor().stream_reader(open(fname, 'rb'), closefd=True)
+
+
+def parse_header(lines, header=None):
+    """
+    Parses the comment lines of a GROMACS or PLUMED output file.
+
+    Parameters
+    ----------
+    lines (list of str): The comment lines to be parsed.
+    header (dict): The header to be updated. If None, a new header is created.
+
+    Returns
+    -------
+    header (dict): A dictionary with the following keys
+        - fields (list of str): The names in the latest "#! FIELDS" line.
+        - set (dict): The constants given by "#! SET" lines.
+        - comments (list of str): All the comment lines.
+    """
+    if header is None:
+        header = {'fields': [], 'set': {}, 'comments': []}
+    for line in lines:
+        header['comments'].append(line)
+        tokens = line.split()
+        if len(tokens) >= 2 and tokens[0] == '#!':
+            if tokens[1] == 'FIELDS':
+                header['fields'] = tokens[2:]
+            elif tokens[1] == 'SET' and len(tokens) >= 4:
+                header['set'][tokens[2]] = tokens[3]
+
+    return header
+
+
+def parse_value(text):
+    """
+    Parses a number written by PLUMED, which might be a multiple of pi (e.g.
+    the bounds "-pi" and "pi" of a torsion angle in the "#! SET" lines).
+
+    Parameters
+    ----------
+    text (str): The text to be parsed, e.g. "1.5", "-pi" or "2*pi".
+
+    Returns
+    -------
+    value (float): The parsed number.
+    """
+    text = text.strip()
+    if not text.endswith('pi'):
+        return float(text)
+    factor = text[:-2].rstrip('*')
+    if factor in ['', '+', '-']:
+        factor += '1'
+
+    return float(factor) * np.pi
+
+
+def get_domain(header, name):
+    """
+    Gets the periodic domain of a CV from the "#! SET min_<name>" and
+    "#! SET max_<name>" lines of a PLUMED output file.
+
+    Parameters
+    ----------
+    header (dict): The header of the file. See parse_header for details.
+    name (str): The name of the CV.
+
+    Returns
+    -------
+    domain (tuple): The lower and upper bounds of the CV, or None if the CV is
+        not periodic.
+    """
+    lower, upper = header['set'].get('min_%s' % name), header['set'].get('max_%s' % name)
+    if lower is None or upper is None:
+        return None
+
+    return parse_value(lower), parse_value(upper)
+
+
+def parse_domains(values):
+    """
+    Parses the periodic domains of CVs given on the command line as pairs of
+    lower and upper bounds, where "none none" stands for a non-periodic CV.
+
+    Parameters
+    ----------
+    values (list of str): The bounds, e.g. ['-3.14159265', 'pi', 'none', 'none'].
+
+    Returns
+    -------
+    domains (list): The lower and upper bounds of each periodic CV, or None
+        for each non-periodic CV.
+    """
+    if len(values) % 2 != 0:
+        raise ValueError('The periodic domains should be given as pairs of lower and upper bounds.')
+    domains = []
+    for lower, upper in zip(values[::2], values[1::2]):
+        if lower.lower() == 'none':
+            domains.append(None)
+        else:
+            domains.append((parse_value(lower), parse_value(upper)))
+
+    return domains
+
+
+def iter_blocks(f, block_size=BLOCK_SIZE, size=None):
+    """
+    Reads a binary file object in blocks which only contain complete lines.
+    A trailing line without a newline character (e.g. a row being written by
+    a running simulation) is not yielded.
+
+    Parameters
+    ----------
+    f (file object): The file object opened in binary mode.
+    block_size (int): The number of bytes to be read at a time.
+    size (int): The number of bytes to be read from the current position,
+        which should end at the end of a line. If None, the file is read to
+        the end.
+
+    Yields
+    ------
+    block (bytes): A block of complete lines.
+    """
+    carry = b''
+    while size is None or size > 0:
+        chunk = f.read(block_size if size is None else min(block_size, size))
+        if not chunk:
+            break
+        if size is not None:
+            size -= len(chunk)
+        if carry:
+            chunk = carry + chunk
+        cut = chunk.rfind(b'\n') + 1
+        carry = chunk[cut:]
+        if cut:
+            yield chunk[:cut]
+
+
+def split_block(block):
+    """
+    Splits a block of complete lines into runs of consecutive data lines and
+    single non-data lines. Only C-level searches are used to locate the
+    non-data lines, so a block of pure data is passed on as it is.
+
+    Parameters
+    ----------
+    block (bytes): A block of complete lines.
+
+    Yields
+    ------
+    is_data (bool): Whether the yielded bytes are data lines.
+    text (bytes): A run of data lines or a single non-data line.
+    """
+    pos, n = 0, len(block)
+    hits = [block.find(m) for m in MARKERS]
+    while pos < n:
+        found = [p for p in hits if p != -1]
+        if not found:
+            yield True, block[pos:]
+            return
+        hit = min(found)
+        start = max(block.rfind(b'\n', pos, hit) + 1, pos)  # start of the line
+        end = block.find(b'\n', hit) + 1
+        if end == 0:
+            end = n
+        if start > pos:
+            yield True, block[pos:start]
+        yield False, block[start:end]
+        pos = end
+        hits = [p if p == -1 or p >= pos else block.find(m, pos) for p, m in zip(hits, MARKERS)]
+
+
+def resolve_columns(columns, fields):
+    """
+    Converts the requested columns into column indices.
+
+    Parameters
+    ----------
+    columns (list of int or str): The requested columns, given either by the
+        (python) index or by the name in the "#! FIELDS" line.
+    fields (list of str): The names in the "#! FIELDS" line.
+
+    Returns
+    -------
+    indices (list of int): The indices of the requested columns.
+    """
+    indices = []
+    for c in columns:
+        if isinstance(c, str) and c.lstrip('-').isdigit():
+            c = int(c)
+        if isinstance(c, str):
+            if c not in fields:
+                raise ValueError('Column %s not found in the FIELDS of the file: %s' % (c, ' '.join(fields)))
+            c = fields.index(c)
+        indices.append(c)
+
+    return indices
+
+
+def get_usecols(columns, fields):
+    """
+    Gets the columns to be converted by the parser given the requested columns.
+    The time column is always converted since it is needed to merge the
+    segments of restarted simulations.
+
+    Parameters
+    ----------
+    columns (list of int or str): The requested columns. If None, all the
+        columns are requested.
+    fields (list of str): The names in the "#! FIELDS" line.
+
+    Returns
+    -------
+    usecols (tuple of int): The columns to be converted, starting with 0.
+    select (list of int): The positions of the requested columns in usecols.
+    """
+    if columns is None:
+        return None, None
+    indices = resolve_columns(columns, fields)
+    usecols = tuple([0] + [c for c in dict.fromkeys(indices) if c != 0])
+    select = [usecols.index(c) for c in indices]
+
+    return usecols, select
+
+
+def comment_line(text):
+    """
+    Cleans up a non-data line yielded by split_block.
+
+    Parameters
+    ----------
+    text (bytes): The non-data line.
+
+    Returns
+    -------
+    line (str): The comment line, or None for the messages of PLUMED.
+    """
+    line = text.decode().rstrip('\n')
+    if line.startswith('PLUMED:'):
+        return None
+    if '#' in line:
+        # A data row interrupted by the header of an extended simulation is dropped
+        line = line[line.index('#'):]
+
+    return line
+
+
+def parse_data(text, n_cols=None, usecols=None):
+    """
+    Converts a run of data lines into a 2D NumPy array in bulk. Rows whose
+    number of columns differs from n_cols (e.g. rows truncated by a crash)
+    are discarded. If usecols is specified, only the requested columns are
+    converted to floats.
+
+    Parameters
+    ----------
+    text (bytes): The data lines.
+    n_cols (int): The expected number of columns. If None, the number of
+        columns of the first row is used.
+    usecols (tuple of int): The indices of the columns to be converted. If
+        None, all the columns are converted.
+
+    Returns
+    -------
+    data (np.ndarray): The data with shape (n_rows, n_cols) or
+        (n_rows, len(usecols)).
+    """
+    try:
+        data = np.loadtxt(io.BytesIO(text), ndmin=2, comments=None, usecols=usecols)
+        if usecols is not None or n_cols is None or data.shape[1] == n_cols or data.size == 0:
+            return data
+    except ValueError:
+        pass
+
+    # Slow path only for blocks containing malformed rows
+    rows = [line.split() for line in text.splitlines()]
+    rows = [r for r in rows if r]
+    if n_cols is None:
+        n_cols = len(rows[0]) if rows else 0
+    good = b'\n'.join(b' '.join(r) for r in rows if len(r) == n_cols)
+    n_out = n_cols if usecols is None else len(usecols)
+    if not good:
+        return np.empty((0, n_out))
+    return np.loadtxt(io.BytesIO(good), ndmin=2, comments=None, usecols=usecols).reshape(-1, n_out)
+
+
+def line_bounds(text):
+    """
+    Locates the non-blank lines of a run of data lines with NumPy.
+
+    Parameters
+    ----------
+    text (bytes): The data lines.
+
+    Returns
+    -------
+    starts (np.ndarray): The byte offsets of the starts of the lines.
+    ends (np.ndarray): The byte offsets of the ends of the lines (after the
+        newline characters).
+    """
+    ends = np.flatnonzero(np.frombuffer(text, dtype=np.uint8) == 10)
+    starts = np.concatenate([[0], ends[:-1] + 1]).astype(int)
+    nonblank = ends > starts
+
+    return starts[nonblank], ends[nonblank] + 1
+
+
+def filter_rows(text, begin=None, end=None, stride=1, phase=0, rows=None):
+    """
+    Selects the rows in a time window and/or with a stride from a run of data
+    lines without converting the skipped rows to floats. Since the time is
+    monotonic within a segment, only the times of the first and the last rows
+    are converted, unless the run straddles the start or the end of the time
+    window, in which case the time column of the run is converted.
+
+    Parameters
+    ----------
+    text (bytes): The data lines.
+    begin (float): The first time to be selected. If None, there is no lower bound.
+    end (float): The last time to be selected. If None, there is no upper bound.
+    stride (int): Only every stride-th row is selected.
+    phase (int): The number of rows of the same segment before this run, so that
+        the rows selected by the stride are those whose indices in the segment
+        are multiples of stride.
+    rows (tuple of int): The range of the rows (of this run) to be considered.
+        If None, all the rows are considered.
+
+    Returns
+    -------
+    text (bytes): The selected rows.
+    n_rows (int): The number of rows of the input.
+    """
+    starts, ends = line_bounds(text)
+    n = len(starts)
+    lo, hi = (0, n) if rows is None else (max(rows[0], 0), min(rows[1], n))
+    if lo >= hi:
+        return b'', n
+
+    sel = None
+    if begin is not None or end is not None:
+        lower = -np.inf if begin is None else begin
+        upper = np.inf if end is None else end
+        t_first = float(text[starts[lo]:ends[lo]].split()[0])
+        t_last = float(text[starts[hi - 1]:ends[hi - 1]].split()[0])
+        if t_last < lower or t_first > upper:
+            return b'', n
+        if t_first < lower or t_last > upper:
+            t = parse_data(text[starts[lo]:ends[hi - 1]], usecols=(0,))[:, 0]
+            if len(t) != hi - lo:  # malformed rows
+                t = np.array([float(text[starts[k]:ends[k]].split()[0]) for k in range(lo, hi)])
+            sel = lo + np.flatnonzero((t >= lower) & (t <= upper))
+
+    if sel is None:
+        if stride == 1:
+            return text[starts[lo]:ends[hi - 1]], n
+        sel = np.arange(lo, hi)
+    if stride > 1:
+        sel = sel[(sel + phase) % stride == 0]
+    if len(sel) == 0:
+        return b'', n
+    if sel[-1] - sel[0] + 1 == len(sel):  # contiguous rows
+        return text[starts[sel[0]]:ends[sel[-1]]], n
+
+    return b''.join([text[starts[k]:ends[k]] for k in sel]), n
+
+
+def merge_segments(segments, starts=None):
+    """
+    Merges the segments of a restarted simulation in linear time. For the
+    time frames covered by more than one segment, only the rows of the newest
+    segment are kept. Since the time is monotonic within a segment, the rows
+    kept in each segment are found by a binary search for the earliest start
+    time of all later segments, and all the kept rows are copied only once.
+
+    Parameters
+    ----------
+    segments (list): The segments in the order of the file, each of which is a
+        list of 2D arrays (chunks of rows) whose first column is the time.
+    starts (list of float): The start time of each segment before its rows
+        were filtered by a time window or a stride (None if unknown), so that
+        a segment without rows left still cuts off the earlier segments. If
+        None, the time of the first row of each segment is used.
+
+    Returns
+    -------
+    data (np.ndarray): The merged data as a contiguous 2D array.
+    """
+    pieces = []
+    cutoff = np.inf  # the earliest start time of the later segments
+    starts = [None] * len(segments) if starts is None else starts
+    for seg, start in zip(reversed(segments), reversed(starts)):
+        seg = [chunk for chunk in seg if len(chunk) > 0]
+        for chunk in reversed(seg):
+            n = np.searchsorted(chunk[:, 0], cutoff, side='left')
+            if n > 0:
+                pieces.append(chunk[:n])
+        if start is not None:
+            cutoff = min(cutoff, start)
+        elif seg:
+            cutoff = min(cutoff, seg[0][0, 0])
+    if not pieces:
+        return np.empty((0, 0))
+
+    return np.concatenate(pieces[::-1])
+
+
+def read_columns(fname, columns=None, begin=None, end=None, stride=1, block_size=BLOCK_SIZE, use_cache=True):
+    """
+    Reads the numeric data of a GROMACS/PLUMED output file. Only the requested
+    columns are converted and kept in memory, so the cost scales with the
+    number of requested columns rather than the width of the file. The parsed
+    results are saved in the binary cache (see cache.py), so reading the same
+    file again only takes the time of loading an .npz file. If the file has
+    grown by appends since it was cached (e.g. the COLVAR or HILLS file of a
+    running simulation), only the appended bytes are parsed.
+
+    When a MetaD simulation is extended, PLUMED appends a new "#! FIELDS"
+    header to COLVAR (possibly right after an incomplete row), and the
+    extended simulation might rerun the last portion of the simulation. In
+    this case, only the results of the extended simulation are kept for the
+    overlapping time frames.
+
+    The time window and the stride are applied while parsing, so the skipped
+    rows are never converted to floats. The stride counts the rows from the
+    start of each segment.
+
+    Parameters
+    ----------
+    fname (str): The name of the input file.
+    columns (list of int or str): The columns to be read, given either by the
+        (python) index or by the name in the "#! FIELDS" line. If None, all the
+        columns are read.
+    begin (float): The first time (in the units of the file) to be read. If
+        None, the data is read from the start of the file.
+    end (float): The last time to be read. If None, the data is read until the
+        end of the file.
+    stride (int): Only every stride-th row is read.
+    block_size (int): The number of bytes to be read at a time.
+    use_cache (bool): Whether to use the binary cache.
+
+    Returns
+    -------
+    data (np.ndarray): The data with shape (n_rows, n_cols), where n_cols is
+        the number of requested columns. If columns is None, the first column
+        is the time (or the independent variable).
+    header (dict): The header of the file. See parse_header for details.
+    """
+    data, state = None, None
+    if use_cache:
+        key = cache.get_key(fname, columns, begin, end, stride)
+        data, state, up_to_date = _load_cached(key, fname)
+        if up_to_date:
+            return select_columns(data, state['select']), state['header']
+
+    data, state = _parse_columns(fname, columns, block_size, data, state, (begin, end, stride))
+    if use_cache:
+        cache.save(key, {'data': data}, state)
+
+    return select_columns(data, state['select']), state['header']
+
+
+def select_columns(data, select):
+    """
+    Selects the requested columns from the parsed data, whose first column is
+    always the time.
+
+    Parameters
+    ----------
+    data (np.ndarray): The parsed data.
+    select (list of int): The positions of the requested columns. If None,
+        all the columns are returned.
+
+    Returns
+    -------
+    data (np.ndarray): The requested columns.
+    """
+    if select is None or select == list(range(data.shape[1])):
+        return data
+    if data.size == 0:
+        return np.empty((0, len(select)))
+
+    return data[:, select]
+
+
+def _load_cached(key, fname):
+    """
+    Loads the cached parse of a file. The cached results are discarded unless
+    the bytes parsed before are unchanged, i.e. unless the file is the same or
+    has only been appended to. For compressed files, the offsets refer to the
+    decompressed stream, so the cached results are only used if the whole
+    file is unchanged.
+
+    Returns
+    -------
+    data (np.ndarray): The cached data (with the time column), or None.
+    state (dict): The state of the parser after the cached parse, or None.
+    up_to_date (bool): Whether the cached results cover the whole file.
+    """
+    arrays, state = cache.load(key)
+    if arrays is None:
+        return None, None, False
+    stat = os.stat(fname)
+    end = None if state.get('compression') else state['offset']
+    if (end is not None and stat.st_size < end) or cache.content_hash(fname, end) != state['hash']:
+        return None, None, False
+    up_to_date = stat.st_size == state['size'] and stat.st_mtime == state['mtime']
+    if state.get('compression') and not up_to_date:
+        return None, None, False
+
+    return arrays['data'], state, up_to_date
+
+
+def _parse_columns(fname, columns, block_size, data=None, state=None, window=(None, None, 1)):
+    """
+    Parses the numeric data of a GROMACS/PLUMED output file. See read_columns
+    for the parameters, where window is (begin, end, stride).
+    If the data and the state of the parser from a previous parse are given,
+    only the bytes after state['offset'] are parsed and appended to the data.
+    (The partial trailing line of the previous parse is read again.)
+
+    Returns
+    -------
+    data (np.ndarray): The parsed data, where the first column is the time.
+    state (dict): The state of the parser, including the header and the byte
+        offset of the end of the last parsed line.
+    """
+    if state is None:
+        state = {'offset': 0, 'header': parse_header([]), 'n_cols': None, 'seg_lines': 0,
+                 'new_segment': False, 'usecols': None, 'select': None}
+    stat = os.stat(fname)  # before parsing, in case the file grows meanwhile
+    compression = detect_compression(fname)
+    header, offset = state['header'], state['offset']
+    n_cols, seg_lines = state['n_cols'], state['seg_lines']  # seg_lines: number of rows of the current segment
+    begin, end, stride = window
+    filtered = begin is not None or end is not None or stride > 1
+    usecols, select = state['usecols'], state['select']  # resolved once the FIELDS line is known
+    segments = [[] if data is None else [data]]  # each restart of the simulation starts a new segment
+    starts = [None]  # the start times of the segments before the rows are filtered by the window
+    if state.get('new_segment'):  # the last parse stopped in a restarted segment without kept rows yet
+        segments.append([])
+        starts.append(state.get('seg_start'))
+
+    with open_file(fname) as f:
+        if offset > 0:
+            f.seek(offset)
+        for block in iter_blocks(f, block_size):
+            offset += len(block)
+            for is_data, text in split_block(block):
+                if is_data:
+                    if columns is not None and usecols is None:
+                        usecols, select = get_usecols(columns, header['fields'])
+                    n_lines = None
+                    if filtered:
+                        if seg_lines == 0 and starts[-1] is None:
+                            line_starts, line_ends = line_bounds(text)
+                            if len(line_starts) > 0:
+                                starts[-1] = float(text[line_starts[0]:line_ends[0]].split()[0])
+                        text, n_lines = filter_rows(text, begin, end, stride, seg_lines)
+                    new = parse_data(text, n_cols, usecols) if text else []
+                    seg_lines += len(new) if n_lines is None else n_lines
+                    if len(new) > 0:
+                        if usecols is None:
+                            n_cols = new.shape[1]
+                        segments[-1].append(new)
+                    continue
+
+                line = comment_line(text)
+                if line is None:
+                    continue
+                if line.startswith('#! FIELDS') and seg_lines > 0:
+                    segments.append([])
+                    starts.append(None)
+                    n_cols, seg_lines = None, 0
+                parse_header([line], header)
+                if header['fields'] and line.startswith('#! FIELDS'):
+                    n_cols = len(header['fields'])
+
+    data = merge_segments(segments, starts)
+    new_segment = len(segments) > 1 and not any(len(chunk) > 0 for chunk in segments[-1])
+
+    state.update({'offset': offset, 'size': stat.st_size, 'mtime': stat.st_mtime, 'compression': compression,
+                  'hash': cache.content_hash(fname, None if compression else offset),
+                  'n_cols': n_cols, 'seg_lines': seg_lines,
+                  'new_segment': new_segment, 'seg_start': starts[-1] if new_segment else None,
+                  'usecols': None if usecols is None else list(usecols), 'select': select})
+
+    return data, state
+
+
+def index_name(fname):
+    """
+    Gets the name of the sidecar index file of an output file.
+
+    Parameters
+    ----------
+    fname (str): The name of the output file.
+
+    Returns
+    -------
+    idx_name (str): The name of the sidecar index file.
+    """
+    return '%s.idx.npz' % fname
+
+
+def build_index(fname, every=INDEX_EVERY, block_size=BLOCK_SIZE):
+    """
+    Builds the byte-offset index of a GROMACS/PLUMED output file in one pass.
+    Only newline characters are located (with NumPy) and only the time
+    column of the checkpoint rows is converted to floats.
+
+    Parameters
+    ----------
+    fname (str): The name of the output file.
+    every (int): The number of data rows between two checkpoints.
+    block_size (int): The number of bytes to be read at a time.
+
+    Returns
+    -------
+    index (dict): The index of the file, with the following keys
+        - size, mtime: The size and modification time of the indexed file.
+        - every: The number of data rows between two checkpoints.
+        - end: The byte offset of the end of the last complete line.
+        - header_end: The byte offset of the end of the leading header.
+        - fields_offsets: The byte offsets of all "#! FIELDS" lines.
+        - seg_offsets, seg_ends: The byte ranges of the segments, each of
+          which corresponds to a (re)start of the simulation.
+        - seg_rows: The number of data rows of each segment.
+        - seg_keep: The number of rows of each segment kept after the merge
+          of the restarted segments. (See read_columns.)
+        - ck_offsets, ck_seg, ck_rows, ck_times: The byte offsets, segments,
+          row numbers (in the segment) and times of the checkpoint rows.
+        - n_rows: The number of rows after the merge of the segments.
+    """
+    stat = os.stat(fname)
+    fields_offsets, seg_offsets, seg_ends, seg_rows = [], [0], [], [0]
+    ck_offsets, ck_seg, ck_lines = [], [], []
+    header_end = None
+    offset = 0
+
+    with open_file(fname) as f:
+        for block in iter_blocks(f, block_size):
+            for is_data, text in split_block(block):
+                if is_data:
+                    starts = line_bounds(text)[0]  # blank lines are not data rows
+                    if header_end is None:
+                        header_end = offset
+                    first = (-seg_rows[-1]) % every
+                    ck_offsets.append(starts[first::every] + offset)
+                    ck_seg.append(np.full(len(ck_offsets[-1]), len(seg_rows) - 1))
+                    ck_lines.extend(text[i:text.find(b'\n', i) + 1] for i in starts[first::every])
+                    seg_rows[-1] += len(starts)
+                else:
+                    line = comment_line(text)
+                    if line is not None and line.startswith('#! FIELDS'):
+                        fields_offsets.append(offset)
+                        if seg_rows[-1] > 0:  # restart of the simulation
+                            seg_ends.append(offset)
+                            seg_offsets.append(offset)
+                            seg_rows.append(0)
+                offset += len(text)
+
+    seg_ends.append(offset)
+    ck_offsets = np.concatenate(ck_offsets) if ck_offsets else np.zeros(0, dtype=int)
+    ck_seg = np.concatenate(ck_seg) if ck_seg else np.zeros(0, dtype=int)
+    ck_rows = np.zeros(len(ck_seg), dtype=int)
+    for j in range(len(seg_rows)):
+        mask = ck_seg == j
+        ck_rows[mask] = np.arange(np.sum(mask)) * every
+
+    index = {'size': stat.st_size, 'mtime': stat.st_mtime, 'every': every, 'end': offset,
+             'header_end': offset if header_end is None else header_end,
+             'fields_offsets': np.array(fields_offsets, dtype=int),
+             'seg_offsets': np.array(seg_offsets, dtype=int), 'seg_ends': np.array(seg_ends, dtype=int),
+             'seg_rows': np.array(seg_rows, dtype=int), 'ck_offsets': ck_offsets, 'ck_seg': ck_seg,
+             'ck_rows': ck_rows}
+
+    index['ck_times'] = parse_data(b''.join(ck_lines), usecols=(0,))[:, 0] if ck_lines else np.zeros(0)
+    index['seg_keep'] = _count_kept_rows(fname, index)
+    index['n_rows'] = int(np.sum(index['seg_keep']))
+
+    return index
+
+
+def _count_kept_rows(fname, index):
+    """
+    Counts the rows of each segment kept after the merge of the restarted
+    segments, i.e. the rows earlier than the start of all later segments. Only
+    the time column of one checkpoint interval per segment is converted.
+    """
+    seg_rows, ck_seg, ck_times = index['seg_rows'], index['ck_seg'], index['ck_times']
+    keep = seg_rows.copy()
+    cutoff = np.inf
+    for j in range(len(seg_rows) - 1, -1, -1):
+        mask = np.flatnonzero(ck_seg == j)
+        if len(mask) == 0:
+            continue
+        if cutoff < np.inf:
+            c = mask[0] + max(np.searchsorted(ck_times[mask], cutoff, side='left') - 1, 0)
+            end = index['ck_offsets'][c + 1] if c + 1 < len(ck_seg) and ck_seg[c + 1] == j \
+                else index['seg_ends'][j]
+            t = _parse_region(read_range(fname, index['ck_offsets'][c], end), (0,))[:, 0]
+            keep[j] = index['ck_rows'][c] + np.searchsorted(t, cutoff, side='left')
+        cutoff = min(cutoff, ck_times[mask[0]])
+
+    return keep
+
+
+def read_range(fname, start, end):
+    """
+    Reads a byte range of a (possibly compressed) file. For compressed files,
+    the offsets refer to the decompressed stream.
+
+    Parameters
+    ----------
+    fname (str): The name of the file.
+    start (int): The byte offset of the start of the range.
+    end (int): The byte offset of the end of the range.
+
+    Returns
+    -------
+    text (bytes): The bytes in the range.
+    """
+    with open_file(fname) as f:
+        f.seek(start)
+        return f.read(end - start)
+
+
+def _parse_region(text, usecols=None, n_cols=None):
+    """
+    Parses the data rows in a byte range of a file.
+    """
+    data = [parse_data(t, n_cols, usecols) for is_data, t in split_block(text) if is_data]
+    data = [d for d in data if len(d) > 0]
+    if not data:
+        return np.empty((0, (n_cols or 0) if usecols is None else len(usecols)))
+
+    return np.concatenate(data)
+
+
+def load_index(fname, every=INDEX_EVERY):
+    """
+    Loads the sidecar index of a GROMACS/PLUMED output file. The index is
+    (re)built and saved if it does not exist, if it is outdated, or if it
+    was built with a different checkpoint interval. If the sidecar file can
+    not be written, the index is only kept in memory.
+
+    Parameters
+    ----------
+    fname (str): The name of the output file.
+    every (int): The number of data rows between two checkpoints.
+
+    Returns
+    -------
+    index (dict): The index of the file. See build_index for details.
+    """
+    stat = os.stat(fname)
+    idx_name = index_name(fname)
+    if os.path.isfile(idx_name):
+        try:
+            with np.load(idx_name) as f:
+                index = {key: f[key] for key in f.files}
+            if index['size'] == stat.st_size and index['mtime'] == stat.st_mtime and index['every'] == every:
+                return index
+        except (OSError, ValueError, KeyError):
+            pass
+
+    index = build_index(fname, every)
+    try:
+        with open(idx_name, 'wb') as f:
+            np.savez(f, **index)
+    except OSError:
+        pass
+
+    return index
+
+
+def _segment_regions(index, start, stop, begin=None, end=None):
+    """
+    Locates the byte ranges of the segments to be read for a range of rows
+    and/or a time window, at the resolution of the checkpoints of the index.
+    The time window is located by a binary search of the checkpoint times of
+    each segment, in which the time is monotonic.
+
+    Yields
+    ------
+    j (int): The segment.
+    lo, hi (int): The byte offsets of the start and the end of the range,
+        which start at a checkpoint row and end at the end of a line.
+    row (int): The row number (in the segment) of the first row of the range.
+    a, b (int): The range of the rows (in the segment) to be kept.
+    """
+    seg_start = np.concatenate([[0], np.cumsum(index['seg_keep'])])
+    for j in range(len(index['seg_keep'])):
+        a, b = max(start - seg_start[j], 0), min(stop - seg_start[j], index['seg_keep'][j])
+        if a >= b:
+            continue
+        cks = np.flatnonzero(index['ck_seg'] == j)
+        c1 = np.searchsorted(index['ck_rows'][cks], a, side='right') - 1
+        c2 = np.searchsorted(index['ck_rows'][cks], b, side='left')
+        if begin is not None:  # the last checkpoint not later than begin
+            c1 = max(c1, np.searchsorted(index['ck_times'][cks], begin, side='right') - 1)
+        if end is not None:  # the first checkpoint later than end
+            c2 = min(c2, np.searchsorted(index['ck_times'][cks], end, side='right'))
+        if c1 >= c2:
+            continue
+        hi = index['ck_offsets'][cks[c2]] if c2 < len(cks) else index['seg_ends'][j]
+        yield j, int(index['ck_offsets'][cks[c1]]), int(hi), int(index['ck_rows'][cks[c1]]), int(a), int(b)
+
+
+def read_rows(fname, start=0, stop=None, columns=None, index=None, begin=None, end=None, stride=1):
+    """
+    Reads a window of rows from a GROMACS/PLUMED output file through a memory
+    map. With the help of the sidecar index, only the rows in the window
+    (plus at most one checkpoint interval at each end) are decoded. Compressed
+    files are decompressed and parsed by read_columns instead. Note that
+    the index counts rows without decoding them, so the file is assumed to be
+    free of malformed rows other than those interrupted by a "#! FIELDS" line.
+
+    Parameters
+    ----------
+    fname (str): The name of the output file.
+    start (int): The first row to be read. Rows are counted after the merge
+        of restarted segments, i.e. as in the output of read_columns.
+    stop (int): The row after the last row to be read. If None, all the rows
+        after start are read.
+    columns (list of int or str): The columns to be read. See read_columns.
+    index (dict): The index of the file. If None, the sidecar index is loaded
+        (or built).
+    begin (float): The first time to be read. See read_columns.
+    end (float): The last time to be read. See read_columns.
+    stride (int): Only every stride-th row is read. See read_columns. If a time
+        window or a stride is specified, the rows are selected from the range
+        of rows by iter_chunks, which seeks to the time window in each segment.
+
+    Returns
+    -------
+    data (np.ndarray): The data with shape (stop - start, n_cols), or fewer
+        rows if a time window or a stride is specified.
+    header (dict): The leading header of the file. See parse_header.
+    """
+    if begin is not None or end is not None or stride > 1:
+        chunks = list(iter_chunks(fname, columns, start=start, stop=stop, begin=begin, end=end, stride=stride,
+                                  index=index))
+        n_out = len(columns) if columns is not None else len(read_header(fname)['fields'])
+        data = np.concatenate(chunks) if chunks else np.empty((0, n_out))
+        return data, read_header(fname)
+
+    data, state, up_to_date = _load_cached(cache.get_key(fname, columns, None, None, 1), fname)
+    if up_to_date:  # the file has been parsed by read_columns
+        return select_columns(data[start:stop], state['select']), state['header']
+    if detect_compression(fname) is not None:  # no random access to the decompressed stream
+        data, header = read_columns(fname, columns)
+        return data[start:stop], header
+
+    if index is None:
+        index = load_index(fname)
+    n_rows = int(index['n_rows'])
+    stop = n_rows if stop is None else min(stop, n_rows)
+    start = min(max(start, 0), stop)
+
+    header = read_header(fname)
+    with open(fname, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if index['end'] > 0 else b''
+        usecols, select = get_usecols(columns, header['fields'])
+        n_cols = len(header['fields']) if header['fields'] else None
+
+        data = []
+        for j, lo, hi, row, a, b in _segment_regions(index, start, stop):
+            region = _parse_region(mm[lo:hi], usecols, n_cols)
+            data.append(region[a - row:b - row])
+        if index['end'] > 0:
+            mm.close()
+
+    n_out = (n_cols or 0) if usecols is None else len(usecols)
+    data = np.concatenate(data) if data else np.empty((0, n_out))
+    if select is not None and select != list(range(data.shape[1])):
+        data = data[:, select]
+
+    return data, header
+
+
+def read_header(fname):
+    """
+    Reads the leading header of a (possibly compressed) GROMACS/PLUMED output
+    file, i.e. the comment lines before the first data row.
+
+    Parameters
+    ----------
+    fname (str): The name of the file.
+
+    Returns
+    -------
+    header (dict): The header of the file. See parse_header for details.
+    """
+    header = parse_header([])
+    with open_file(fname) as f:
+        for block in iter_blocks(f, 2 ** 16):
+            for is_data, text in split_block(block):
+                if is_data:
+                    return header
+                line = comment_line(text)
+                if line is not None:
+                    parse_header([line], header)
+
+    return header
+
+
+def iter_chunks(fname, columns=None, chunk_rows=CHUNK_ROWS, start=0, stop=None, begin=None, end=None, stride=1,
+                max_memory=None, index=None):
+    """
+    Reads a GROMACS/PLUMED output file in chunks of a fixed number of rows, so
+    that files larger than the memory can be analyzed with a bounded peak
+    memory. The rows are the same as those returned by read_columns, i.e. the
+    segments of restarted simulations are merged. This is done on the fly
+    with the help of the index of the file, which gives the number of rows of
+    each segment to be kept. Only the checkpoint intervals of the index
+    overlapping the range of rows and the time window are read, and the rows
+    outside them, or skipped by the stride, are never converted to floats.
+
+    Parameters
+    ----------
+    fname (str): The name of the input file.
+    columns (list of int or str): The columns to be read. See read_columns.
+    chunk_rows (int): The number of rows of each chunk. (The last chunk might
+        be shorter.)
+    start (int): The first row to be read.
+    stop (int): The row after the last row to be read. If None, the rows until
+        the end of the file are read.
+    begin (float): The first time to be read. See read_columns.
+    end (float): The last time to be read. See read_columns.
+    stride (int): Only every stride-th row is read. See read_columns.
+    max_memory (float): The memory budget in bytes. If specified, a quarter of
+        it is used for the text blocks read from the file and a quarter for
+        the chunks, which overrides chunk_rows. The rest is left for the
+        analysis of the chunks.
+    index (dict): The index of the file. If None, the sidecar index is loaded
+        (or built).
+
+    Yields
+    ------
+    chunk (np.ndarray): The data with shape (n_rows, n_cols).
+    """
+    if index is None:
+        index = load_index(fname)
+    stop = int(index['n_rows']) if stop is None else min(stop, int(index['n_rows']))
+    block_size = BLOCK_SIZE if max_memory is None else max(int(max_memory) // 4, 2 ** 16)
+
+    usecols, select = None, None
+    buffer, n_buffer = [], 0
+
+    with open_file(fname) as f:
+        for j, lo, hi, seg_row, a, b in _segment_regions(index, start, stop, begin, end):
+            # The header of the segment, between its FIELDS line and its first row
+            f.seek(index['seg_offsets'][j])
+            header = parse_header([])
+            first = index['ck_offsets'][np.flatnonzero(index['ck_seg'] == j)[0]]
+            for is_data, text in split_block(f.read(first - index['seg_offsets'][j])):
+                line = None if is_data else comment_line(text)
+                if line is not None:
+                    parse_header([line], header)
+            n_cols = len(header['fields']) if header['fields'] else None
+
+            f.seek(lo)
+            for block in iter_blocks(f, block_size, hi - lo):
+                for is_data, text in split_block(block):
+                    if not is_data:
+                        continue
+                    if usecols is None:
+                        usecols, select = get_usecols(columns, header['fields'])
+                        if max_memory is not None:
+                            n_out = len(usecols) if usecols is not None else len(text.split(b'\n')[0].split())
+                            chunk_rows = max(int(max_memory) // (4 * 8 * n_out), 1)
+                    # Rows of this segment kept after the restart merge and in the range of rows
+                    text, n_lines = filter_rows(text, begin, end, stride, seg_row, (a - seg_row, b - seg_row))
+                    seg_row += n_lines
+                    new = parse_data(text, n_cols, usecols) if text else []
+                    if len(new) > 0:
+                        buffer.append(new)
+                        n_buffer += len(new)
+                    while n_buffer >= chunk_rows:
+                        data = np.concatenate(buffer) if len(buffer) > 1 else buffer[0]
+                        yield select_columns(data[:chunk_rows], select)
+                        buffer, n_buffer = [data[chunk_rows:]], n_buffer - chunk_rows
+                    if seg_row >= b:
+                        break
+                if seg_row >= b:
+                    break
+
+    if n_buffer > 0:
+        yield select_columns(np.concatenate(buffer), select)
+
+
+def find_walkers(fname):
+    """
+    Finds the files written by the walkers of a multiple-walker simulation,
+    which are named by appending the walker ID to the name of the file (e.g.
+    HILLS.0, HILLS.1, ...).
+
+    Parameters
+    ----------
+    fname (str): The name of the file without the walker ID (e.g. HILLS).
+
+    Returns
+    -------
+    walkers (list of int): The walker IDs in ascending order.
+    fnames (list of str): The names of the files of the walkers.
+    """
+    dirname, basename = os.path.split(fname)
+    pattern = re.compile(r'^%s\.(\d+)$' % re.escape(basename))
+    matches = [pattern.match(name) for name in os.listdir(dirname or '.')]
+    walkers = sorted(int(m.group(1)) for m in matches if m is not None)
+    names = {int(m.group(1)): m.group(0) for m in matches if m is not None}
+    fnames = [os.path.join(dirname, names[w]) for w in walkers]
+
+    return walkers, fnames
+
+
+def merge_walkers(fnames, columns=None, chunk_rows=CHUNK_ROWS, walkers=None, begin=None, end=None, stride=1):
+    """
+    Merges the files of multiple walkers into a single stream of rows ordered
+    by time, with a column of the walker IDs appended. Rows with equal times
+    are ordered by the walker ID. The files are read chunk by chunk (see
+    iter_chunks) and merged by a k-way merge, where a heap keeps the walkers
+    keyed by the last time of their current chunks. The walker at the top of
+    the heap bounds the rows that can be emitted: the rows of all walkers up
+    to the end of its chunk are merged at once (by a vectorized sort of this
+    window only), and then the next chunk of this walker is read. Therefore,
+    at most one chunk per walker is in memory, and the whole data is never
+    concatenated and sorted.
+
+    Parameters
+    ----------
+    fnames (list of str): The names of the files of the walkers.
+    columns (list of int or str): The columns to be read (see read_columns).
+        The first column read (i.e. the first column of the file if columns
+        is None) is used as the time.
+    chunk_rows (int): The number of rows of each chunk yielded. (The last
+        chunk might be shorter.) The files are read in chunks of chunk_rows
+        divided by the number of walkers.
+    walkers (list of int): The walker IDs of the files. If None, the files are
+        numbered from 0.
+    begin (float): The first time to be read. See read_columns.
+    end (float): The last time to be read. See read_columns.
+    stride (int): Only every stride-th row of each file is read.
+
+    Yields
+    ------
+    chunk (np.ndarray): The merged data with shape (n_rows, n_cols + 1), the
+        last column of which is the walker ID.
+    """
+    if walkers is None:
+        walkers = list(range(len(fnames)))
+    read_rows = max(chunk_rows // max(len(fnames), 1), 1)
+    iters = [iter_chunks(f, columns, read_rows, begin=begin, end=end, stride=stride) for f in fnames]
+    heads = [np.empty((0, 0))] * len(fnames)  # the rows of the current chunk not yet emitted
+
+    def advance(k):
+        # Loads the next non-empty chunk of walker k and returns its heap item
+        for chunk in iters[k]:
+            if len(chunk) > 0:
+                heads[k] = chunk
+                return (chunk[-1, 0], walkers[k], k)
+        return None
+
+    heap = [item for item in (advance(k) for k in range(len(fnames))) if item is not None]
+    heapq.heapify(heap)
+    buffer, n_buffer = [], 0
+    while heap:
+        t_max, w_max, k_max = heap[0]
+        # Rows of all the walkers up to the last row of walker k_max
+        pieces = []
+        for k, chunk in enumerate(heads):
+            if len(chunk) == 0:
+                continue
+            side = 'right' if walkers[k] <= w_max else 'left'
+            n = len(chunk) if k == k_max else int(np.searchsorted(chunk[:, 0], t_max, side=side))
+            if n > 0:
+                rows = np.empty((n, chunk.shape[1] + 1))
+                rows[:, :-1], rows[:, -1] = chunk[:n], walkers[k]
+                pieces.append(rows)
+                heads[k] = chunk[n:]
+        window = np.concatenate(pieces) if len(pieces) > 1 else pieces[0]
+        if len(pieces) > 1:
+            window = window[np.lexsort((window[:, -1], window[:, 0]))]
+        buffer.append(window)
+        n_buffer += len(window)
+
+        item = advance(k_max)
+        if item is None:
+            heapq.heappop(heap)
+        else:
+            heapq.heapreplace(heap, item)
+        if n_buffer >= chunk_rows:
+            data = np.concatenate(buffer)
+            for n in range(chunk_rows, len(data) + 1, chunk_rows):
+                yield data[n - chunk_rows:n]
+            buffer = [data[n:]] if len(data) > n else []
+            n_buffer = len(data) - n
+
+    if n_buffer > 0:
+        yield np.concatenate(buffer)
@@ -0,0 +1,183 @@
+"""
+reweight.py
+Reweighting of the frames of a (well-tempered) MetaD simulation, which gives
+the unbiased distributions of any quantity in the COLVAR file.
+
+Following Tiwary and Parrinello (J. Phys. Chem. B 2015, 119, 736), the weight
+of a frame at time t with the CVs s is exp[(V(s, t) - c(t)) / kT], where
+V(s, t) is the bias potential at the time of the frame and c(t) is
+
+    c(t) = kT ln{ int exp[gamma / (gamma - 1) V(s, t) / kT] ds /
+                  int exp[V(s, t) / ((gamma - 1) kT)] ds },
+
+with gamma being the bias factor (for standard MetaD, c(t) = kT ln{ int
+exp[V(s, t) / kT] ds / int ds }). The bias potential is kept as a running sum
+of the Gaussians on a grid (see fes.py), to which only the Gaussians deposited
+before each frame are added, and V(s, t) is interpolated on this grid. The
+frames are processed chunk by chunk in the order of time, so any number of
+frames can be reweighted with a bounded memory. Within a chunk, the bias
+potentials after each deposition are stacked by a cumulative sum of the
+Gaussians deposited in between, so that c(t) is computed for the whole stack
+at once and each frame is interpolated on its own grid of the stack.
+"""
+import numpy as np
+from MolSci_analysis.fes import get_heights, get_periodic, deposit, CUTOFF, BATCH_SIZE
+
+
+def get_kT(temp):
+    """
+    Gets the thermal energy in kJ/mol (the default energy unit of PLUMED).
+
+    Parameters
+    ----------
+    temp (float): The temperature in K.
+
+    Returns
+    -------
+    kT (float): The thermal energy in kJ/mol.
+    """
+    return 1.38064852 * 6.02 * temp / 1000
+
+
+def interpolate(values, grid, points, periodic=None, rows=None):
+    """
+    Interpolates the values on a grid at any points by multilinear
+    interpolation. For a non-periodic CV, the points outside the grid take
+    the values at the edges of the grid. For a periodic CV, the grid should
+    cover its domain (see fes.get_grid) and the points are wrapped.
+
+    Parameters
+    ----------
+    values (np.ndarray): The values on the grid, with one dimension per CV.
+    grid (list of np.ndarray): The (evenly spaced) grid points of each CV.
+    points (np.ndarray): The points, with shape (n_points, n_cvs).
+    periodic (list of bool): Whether each CV is periodic. If None, all the CVs
+        are non-periodic.
+    rows (np.ndarray): The index of the grid that each point is interpolated
+        on, in which case values is a stack of grids with shape (n_grids, ...).
+        If None, values is a single grid.
+
+    Returns
+    -------
+    results (np.ndarray): The interpolated values, with shape (n_points,).
+    """
+    n_cvs = len(grid)
+    periodic = [False] * n_cvs if periodic is None else periodic
+    flat_values = values.reshape(-1)
+    flat = [np.zeros(len(points), dtype=int) if rows is None else rows]  # flat indices of the corners
+    weights = [np.ones(len(points))]
+    for d in range(n_cvs):
+        n = len(grid[d])
+        spacing = grid[d][1] - grid[d][0] if n > 1 else 1.0
+        u = (points[:, d] - grid[d][0]) / spacing
+        if periodic[d]:
+            i0 = np.floor(u)
+            f = u - i0
+            i0 = i0.astype(int) % n
+            i1 = (i0 + 1) % n
+        else:
+            i0 = np.clip(np.floor(u).astype(int), 0, max(n - 2, 0))
+            f = np.clip(u - i0, 0, 1)
+            i1 = np.minimum(i0 + 1, n - 1)
+        flat = [k * n + i for k in flat for i in (i0, i1)]
+        weights = [w * g for w in weights for g in (1 - f, f)]
+
+    return sum(w * flat_values[k] for k, w in zip(flat, weights))
+
+
+def get_ct(bias, kT, biasf, stacked=False):
+    """
+    Computes c(t) from the bias potential on a grid. The integrals are
+    computed in a numerically stable way by factoring out the largest
+    exponential. The grid spacing cancels out, so only the grid values are
+    needed.
+
+    Parameters
+    ----------
+    bias (np.ndarray): The bias potential on the grid.
+    kT (float): The thermal energy in the units of the bias.
+    biasf (float): The bias factor. A bias factor of 1 (or smaller) stands
+        for standard MetaD.
+    stacked (bool): Whether the first dimension of bias is time, in which case
+        c(t) of all the times is computed at once.
+
+    Returns
+    -------
+    ct (float or np.ndarray): The value of c(t) (at each time if stacked).
+    """
+    if biasf > 1:
+        a, b = biasf / (biasf - 1), 1 / (biasf - 1)
+    else:
+        a, b = 1, 0
+    beta_bias = np.asarray(bias, dtype=float) / kT
+    beta_bias = beta_bias.reshape(len(beta_bias), -1) if stacked else beta_bias.reshape(1, -1)
+
+    def log_sum_exp(x):
+        x_max = np.max(x, axis=1)
+        return x_max + np.log(np.sum(np.exp(x - x_max[:, None]), axis=1))
+
+    ct = kT * (log_sum_exp(a * beta_bias) - log_sum_exp(b * beta_bias))
+
+    return ct if stacked else ct[0]
+
+
+def iter_weights(chunks, hills, grid, kT, cvs=None, cutoff=CUTOFF, every=1):
+    """
+    Computes the bias potential, c(t) and the weights of the frames of a MetaD
+    simulation chunk by chunk.
+
+    Parameters
+    ----------
+    chunks (iterable of np.ndarray): The chunks of the frames in the order of
+        time, each of which has the time as its first column.
+    hills (dict): The Gaussians returned by hills.load_hills, in the order of
+        time.
+    grid (list of np.ndarray): The grid points of each CV (see fes.get_grid).
+    kT (float): The thermal energy in the units of the heights of the
+        Gaussians.
+    cvs (list of int): The column indices of the CVs of the Gaussians in the
+        chunks. If None, the CVs are the n_cvs columns following the time.
+    cutoff (float): The cutoff of the Gaussians in units of their widths.
+    every (int): The bias potential on the grid is updated every this number
+        of Gaussians. The default (1) gives the exact bias potential (up to
+        the interpolation) at each frame, while a larger number reduces the
+        cost for huge numbers of Gaussians.
+
+    Yields
+    ------
+    chunk (np.ndarray): The chunk of frames.
+    bias (np.ndarray): The bias potential at each frame.
+    ct (np.ndarray): The value of c(t) at each frame.
+    weights (np.ndarray): The weight of each frame.
+    """
+    cvs = list(range(1, len(grid) + 1)) if cvs is None else list(cvs)
+    periodic = [domain is not None for domain in get_periodic(hills)]
+    heights = get_heights(hills, bias=True)
+    biasf = np.max(hills['biasf']) if len(hills['biasf']) > 0 else 1
+    values = np.zeros(tuple(len(g) for g in grid))
+    n_hills = 0
+    batch = max(BATCH_SIZE // values.size, 1)  # number of bias potentials stacked at a time
+    for chunk in chunks:
+        # The number of Gaussians deposited before each frame. (PLUMED computes the
+        # bias of a step before depositing the Gaussian of the step.)
+        deposited = np.searchsorted(hills['time'], chunk[:, 0], side='left')
+        deposited = np.where(deposited == len(heights), deposited, deposited // every * every)
+        bias, cts = np.empty(len(chunk)), np.empty(len(chunk))
+        # Groups of frames with the same bias potential (the frames are in the order of time)
+        counts, firsts, groups = np.unique(deposited, return_index=True, return_inverse=True)
+        firsts = np.append(firsts, len(chunk))
+        for g in range(0, len(counts), batch):
+            n = counts[g:g + batch]
+            # Each Gaussian is added to the first bias potential of the stack that includes it
+            rows = np.repeat(np.arange(len(n)), np.diff(n, prepend=n_hills))
+            stack = np.zeros((len(n),) + values.shape)
+            stack[0] = values
+            deposit(stack, grid, hills['center'][n_hills:n[-1]], hills['sigma'][n_hills:n[-1]],
+                    heights[n_hills:n[-1]], cutoff, periodic, rows)
+            np.cumsum(stack, axis=0, out=stack)
+            start, stop = firsts[g], firsts[g + len(n)]
+            frames = groups[start:stop] - g
+            bias[start:stop] = interpolate(stack, grid, chunk[start:stop][:, cvs], periodic, frames)
+            cts[start:stop] = get_ct(stack, kT, biasf, stacked=True)[frames]
+            values, n_hills = stack[-1].copy(), n[-1]
+        yield chunk, bias, cts, np.exp((bias - cts) / kT)
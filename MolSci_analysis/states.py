@@ -0,0 +1,385 @@
+"""
+states.py
+Analysis of the time series of discrete states, e.g. the state index of an
+expanded ensemble simulation printed in a PLUMED COLVAR file.
+
+The states are cast to non-negative integers, so that they can be used
+directly as array indices: the counts of the states are added up by
+np.bincount into an array indexed by the state. The time series is read
+chunk by chunk (see readers.iter_chunks), so any number of frames and files
+can be analyzed with a bounded memory.
+
+The kinetics of the states (transition counts, dwell times and round trips
+between two end states) are computed from the run-length encoding of the
+time series, i.e. the runs of consecutive frames in the same state, which
+is obtained by np.diff and np.flatnonzero rather than a Python loop over the
+frames. The transitions between the runs are counted by np.bincount of the
+flattened (from, to) pairs. See TransitionCounter.
+"""
+import numpy as np
+from MolSci_analysis.readers import iter_chunks, CHUNK_ROWS
+
+
+def get_states(values):
+    """
+    Casts the values of a discrete CV to integer states.
+
+    Parameters
+    ----------
+    values (np.ndarray): The values of the discrete CV.
+
+    Returns
+    -------
+    states (np.ndarray): The integer states.
+    """
+    states = np.rint(values).astype(int)
+    if len(states) > 0 and np.min(states) < 0:
+        raise ValueError('The states should be non-negative integers, but the state %s is found.' % np.min(states))
+
+    return states
+
+
+def count_states(states, counts=None):
+    """
+    Adds up the number of frames in each state.
+
+    Parameters
+    ----------
+    states (np.ndarray): The integer states (see get_states).
+    counts (np.ndarray): The counts to which the counts of the states are
+        added. If None, the counts start from zeros.
+
+    Returns
+    -------
+    counts (np.ndarray): The counts indexed by the state, whose length is
+        extended to include the largest state seen so far. The input counts
+        are updated in place unless they have to be extended.
+    """
+    new = np.bincount(states)
+    if counts is None:
+        return new
+    if len(new) > len(counts):
+        counts = np.concatenate((counts, np.zeros(len(new) - len(counts), dtype=counts.dtype)))
+    counts[:len(new)] += new
+
+    return counts
+
+
+def iter_states(fnames, column=1, chunk_rows=CHUNK_ROWS, begin=None, end=None, stride=1):
+    """
+    Reads the time series of a discrete CV from one or more files chunk by
+    chunk. The files are read one after another.
+
+    Parameters
+    ----------
+    fnames (list of str): The names of the input files.
+    column (int or str): The column (python index or name) of the discrete CV.
+    chunk_rows (int): The number of rows of each chunk.
+    begin (float): The first time to be read. If None, the files are read
+        from the start.
+    end (float): The last time to be read. If None, the files are read until
+        the end.
+    stride (int): Only every stride-th frame is read.
+
+    Yields
+    ------
+    time (np.ndarray): The time of the frames in the chunk.
+    states (np.ndarray): The integer states of the frames in the chunk.
+    """
+    for fname in fnames:
+        for chunk in iter_chunks(fname, columns=[0, column], chunk_rows=chunk_rows, begin=begin, end=end,
+                                 stride=stride):
+            yield chunk[:, 0], get_states(chunk[:, 1])
+
+
+def run_lengths(states):
+    """
+    Computes the run-length encoding of a time series of states.
+
+    Parameters
+    ----------
+    states (np.ndarray): The integer states.
+
+    Returns
+    -------
+    values (np.ndarray): The state of each run.
+    starts (np.ndarray): The index of the first frame of each run.
+    lengths (np.ndarray): The number of frames of each run.
+    """
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(states)) + 1)) if len(states) > 0 else np.zeros(0, dtype=int)
+    lengths = np.diff(np.append(starts, len(states)))
+
+    return states[starts], starts, lengths
+
+
+def count_pairs(from_states, to_states, n_states):
+    """
+    Counts the pairs of states by np.bincount of the flattened pairs.
+
+    Parameters
+    ----------
+    from_states (np.ndarray): The states of the first elements of the pairs.
+    to_states (np.ndarray): The states of the second elements of the pairs.
+    n_states (int): The number of states, which should be larger than all
+        the states.
+
+    Returns
+    -------
+    counts (np.ndarray): The counts of the pairs, with shape (n_states, n_states).
+    """
+    flat = from_states * n_states + to_states
+
+    return np.bincount(flat, minlength=n_states ** 2).reshape(n_states, n_states)
+
+
+class TransitionCounter:
+    """
+    Accumulates the kinetics of a time series of states chunk by chunk: the
+    matrix of the transition counts between consecutive frames, the dwell
+    times of the runs in each state and (optionally) the round-trip times
+    between two end states. The run in progress at the end of a chunk is
+    carried over to the next chunk, so the results do not depend on the
+    chunking.
+
+    The dwell times only include the complete runs, i.e. not the first and
+    the last runs of a time series, which are truncated. A round trip goes
+    from the lower end state to the upper end state and back, and its time is
+    the time between two successive arrivals at the lower end state.
+
+    Attributes
+    ----------
+    transitions (np.ndarray): The transition counts, where transitions[i, j]
+        is the number of pairs of consecutive frames in states i and j. The
+        diagonal counts the frames staying in the same state.
+    round_trips (list of np.ndarray): The round-trip times.
+    """
+    def __init__(self, ends=None):
+        """
+        Parameters
+        ----------
+        ends (tuple of int): The lower and upper end states of the round trips.
+            If None, the round trips are not analyzed.
+        """
+        self.ends = ends
+        self.transitions = np.zeros((0, 0), dtype=int)
+        self.round_trips = []
+        self._dwell_states, self._dwell_times = [], []
+        self.end()
+
+    def end(self):
+        """
+        Ends the current time series, so that the next chunk starts a new one
+        (e.g. the next file of independent simulations).
+        """
+        self._state, self._start, self._first = None, None, True  # the run in progress
+        self._end, self._t_lower = None, None  # the last end state visited and its arrival time
+
+    def update(self, time, states):
+        """
+        Adds a chunk of the time series.
+
+        Parameters
+        ----------
+        time (np.ndarray): The time of the frames.
+        states (np.ndarray): The integer states of the frames.
+
+        Returns
+        -------
+        self (TransitionCounter): The updated counter.
+        """
+        if len(states) == 0:
+            return self
+        values, starts, _ = run_lengths(states)
+        t_starts = time[starts]
+        if self._state is None:
+            carried = 0
+        elif self._state == values[0]:
+            values, t_starts, carried = values.copy(), t_starts.copy(), 1
+            t_starts[0] = self._start  # the run in progress continues
+        else:
+            values, t_starts, carried = np.append(self._state, values), np.append(self._start, t_starts), 1
+
+        # Transitions between consecutive frames (within the runs on the diagonal)
+        n_states = max(len(self.transitions), np.max(values) + 1)
+        if n_states > len(self.transitions):
+            extended = np.zeros((n_states, n_states), dtype=int)
+            extended[:len(self.transitions), :len(self.transitions)] = self.transitions
+            self.transitions = extended
+        self.transitions += count_pairs(values[:-1], values[1:], n_states)
+        # (A continued run has no new first frame, so its frames all stay.)
+        stays = np.bincount(states, minlength=n_states) - np.bincount(values[carried:], minlength=n_states)
+        self.transitions[np.diag_indices(n_states)] += stays
+
+        # Dwell times of the complete runs
+        first = 1 if self._first else 0
+        self._dwell_states.append(values[first:-1])
+        self._dwell_times.append(np.diff(t_starts)[first:])
+        self._first = self._first and len(values) == 1
+
+        # Round trips from the arrivals at the end states (the first frames of the new runs)
+        if self.ends is not None:
+            at_end = (values[carried:] == self.ends[0]) | (values[carried:] == self.ends[1])
+            ends, t_ends = values[carried:][at_end], t_starts[carried:][at_end]
+            previous = np.append(-1 if self._end is None else self._end, ends[:-1])
+            arrivals = ends != previous
+            ends, t_ends = ends[arrivals], t_ends[arrivals]
+            t_lower = t_ends[ends == self.ends[0]]
+            if self._t_lower is not None:
+                t_lower = np.append(self._t_lower, t_lower)
+            self.round_trips.append(np.diff(t_lower))
+            if len(ends) > 0:
+                self._end = ends[-1]
+            if len(t_lower) > 0:
+                self._t_lower = t_lower[-1]
+
+        self._state, self._start = values[-1], t_starts[-1]
+
+        return self
+
+    @property
+    def n_states(self):
+        return len(self.transitions)
+
+    def get_round_trips(self):
+        """
+        Gets the round-trip times.
+
+        Returns
+        -------
+        times (np.ndarray): The round-trip times in the order of time.
+        """
+        return np.concatenate(self.round_trips) if self.round_trips else np.zeros(0)
+
+    def get_dwell_times(self):
+        """
+        Gets the dwell times of the complete runs.
+
+        Returns
+        -------
+        states (np.ndarray): The state of each run.
+        times (np.ndarray): The dwell time of each run.
+        """
+        if len(self._dwell_states) == 0:
+            return np.zeros(0, dtype=int), np.zeros(0)
+
+        return np.concatenate(self._dwell_states), np.concatenate(self._dwell_times)
+
+    def get_mean_dwell_times(self):
+        """
+        Gets the average dwell time in each state.
+
+        Returns
+        -------
+        mean (np.ndarray): The average dwell time in each state, which is NaN
+            for the states without complete runs.
+        """
+        states, times = self.get_dwell_times()
+        n_runs = np.bincount(states, minlength=self.n_states)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.bincount(states, weights=times, minlength=self.n_states) / n_runs
+
+
+class CheckpointCounter:
+    """
+    Records the cumulative counts of the states at checkpoints evenly spaced
+    in time, which shows how the histogram of the states flattens over time.
+    The counts are accumulated incrementally: the frames of each chunk are
+    split into the segments between the checkpoints within the chunk, which
+    are counted by one np.bincount of (segment, state) pairs and summed up
+    by a prefix sum over the segments. Nothing is recounted from the start.
+
+    Attributes
+    ----------
+    stride_time (float): The time between two checkpoints.
+    counts (np.ndarray): The counts of all the frames seen so far.
+    """
+    def __init__(self, stride_time):
+        """
+        Parameters
+        ----------
+        stride_time (float): The time between two checkpoints. The first
+            checkpoint is at stride_time after the first frame.
+        """
+        self.stride_time = stride_time
+        self.counts = np.zeros(0, dtype=int)
+        self._times, self._rows = [], []  # the checkpoints recorded so far
+        self._next, self._last = None, None  # the next checkpoint and the time of the last frame
+
+    def update(self, time, states):
+        """
+        Adds a chunk of the time series.
+
+        Parameters
+        ----------
+        time (np.ndarray): The time of the frames, in increasing order.
+        states (np.ndarray): The integer states of the frames.
+
+        Returns
+        -------
+        self (CheckpointCounter): The updated counter.
+        """
+        if len(states) == 0:
+            return self
+        if self._next is None:
+            self._next = time[0] + self.stride_time
+        n_checkpoints = int(np.floor((time[-1] - self._next) / self.stride_time)) + 1 if time[-1] >= self._next else 0
+        checkpoints = self._next + self.stride_time * np.arange(n_checkpoints)
+        # The frames up to (and including) each checkpoint
+        stops = np.searchsorted(time, checkpoints, side='right')
+        segments = np.searchsorted(stops, np.arange(len(states)), side='right')
+        n_states = max(len(self.counts), np.max(states) + 1)
+        counts = np.zeros(n_states, dtype=int)
+        counts[:len(self.counts)] = self.counts
+        segment_counts = np.bincount(segments * n_states + states,
+                                     minlength=(n_checkpoints + 1) * n_states).reshape(-1, n_states)
+        cumulative = counts + np.cumsum(segment_counts, axis=0)
+        self._times.extend(checkpoints)
+        self._rows.extend(cumulative[:-1])
+        self.counts = cumulative[-1]
+        self._next += self.stride_time * n_checkpoints
+        self._last = time[-1]
+
+        return self
+
+    def get_counts(self):
+        """
+        Gets the cumulative counts at the checkpoints, followed by the counts
+        at the last frame (unless it is a checkpoint).
+
+        Returns
+        -------
+        times (np.ndarray): The times of the checkpoints.
+        counts (np.ndarray): The cumulative counts, with shape
+            (n_checkpoints, n_states).
+        """
+        times, rows = list(self._times), list(self._rows)
+        if self._last is not None and (len(times) == 0 or times[-1] < self._last):
+            times.append(self._last)
+            rows.append(self.counts)
+        counts = np.zeros((len(rows), len(self.counts)), dtype=int)
+        for k, row in enumerate(rows):
+            counts[k, :len(row)] = row
+
+        return np.array(times), counts
+
+
+def get_flatness(counts):
+    """
+    Computes the flatness of histograms of the states, i.e. N_ratio (the
+    ratio of the maximum count to the minimum count, same as plot_histogram),
+    the maximum and the minimum count.
+
+    Parameters
+    ----------
+    counts (np.ndarray): The counts, with shape (..., n_states).
+
+    Returns
+    -------
+    n_ratio (np.ndarray): The N_ratio, with shape (...). It is inf if any
+        state has not been visited.
+    c_max (np.ndarray): The maximum count, with shape (...).
+    c_min (np.ndarray): The minimum count, with shape (...).
+    """
+    c_max, c_min = np.max(counts, axis=-1), np.min(counts, axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return c_max / c_min, c_max, c_min
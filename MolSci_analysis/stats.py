@@ -0,0 +1,133 @@
+"""
+stats.py
+Streaming summary statistics of a time series: the average, the RMSF, the
+maximum and the minimum (and the times at which they occur), and the data
+point closest to the average.
+
+The statistics of each chunk are computed by vectorized NumPy calls and
+combined with those of the previous chunks by the pairwise update of
+Welford's algorithm (Chan et al.), which avoids the cancellation of the
+average of the square minus the square of the average. The accumulators of
+different chunks or files can be merged in the same way, so the in-memory
+and the out-of-core modes of the scripts share the same code.
+"""
+import numpy as np
+
+
+class RunningStats:
+    """
+    Accumulates the summary statistics of a time series chunk by chunk.
+
+    The data point closest to the average can only be found once the average
+    is known, so it is found in a separate pass by find_closest (the scripts
+    do this in the pass that bins or plots the data).
+
+    Attributes
+    ----------
+    n (int): The number of data points.
+    mean (float): The average.
+    m2 (float): The sum of the squared deviations from the average.
+    max (float): The maximum.
+    min (float): The minimum.
+    x_max (float): The x value (e.g. the time) of the first maximum.
+    x_min (float): The x value of the first minimum.
+    x_avg (float): The x value of the first data point closest to the
+        average (see find_closest).
+    y_avg (float): The value of the data point closest to the average.
+    """
+    def __init__(self):
+        self.n, self.mean, self.m2 = 0, 0.0, 0.0
+        self.max, self.min = -np.inf, np.inf
+        self.x_max, self.x_min = None, None
+        self.x_avg, self.y_avg, self._diff = None, None, np.inf
+
+    def update(self, y, x=None):
+        """
+        Adds a chunk of data.
+
+        Parameters
+        ----------
+        y (np.ndarray): The data.
+        x (np.ndarray): The x values (e.g. the time) of the data. If None, the
+            indices of the data in the chunk are used.
+
+        Returns
+        -------
+        self (RunningStats): The updated accumulator.
+        """
+        y = np.asarray(y, dtype=float)
+        if len(y) == 0:
+            return self
+        x = np.arange(len(y)) if x is None else x
+        chunk = RunningStats()
+        chunk.n, chunk.mean = len(y), np.mean(y)
+        chunk.m2 = np.sum((y - chunk.mean) ** 2)
+        k_max, k_min = np.argmax(y), np.argmin(y)
+        chunk.max, chunk.x_max, chunk.min, chunk.x_min = y[k_max], x[k_max], y[k_min], x[k_min]
+
+        return self.merge(chunk)
+
+    def merge(self, other):
+        """
+        Adds the statistics of another accumulator, whose data comes after the
+        data of this one (which only matters for the ties of the extrema).
+
+        Parameters
+        ----------
+        other (RunningStats): The accumulator to be merged.
+
+        Returns
+        -------
+        self (RunningStats): The merged accumulator.
+        """
+        if other.n == 0:
+            return self
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta ** 2 * self.n * other.n / n
+        self.n = n
+        if other.max > self.max:
+            self.max, self.x_max = other.max, other.x_max
+        if other.min < self.min:
+            self.min, self.x_min = other.min, other.x_min
+        if other._diff < self._diff:
+            self.x_avg, self.y_avg, self._diff = other.x_avg, other.y_avg, other._diff
+
+        return self
+
+    def find_closest(self, y, x=None):
+        """
+        Finds the data point closest to the average in a chunk of data, which
+        should be called after all the data has been added by update.
+
+        Parameters
+        ----------
+        y (np.ndarray): The data.
+        x (np.ndarray): The x values of the data. If None, the indices of the
+            data in the chunk are used.
+
+        Returns
+        -------
+        self (RunningStats): The updated accumulator.
+        """
+        if len(y) == 0:
+            return self
+        x = np.arange(len(y)) if x is None else x
+        diff = np.abs(y - self.mean)
+        k = np.argmin(diff)
+        if diff[k] < self._diff:
+            self.x_avg, self.y_avg, self._diff = x[k], y[k], diff[k]
+
+        return self
+
+    @property
+    def std(self):
+        """The standard deviation (of the population)."""
+        return np.sqrt(self.m2 / self.n) if self.n > 0 else np.nan
+
+    @property
+    def rmsf(self):
+        """The RMSF relative to the average, i.e. the standard deviation divided
+        by the average."""
+        return self.std / self.mean
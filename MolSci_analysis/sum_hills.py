@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+"""This is a Python script for reconstructing the free energy surface from the
+PLUMED HILLS file(s) of a MetaD simulation, as "plumed sum_hills" does.
+"""
+import os
+import argparse
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib import rc
+from MolSci_analysis.hills import load_hills, load_walkers
+from MolSci_analysis.readers import find_walkers, parse_domains
+from MolSci_analysis.fes import get_grid, sum_hills, get_fes, iter_slices, CUTOFF
+
+
+def initialize():
+
+    parser = argparse.ArgumentParser(
+        description='This script computes the free energy surface (1D or 2D) from PLUMED HILLS file(s).')
+    parser.add_argument('--hills',
+                        default='HILLS',
+                        help='The name of PLUMED HILLS file. Default: HILLS.')
+    parser.add_argument('-w',
+                        '--walkers',
+                        action='store_true',
+                        help='Whether the HILLS files were written by multiple walkers, in which case \
+                            the Gaussians of all the files named by the --hills argument followed by \
+                            the walker IDs (e.g. HILLS.0, HILLS.1, ...) are merged in the order of time.')
+    parser.add_argument('-nb',
+                        '--nbins',
+                        type=int,
+                        nargs='+',
+                        default=[100],
+                        help='The number of grid points of each CV. Default: 100.')
+    parser.add_argument('-min',
+                        '--lower',
+                        type=float,
+                        nargs='+',
+                        help='The lower bound of the grid of each CV. Default: the minimum of the \
+                            centers of the Gaussians minus the cutoff.')
+    parser.add_argument('-max',
+                        '--upper',
+                        type=float,
+                        nargs='+',
+                        help='The upper bound of the grid of each CV. Default: the maximum of the \
+                            centers of the Gaussians plus the cutoff.')
+    parser.add_argument('-pd',
+                        '--periodic',
+                        nargs='+',
+                        help='The periodic domains of the CVs given as pairs of lower and upper \
+                            bounds (e.g. -pd -3.14159265 pi -3.14159265 pi), where none none stands \
+                            for a non-periodic CV. Default: the domains given by the #! SET lines \
+                            of the HILLS file.')
+    parser.add_argument('-ct',
+                        '--cutoff',
+                        type=float,
+                        default=CUTOFF,
+                        help='The cutoff of the Gaussians in units of their widths. Default: 3.54, \
+                            which is the same as PLUMED.')
+    parser.add_argument('-st',
+                        '--stride_time',
+                        type=float,
+                        help='The time (in the units of the HILLS file) between two free energy \
+                            surfaces computed to check the convergence. The sum of the Gaussians is \
+                            kept between the time slices, so each slice only adds the new Gaussians. \
+                            The free energy surface of slice k is written to fes_k.dat (named after \
+                            the --outfile argument) and the final one to the --outfile argument.')
+    parser.add_argument('-o',
+                        '--outfile',
+                        default='fes.dat',
+                        help='The name of the output file of the free energy surface.')
+    parser.add_argument('-n',
+                        '--pngname',
+                        default='fes',
+                        help='The filename of the figure, not including the extension.')
+
+    args_parse = parser.parse_args()
+
+    return args_parse
+
+
+def load_all_hills(args):
+    """
+    Loads the Gaussians of the HILLS file, or of the HILLS files of all the
+    walkers.
+
+    Parameters
+    ----------
+    args (argparse.Namespace): The arguments of the command.
+
+    Returns
+    -------
+    hills (dict): The Gaussians. See hills.load_hills for details.
+    """
+    if args.walkers is False:
+        return load_hills(args.hills)
+
+    walkers, fnames = find_walkers(args.hills)
+    if len(fnames) == 0:
+        raise FileNotFoundError('No HILLS files of multiple walkers (%s.0, %s.1, ...) found!'
+                                % (args.hills, args.hills))
+
+    return load_walkers(fnames, walkers)
+
+
+def write_fes(fname, grid, fes, cvs):
+    """
+    Writes a free energy surface in the format of "plumed sum_hills".
+
+    Parameters
+    ----------
+    fname (str): The name of the output file.
+    grid (list of np.ndarray): The grid points of each CV.
+    fes (np.ndarray): The free energy on the grid.
+    cvs (list of str): The names of the CVs.
+    """
+    points = np.meshgrid(*grid, indexing='ij')
+    data = np.column_stack([p.reshape(-1) for p in points] + [fes.reshape(-1)])
+    np.savetxt(fname, data, fmt='%.9f', header='! FIELDS %s file.free' % ' '.join(cvs), comments='#')
+
+
+def main():
+    rc('font', **{
+        'family': 'sans-serif',
+        'sans-serif': ['DejaVu Sans'],
+        'size': 10
+    })
+    # Set the font used for MathJax - more on this later
+    rc('mathtext', **{'default': 'regular'})
+    plt.rc('font', family='serif')
+
+    args = initialize()
+
+    hills = load_all_hills(args)
+    n_cvs = len(hills['cvs'])
+    if n_cvs > 2:
+        print('Only the free energy surfaces of 1 or 2 CVs are supported.')
+        return
+    if args.periodic is not None:
+        hills['periodic'] = parse_domains(args.periodic)
+    nbins = args.nbins * n_cvs if len(args.nbins) == 1 else args.nbins
+    grid = get_grid(hills, nbins, args.lower, args.upper, args.cutoff)
+    plt.figure()
+    if args.stride_time is None:
+        fes = get_fes(sum_hills(hills, grid, args.cutoff))
+    else:
+        # Time slices of the free energy surface with a running sum of the Gaussians
+        root, ext = os.path.splitext(args.outfile)
+        for k, (t, values) in enumerate(iter_slices(hills, grid, args.stride_time, args.cutoff)):
+            fes = get_fes(values)
+            write_fes('%s_%s%s' % (root, k, ext), grid, fes, hills['cvs'])
+            print('The free energy surface at %s was written to %s_%s%s.' % (t, root, k, ext))
+            if n_cvs == 1:
+                plt.plot(grid[0], fes, label='t = %s' % t)
+        if n_cvs == 1:
+            plt.legend(ncol=2)
+    write_fes(args.outfile, grid, fes, hills['cvs'])
+
+    if n_cvs == 1:
+        if args.stride_time is None:
+            plt.plot(grid[0], fes)
+        plt.xlabel('%s' % hills['cvs'][0])
+        plt.ylabel('Free energy')
+        plt.grid()
+    else:
+        plt.contourf(grid[0], grid[1], fes.T, 20, cmap='jet')
+        plt.colorbar(label='Free energy')
+        plt.xlabel('%s' % hills['cvs'][0])
+        plt.ylabel('%s' % hills['cvs'][1])
+    plt.title('Free energy surface')
+    plt.savefig('%s.png' % args.pngname)
+    plt.show()
@@ -0,0 +1,12 @@
+"""
+Shared fixtures of the tests.
+"""
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path_factory, monkeypatch):
+    """Keeps the binary cache of the tests out of the home directory"""
+    path = tmp_path_factory.mktemp('cache')
+    monkeypatch.setenv('MOLSCI_CACHE_DIR', str(path))
+    return path
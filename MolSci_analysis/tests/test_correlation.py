@@ -0,0 +1,59 @@
+"""
+Unit tests for the autocorrelation and block averaging of time series.
+"""
+import numpy as np
+from MolSci_analysis import correlation
+
+
+def ar1(phi, n, seed=0):
+    # An AR(1) process, whose statistical inefficiency is (1 + phi) / (1 - phi)
+    noise = np.random.RandomState(seed).normal(0, 1, n)
+    y = np.zeros(n)
+    for i in range(1, n):
+        y[i] = phi * y[i - 1] + noise[i]
+    return y
+
+
+def test_autocorrelation():
+    y = np.random.RandomState(1).normal(0, 1, 500)
+    acf = correlation.autocorrelation(y, max_lag=20)
+    dy = y - np.mean(y)
+    ref = [np.mean(dy[:len(y) - t] * dy[t:]) / np.mean(dy ** 2) for t in range(21)]
+    np.testing.assert_allclose(acf, ref, atol=1e-12)
+    np.testing.assert_array_equal(correlation.autocorrelation(np.full(10, 0.1)), np.ones(10))
+
+
+def test_statistical_inefficiency():
+    y = ar1(0.9, 200000)
+    results = correlation.analyze_column(y, dt=2.0, max_lag=100)
+    assert abs(results['g'] - 19) < 2
+    assert np.isclose(results['tau'], results['g'] - 1)
+    assert len(results['acf']) == 101
+    assert abs(results['error_block'] / results['error'] - 1) < 0.2
+    # uncorrelated data
+    y = np.random.RandomState(2).normal(0, 1, 100000)
+    assert correlation.statistical_inefficiency(correlation.autocorrelation(y), len(y)) < 1.1
+
+
+def test_BlockAverager():
+    y = ar1(0.5, 50000, seed=3)
+    ref = correlation.BlockAverager().update(y)
+    chunked = correlation.BlockAverager()
+    for chunk in np.array_split(y, 77):
+        chunked.update(chunk)
+    sizes, errors, _ = ref.get_errors()
+    np.testing.assert_allclose(chunked.get_errors()[1], errors, rtol=1e-10)
+    # level k holds the averages of blocks of 2^k frames
+    blocks = y[:len(y) // 8 * 8].reshape(-1, 8).mean(axis=1)
+    assert np.isclose(errors[3], np.std(blocks) / np.sqrt(len(blocks) - 1))
+    assert sizes[3] == 8
+    assert abs(ref.get_error() / (np.std(y) * np.sqrt(3 / len(y))) - 1) < 0.2
+    assert np.isnan(correlation.BlockAverager().update(y[:10]).get_error())
+
+
+def test_analyze_columns():
+    data = np.column_stack((ar1(0.5, 5000), ar1(0.8, 5000, seed=4)))
+    serial = correlation.analyze_columns(data, max_lag=10)
+    parallel = correlation.analyze_columns(data, max_lag=10, jobs=2)
+    for a, b in zip(serial, parallel):
+        assert a['g'] == b['g'] and a['error_block'] == b['error_block']
@@ -0,0 +1,77 @@
+"""
+Unit tests for the reconstruction of free energy surfaces from Gaussians.
+"""
+import numpy as np
+from MolSci_analysis import fes
+
+
+def brute_force(grid, center, sigma, height, cutoff):
+    points = np.stack(np.meshgrid(*grid, indexing='ij'), axis=-1)
+    values = np.zeros(points.shape[:-1])
+    for c, s, h in zip(center, sigma, height):
+        z2 = np.sum(((points - c) / s) ** 2, axis=-1)
+        values += np.where(z2 < cutoff ** 2, h * np.exp(-0.5 * z2), 0)
+    return values
+
+
+def get_hills(n_cvs, n_hills=50, seed=0):
+    rng = np.random.RandomState(seed)
+    return {
+        'center': rng.uniform(-1, 1, (n_hills, n_cvs)),
+        'sigma': rng.uniform(0.1, 0.3, (n_hills, n_cvs)),
+        'height': rng.uniform(0.5, 1.5, n_hills),
+        'biasf': np.full(n_hills, 10.0)
+    }
+
+
+def test_sum_hills(monkeypatch):
+    monkeypatch.setattr(fes, 'BATCH_SIZE', 500)  # several batches
+    for n_cvs, nbins in [(1, 101), (2, [41, 31])]:
+        hills = get_hills(n_cvs)
+        grid = fes.get_grid(hills, nbins)
+        assert grid[0][0] < np.min(hills['center'][:, 0])
+        ref = brute_force(grid, hills['center'], hills['sigma'], hills['height'], fes.CUTOFF)
+        values = fes.sum_hills(hills, grid)
+        np.testing.assert_allclose(values, ref, atol=1e-12)
+        # the Gaussians can be added in several steps
+        values = fes.sum_hills(hills, grid, stop=20)
+        values = fes.sum_hills(hills, grid, start=20, values=values)
+        np.testing.assert_allclose(values, ref, atol=1e-12)
+        # well-tempered rescaling of the heights of the bias
+        np.testing.assert_allclose(fes.sum_hills(hills, grid, bias=True), 0.9 * ref, atol=1e-12)
+        free = fes.get_fes(values)
+        assert np.min(free) == 0
+        assert np.argmin(free) == np.argmax(ref)
+
+
+def test_sum_hills_cutoff():
+    hills = get_hills(1, n_hills=3)
+    grid = [np.linspace(-5, 5, 201)]  # a grid wider than the Gaussians
+    ref = brute_force(grid, hills['center'], hills['sigma'], hills['height'], 1.0)
+    np.testing.assert_allclose(fes.sum_hills(hills, grid, cutoff=1.0), ref, atol=1e-12)
+    assert np.sum(ref == 0) > 100
+
+
+def test_get_slices():
+    hills = get_hills(1, n_hills=40)
+    hills['time'] = np.arange(40) * 0.5
+    grid = fes.get_grid(hills, 51)
+    times, slices = fes.get_slices(hills, grid, 4.0)
+    np.testing.assert_allclose(times, [4, 8, 12, 16, 19.5])
+    assert slices.shape == (5, 51)
+    for t, free in zip(times, slices):
+        n = int(np.sum(hills['time'] <= t))
+        np.testing.assert_allclose(free, fes.get_fes(fes.sum_hills(hills, grid, stop=n)), atol=1e-12)
+
+
+def test_sum_hills_periodic():
+    hills = get_hills(2, n_hills=20)
+    hills['center'][:, 0] *= np.pi  # Gaussians near the boundaries of the periodic CV
+    hills['periodic'] = [(-np.pi, np.pi), None]
+    grid = fes.get_grid(hills, [60, 41])
+    np.testing.assert_allclose(grid[0][[0, -1]], [-np.pi, np.pi - 2 * np.pi / 60])
+    assert grid[1][0] < np.min(hills['center'][:, 1])
+    # sum of the images of the Gaussians
+    ref = sum(brute_force(grid, hills['center'] + [shift, 0], hills['sigma'], hills['height'], fes.CUTOFF)
+              for shift in [-2 * np.pi, 0, 2 * np.pi])
+    np.testing.assert_allclose(fes.sum_hills(hills, grid), ref, atol=1e-12)
@@ -0,0 +1,71 @@
+"""
+Unit tests for the loader of PLUMED HILLS files.
+"""
+import pytest
+import numpy as np
+from MolSci_analysis import hills
+
+HILLS_2D = """#! FIELDS time phi psi sigma_phi sigma_psi height biasf
+#! SET multivariate false
+#! SET kerneltype gaussian
+#! SET min_phi -pi
+#! SET max_phi pi
+#! SET min_psi -pi
+#! SET max_psi pi
+1.000000 -1.5 2.0 0.35 0.3 1.2 10
+2.000000 -1.4 2.1 0.35 0.3 1.1 10
+3.000000 -1.3 2.2 0.35 0.3 1.0 10
+"""
+
+HILLS_1D = """#! FIELDS time d1 sigma_d1 height
+1.000000 0.5 0.1 2.0
+1.000000 0.6 0.1 2.0
+2.000000 0.7 0.1 1.5
+2.000000 0.8 0.1 1.5
+"""
+
+
+def test_load_hills_2d(tmp_path):
+    fname = tmp_path / 'HILLS'
+    fname.write_text(HILLS_2D)
+    data = hills.load_hills(str(fname))
+    assert data['cvs'] == ['phi', 'psi']
+    assert data['multivariate'] is False
+    assert data['set']['max_psi'] == 'pi'
+    np.testing.assert_allclose(data['time'], [1, 2, 3])
+    np.testing.assert_allclose(data['center'], [[-1.5, 2.0], [-1.4, 2.1], [-1.3, 2.2]])
+    np.testing.assert_allclose(data['sigma'][0], [0.35, 0.3])
+    np.testing.assert_allclose(data['height'], [1.2, 1.1, 1.0])
+    np.testing.assert_allclose(data['biasf'], [10, 10, 10])
+
+
+def test_load_hills_walkers(tmp_path):
+    # multiple walkers writing to the same file, without the biasf column
+    fname = tmp_path / 'HILLS'
+    fname.write_text(HILLS_1D)
+    data = hills.load_hills(str(fname))
+    assert data['center'].shape == (4, 1)
+    np.testing.assert_allclose(data['time'], [1, 1, 2, 2])
+    np.testing.assert_allclose(data['biasf'], np.ones(4))
+
+
+def test_get_layout():
+    layout = hills.get_layout('time phi psi sigma_phi_phi sigma_psi_phi sigma_psi_psi height biasf'.split())
+    assert layout['multivariate'] is True
+    assert layout['center'] == [1, 2]
+    assert layout['sigma'] == [3, 4, 5]
+    with pytest.raises(ValueError):
+        hills.get_layout(['time', 'phi', 'height'])
+
+
+def test_load_walkers(tmp_path):
+    lines = HILLS_2D.splitlines(True)
+    (tmp_path / 'HILLS.0').write_text(''.join(lines[:7] + lines[7::2]))
+    (tmp_path / 'HILLS.1').write_text(''.join(lines[:7] + lines[8::2]))
+    fnames = [str(tmp_path / 'HILLS.0'), str(tmp_path / 'HILLS.1')]
+    data = hills.load_walkers(fnames)
+    ref = hills.load_hills(str(tmp_path / 'HILLS.0'))
+    np.testing.assert_allclose(data['time'], [1, 2, 3])
+    np.testing.assert_array_equal(data['walker'], [0, 1, 0])
+    np.testing.assert_allclose(data['center'][[0, 2]], ref['center'])
+    assert data['cvs'] == ['phi', 'psi']
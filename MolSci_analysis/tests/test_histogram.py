@@ -0,0 +1,96 @@
+"""
+Unit tests for the histogram engine.
+"""
+import pytest
+import numpy as np
+from MolSci_analysis import histogram
+
+
+def test_get_bin_indices():
+    rng = np.random.RandomState(0)
+    y = rng.normal(0, 1, 10000)
+    edges = histogram.get_edges(np.min(y), np.max(y), 37)
+    indices = histogram.get_bin_indices(y, edges)
+    np.testing.assert_array_equal(np.bincount(indices, minlength=37), np.histogram(y, bins=37)[0])
+    # values on the edges, outside the edges and NaN
+    edges = histogram.get_edges(0, 1, 10)
+    indices = histogram.get_bin_indices(np.array([0, 0.1, 0.25, 1, -0.1, 1.1, np.nan]), edges)
+    np.testing.assert_array_equal(indices, [0, 1, 2, 9, -1, -1, -1])
+    np.testing.assert_array_equal(histogram.get_edges(2, 2, 2), [1.5, 2, 2.5])
+
+
+def test_bin_counts():
+    rng = np.random.RandomState(1)
+    y, weights = rng.uniform(-1, 2, 5000), rng.uniform(0, 3, 5000)
+    edges = histogram.get_edges(0, 1, 20)
+    ref = np.histogram(y, bins=edges, weights=weights)[0]
+    counts = histogram.bin_counts(histogram.get_bin_indices(y, edges), 20, weights)
+    np.testing.assert_allclose(counts, ref)
+    # chunk by chunk into the same buffer
+    counts = np.zeros(20)
+    for i in range(0, 5000, 700):
+        indices = histogram.get_bin_indices(y[i:i + 700], edges)
+        assert histogram.bin_counts(indices, 20, weights[i:i + 700], counts) is counts
+    np.testing.assert_allclose(counts, ref)
+
+
+def test_Histogram():
+    rng = np.random.RandomState(2)
+    y = rng.normal(0, 1, 10000)
+    edges = histogram.get_edges(-2, 2, 40)
+    ref = histogram.Histogram(edges).update(y)
+    np.testing.assert_array_equal(ref.counts, np.histogram(y, bins=edges)[0])
+    assert ref.n_outside == np.sum(np.abs(y) > 2)
+    # 1 chunk or 1000 chunks, reduced by merging
+    hists = [histogram.Histogram(edges).update(chunk) for chunk in np.array_split(y, 1000)]
+    merged = hists[0]
+    for hist in hists[1:]:
+        merged.merge(hist)
+    np.testing.assert_array_equal(merged.counts, ref.counts)
+    assert merged.n_outside == ref.n_outside
+    # weighted counts
+    weights = rng.uniform(0, 1, 10000)
+    hist = histogram.Histogram(edges).update(y[:5000], weights[:5000]).update(y[5000:], weights[5000:])
+    np.testing.assert_allclose(hist.counts, np.histogram(y, bins=edges, weights=weights)[0])
+    with pytest.raises(ValueError):
+        hist.merge(histogram.Histogram(histogram.get_edges(-2, 2, 20)))
+
+
+@pytest.mark.parametrize('rule', histogram.BIN_RULES)
+def test_get_nbins(rule):
+    y = np.random.RandomState(3).gamma(2, 1, 20000)
+    q25, q75 = np.percentile(y, [25, 75])
+    nbins = histogram.get_nbins(rule, np.min(y), np.max(y), len(y), q75 - q25)
+    assert nbins == len(np.histogram_bin_edges(y, bins=rule)) - 1
+    assert histogram.get_nbins(rule, 1, 1, 10, 0) == 1
+
+
+def test_QuantileSketch():
+    y = np.random.RandomState(4).gamma(2, 1, 200000)
+    sketch = histogram.QuantileSketch(size=512)
+    for chunk in np.array_split(y, 300):
+        sketch.update(chunk)
+    assert sketch.n == len(y)
+    assert sum(len(values) for values in sketch.levels) < 512 * len(sketch.levels)
+    q = np.array([0.1, 0.25, 0.5, 0.75, 0.9])
+    ranks = np.searchsorted(np.sort(y), sketch.quantile(q)) / len(y)
+    np.testing.assert_allclose(ranks, q, atol=0.01)
+    # sketches of the halves of the data merged
+    merged = histogram.QuantileSketch(size=512).update(y[:100000])
+    merged.merge(histogram.QuantileSketch(size=512).update(y[100000:]))
+    assert merged.n == len(y)
+    ranks = np.searchsorted(np.sort(y), merged.quantile(q)) / len(y)
+    np.testing.assert_allclose(ranks, q, atol=0.01)
+    assert np.isnan(histogram.QuantileSketch().quantile(0.5))
+
+
+def test_bin_queries():
+    edges = histogram.get_edges(0, 10, 10)
+    counts = np.array([[1, 2, 3, 4, 5, 6, 7, 8, 9, 10], [5, 5, 5, 0, 5, 5, 5, 5, 5, 20]])
+    ratios = histogram.get_ratios(counts, edges, [9.5, 0, 4.2, 11], [0.5, 3, 1.9, 0.5])
+    np.testing.assert_allclose(ratios, [[10, 0.25, 2.5, np.nan], [4, np.inf, 1, np.nan]])
+    c_max, c_min = histogram.get_extrema(counts, edges, 3, 9)
+    np.testing.assert_array_equal(c_max, [9, 5])
+    np.testing.assert_array_equal(c_min, [4, 0])
+    np.testing.assert_allclose(histogram.get_n_ratio(counts, edges), [10, np.inf])
+    assert np.isnan(histogram.get_n_ratio(counts[0], edges, 20, 30))
@@ -0,0 +1,37 @@
+"""
+Unit tests for the binning of plot_histogram.
+"""
+import sys
+import pytest
+import numpy as np
+from MolSci_analysis import plot_histogram
+
+
+@pytest.fixture
+def colvar(tmp_path):
+    fname = tmp_path / 'COLVAR'
+    phi = np.random.RandomState(0).uniform(-np.pi, np.pi, 2000)
+    rows = '\n'.join('%d %.6f' % (t, p) for t, p in enumerate(phi))
+    fname.write_text('#! FIELDS time phi\n#! SET min_phi -pi\n#! SET max_phi pi\n%s\n' % rows)
+    return str(fname), phi
+
+
+def get_args(monkeypatch, *options):
+    monkeypatch.setattr(sys, 'argv', ['plot_histogram', '-nb', '20'] + list(options))
+    return plot_histogram.initialize()
+
+
+@pytest.mark.parametrize('chunked', [[], ['-cr', '300']])
+def test_analyze_file_Nr_bound(colvar, monkeypatch, chunked):
+    # the periodic domain is only used for wrapping the data bounded by -Nb
+    fname, phi = colvar
+    hist = plot_histogram.analyze_file(fname, get_args(monkeypatch, '-Nb', '-1', '1', *chunked))[1]
+    ref = plot_histogram.analyze_file(fname, get_args(monkeypatch, '-Nb', '-1', '1', '-pd', 'none', 'none',
+                                                      *chunked))[1]
+    bounded = phi[(phi > -1) & (phi < 1)]
+    np.testing.assert_allclose(hist.edges[[0, -1]], [np.min(bounded), np.max(bounded)], atol=1e-6)
+    np.testing.assert_array_equal(hist.counts, ref.counts)
+    assert np.isfinite(plot_histogram.get_n_ratio(hist.counts, hist.edges))
+    # without -Nb, the bins span the periodic domain
+    hist = plot_histogram.analyze_file(fname, get_args(monkeypatch, *chunked))[1]
+    np.testing.assert_allclose(hist.edges[[0, -1]], [-np.pi, np.pi])
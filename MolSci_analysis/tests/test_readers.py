@@ -0,0 +1,237 @@
+"""
+Unit tests for the shared reader of GROMACS/PLUMED output files.
+"""
+import importlib
+import pytest
+import numpy as np
+from MolSci_analysis import readers
+
+COLVAR = """#! FIELDS time cv bias
+#! SET min_cv -pi
+#! SET max_cv pi
+0.000000 0.1 0.0
+1.000000 0.2 0.5
+2.000000 0.3 1.0
+3.000000 0.4 1.5
+4.000000 0.5#! FIELDS time cv bias
+#! SET min_cv -pi
+#! SET max_cv pi
+3.000000 0.45 1.6
+4.000000 0.55 2.0
+PLUMED: some message
+5.000000 0.65 2.5
+6.0000"""
+
+XVG = """# This file was created by GROMACS
+@    title "Volume"
+@    xaxis  label "Time (ps)"
+@    yaxis  label "(nm^3)"
+@TYPE xy
+0.000 10.0
+2.000 11.0
+4.000 12.0
+"""
+
+
+def test_read_columns_restart(tmp_path):
+    fname = tmp_path / 'COLVAR'
+    fname.write_text(COLVAR)
+    for block_size in [16, 1000]:
+        data, header = readers.read_columns(str(fname), block_size=block_size)
+        assert header['fields'] == ['time', 'cv', 'bias']
+        assert header['set'] == {'min_cv': '-pi', 'max_cv': 'pi'}
+        np.testing.assert_allclose(data[:, 0], [0, 1, 2, 3, 4, 5])
+        np.testing.assert_allclose(data[:, 1], [0.1, 0.2, 0.3, 0.45, 0.55, 0.65])
+
+
+def test_read_columns_xvg(tmp_path):
+    fname = tmp_path / 'volume.xvg'
+    fname.write_text(XVG)
+    data, header = readers.read_columns(str(fname))
+    assert data.shape == (3, 2)
+    assert any('Time (ps)' in line for line in header['comments'])
+
+
+def test_read_columns_projection(tmp_path):
+    fname = tmp_path / 'COLVAR'
+    fname.write_text(COLVAR)
+    data, _ = readers.read_columns(str(fname), columns=['bias', 1])
+    assert data.shape == (6, 2)
+    np.testing.assert_allclose(data[:, 0], [0, 0.5, 1.0, 1.6, 2.0, 2.5])
+    np.testing.assert_allclose(data[:, 1], [0.1, 0.2, 0.3, 0.45, 0.55, 0.65])
+
+
+def test_read_rows_index(tmp_path):
+    fname = tmp_path / 'COLVAR'
+    fname.write_text(COLVAR)
+    ref, _ = readers.read_columns(str(fname), columns=['time', 'cv'])
+    index = readers.load_index(str(fname), every=2)
+    assert index['n_rows'] == len(ref)
+    assert (tmp_path / 'COLVAR.idx.npz').exists()
+    for start, stop in [(0, 6), (1, 4), (3, 5), (5, 6), (2, 2)]:
+        data, header = readers.read_rows(str(fname), start, stop, columns=['time', 'cv'], index=index)
+        assert header['fields'] == ['time', 'cv', 'bias']
+        np.testing.assert_allclose(data, ref[start:stop])
+
+
+def test_read_columns_cache(tmp_path, cache_dir, monkeypatch):
+    fname = tmp_path / 'COLVAR'
+    fname.write_text(COLVAR)
+    ref, _ = readers.read_columns(str(fname), columns=['cv'])
+    assert len(list(cache_dir.glob('*.npz'))) == 1
+
+    def fail(*args):
+        raise AssertionError('The file should not be parsed again')
+    monkeypatch.setattr(readers, '_parse_columns', fail)
+    data, header = readers.read_columns(str(fname), columns=['cv'])
+    np.testing.assert_array_equal(data, ref)
+    assert header['fields'] == ['time', 'cv', 'bias']
+
+    monkeypatch.setenv('MOLSCI_CACHE_SIZE', '1')  # every entry is evicted
+    readers.cache.save('dummy', {'data': ref}, {})
+    assert len(list(cache_dir.glob('*.npz'))) == 0
+
+
+def test_read_columns_append(tmp_path, monkeypatch):
+    fname = tmp_path / 'COLVAR'
+    n = COLVAR.index('3.000000 0.4')
+    for end in [n + 5, COLVAR.index('4.000000 0.55'), len(COLVAR)]:
+        with open(str(fname), 'a') as f:
+            f.write(COLVAR[fname.stat().st_size if fname.exists() else 0:end])
+        data, header = readers.read_columns(str(fname), columns=['cv'])
+        ref, _ = readers.read_columns(str(fname), columns=['cv'], use_cache=False)
+        np.testing.assert_array_equal(data, ref)
+
+    offsets = []
+    parse = readers._parse_columns
+
+    def record(fname, columns, block_size, data=None, state=None, *args):
+        offsets.append(state['offset'])
+        return parse(fname, columns, block_size, data, state, *args)
+    monkeypatch.setattr(readers, '_parse_columns', record)
+    with open(str(fname), 'a') as f:
+        f.write('00 0.7 2.8\n7.000000 0.75 3.0\n')
+    data, _ = readers.read_columns(str(fname), columns=['cv'])
+    assert offsets[0] == len(COLVAR) - len('6.0000')
+    np.testing.assert_allclose(data[:, 0], [0.1, 0.2, 0.3, 0.45, 0.55, 0.65, 0.7, 0.75])
+
+
+@pytest.mark.parametrize('stride', [1, 2])
+def test_read_columns_append_restart(tmp_path, stride):
+    # the parse stops after the FIELDS line of a restart, before its first data row
+    fname = tmp_path / 'COLVAR'
+    n = COLVAR.index('#! FIELDS', 1)
+    for end in [n + len('#! FIELDS time cv bias\n'), COLVAR.index('3.000000 0.45'), len(COLVAR)]:
+        with open(str(fname), 'a') as f:
+            f.write(COLVAR[fname.stat().st_size if fname.exists() else 0:end])
+        data, _ = readers.read_columns(str(fname), columns=['time', 'cv'], stride=stride)
+        ref, _ = readers.read_columns(str(fname), columns=['time', 'cv'], stride=stride, use_cache=False)
+        np.testing.assert_array_equal(data, ref)
+    assert np.all(np.diff(data[:, 0]) > 0)
+
+
+def test_merge_segments():
+    seg1 = [np.arange(0, 5.0)[:, None], np.arange(5, 10.0)[:, None]]
+    seg2 = [np.arange(8, 12.0)[:, None]]
+    seg3 = [np.arange(4, 6.0)[:, None], np.arange(6, 7.0)[:, None]]
+    data = readers.merge_segments([seg1, [], seg2, seg3])
+    np.testing.assert_array_equal(data[:, 0], [0, 1, 2, 3, 4, 5, 6])
+    assert data.flags['C_CONTIGUOUS']
+    assert readers.merge_segments([[]]).shape == (0, 0)
+
+
+@pytest.mark.parametrize('module, ext', [('gzip', '.gz'), ('bz2', '.bz2'), ('lzma', '.xz')])
+def test_read_compressed(tmp_path, module, ext):
+    fname = tmp_path / 'COLVAR'
+    fname.write_text(COLVAR)
+    ref, _ = readers.read_columns(str(fname), use_cache=False)
+    compressed = tmp_path / ('COLVAR' + ext)
+    compressed.write_bytes(importlib.import_module(module).compress(COLVAR.encode()))
+    for _ in range(2):  # parsed, then loaded from the cache
+        data, header = readers.read_columns(str(compressed), block_size=16)
+        np.testing.assert_array_equal(data, ref)
+    data, _ = readers.read_rows(str(compressed), 1, 4)
+    np.testing.assert_array_equal(data, ref[1:4])
+
+
+def test_iter_chunks(tmp_path):
+    fname = tmp_path / 'COLVAR'
+    fname.write_text(COLVAR)
+    ref, _ = readers.read_columns(str(fname), columns=['cv'], use_cache=False)
+    for chunk_rows in [1, 4, 100]:
+        chunks = list(readers.iter_chunks(str(fname), columns=['cv'], chunk_rows=chunk_rows))
+        assert all(len(c) == chunk_rows for c in chunks[:-1])
+        np.testing.assert_array_equal(np.concatenate(chunks), ref)
+    chunks = list(readers.iter_chunks(str(fname), columns=['cv'], chunk_rows=2, start=1, stop=5))
+    np.testing.assert_array_equal(np.concatenate(chunks), ref[1:5])
+
+
+def test_read_columns_window(tmp_path):
+    fname = tmp_path / 'COLVAR'
+    fname.write_text(COLVAR)
+    ref, _ = readers.read_columns(str(fname), use_cache=False)
+    data, _ = readers.read_columns(str(fname), begin=1, end=4.5, use_cache=False)
+    np.testing.assert_array_equal(data, ref[1:5])
+    data, _ = readers.read_columns(str(fname), stride=2, use_cache=False)
+    np.testing.assert_array_equal(data[:, 0], [0, 2, 3, 5])  # the stride restarts at each segment
+    data, _ = readers.read_columns(str(fname), begin=2, stride=2, block_size=40)
+    np.testing.assert_array_equal(data[:, 0], [2, 3, 5])
+    chunks = list(readers.iter_chunks(str(fname), chunk_rows=2, start=1, stop=5, begin=2, stride=2))
+    np.testing.assert_array_equal(np.concatenate(chunks)[:, 0], [2, 3])
+    # all the rows of the restart are before begin, but still replace the rows after its start
+    fname.write_text('#! FIELDS time cv\n' + ''.join('%s 0\n' % t for t in range(7))
+                     + '#! FIELDS time cv\n2 1\n3 1\n')
+    for begin, end, ref in [(4, None, []), (2.5, 5, [3]), (1, None, [1, 2, 3])]:
+        data, _ = readers.read_columns(str(fname), begin=begin, end=end, use_cache=False)
+        np.testing.assert_array_equal(data.reshape(-1, 2)[:, 0], ref)
+        chunks = list(readers.iter_chunks(str(fname), begin=begin, end=end))
+        np.testing.assert_array_equal(np.concatenate(chunks)[:, 0] if chunks else [], ref)
+
+
+@pytest.mark.parametrize('begin, end', [(None, 2.5), (1.5, 4.5), (3.5, None), (4, 4), (7, None)])
+def test_iter_chunks_seek(tmp_path, monkeypatch, begin, end):
+    # the time window is located by the checkpoints of the index instead of streaming the file
+    fname = tmp_path / 'COLVAR'
+    fname.write_text(COLVAR)
+    index = readers.build_index(str(fname), every=2)
+    for stride in [1, 2]:
+        ref, _ = readers.read_columns(str(fname), begin=begin, end=end, stride=stride, use_cache=False)
+        ref = ref.reshape(-1, 3)
+        chunks = list(readers.iter_chunks(str(fname), chunk_rows=2, begin=begin, end=end, stride=stride,
+                                          index=index))
+        np.testing.assert_array_equal(np.concatenate(chunks) if chunks else np.empty((0, 3)), ref)
+        data, _ = readers.read_rows(str(fname), 1, begin=begin, end=end, stride=stride, index=index)
+        np.testing.assert_array_equal(data, ref[int(begin is None):])
+
+    blocks = []
+    split = readers.split_block
+    monkeypatch.setattr(readers, 'split_block', lambda block: blocks.append(block) or split(block))
+    list(readers.iter_chunks(str(fname), begin=4.5, end=4.5, index=index))
+    assert b'0.000000' not in b''.join(blocks)
+
+
+def test_merge_walkers(tmp_path):
+    times = [[0, 1, 2, 3, 4, 5], [0, 2, 2.5, 3], [], [4, 6, 7]]
+    for w, t in enumerate(times):
+        text = '#! FIELDS time cv\n' + ''.join('%s %s\n' % (x, 10 * w + x) for x in t)
+        (tmp_path / ('COLVAR.%s' % (2 * w))).write_text(text)
+    (tmp_path / 'COLVAR.old').write_text('')
+    walkers, fnames = readers.find_walkers(str(tmp_path / 'COLVAR'))
+    assert walkers == [0, 2, 4, 6]
+    assert fnames[1] == str(tmp_path / 'COLVAR.2')
+    for chunk_rows in [1, 3, 100]:
+        chunks = list(readers.merge_walkers(fnames, chunk_rows=chunk_rows, walkers=walkers))
+        assert all(len(c) == chunk_rows for c in chunks[:-1])
+        data = np.concatenate(chunks)
+        ref = sorted((x, 2 * w) for w, t in enumerate(times) for x in t)
+        np.testing.assert_array_equal(data[:, [0, 2]], ref)
+        np.testing.assert_array_equal(data[:, 1], data[:, 0] + 5 * data[:, 2])
+
+
+def test_get_domain():
+    header = readers.parse_header(COLVAR.splitlines()[:3])
+    assert readers.get_domain(header, 'cv') == (-np.pi, np.pi)
+    assert readers.get_domain(header, 'bias') is None
+    assert readers.parse_value('2*pi') == 2 * np.pi
+    assert readers.parse_value('-1.5') == -1.5
+    assert readers.parse_domains(['-3', 'pi', 'none', 'none']) == [(-3, np.pi), None]
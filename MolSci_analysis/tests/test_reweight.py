@@ -0,0 +1,75 @@
+"""
+Unit tests for the reweighting of the frames of MetaD simulations.
+"""
+import pytest
+import numpy as np
+from MolSci_analysis import fes, reweight
+
+
+def test_interpolate():
+    grid = [np.linspace(0, 1, 11), np.linspace(-1, 1, 21)]
+    points = np.random.RandomState(0).uniform([0, -1], [1, 1], (100, 2))
+    x, y = np.meshgrid(*grid, indexing='ij')
+    results = reweight.interpolate(2 * x - 3 * y + 1, grid, points)
+    np.testing.assert_allclose(results, 2 * points[:, 0] - 3 * points[:, 1] + 1)
+    # points outside the grid take the values at the edges
+    assert reweight.interpolate(x, grid, np.array([[2.0, 0.0]]))[0] == 1
+    # periodic grid covering [0, 1)
+    grid = [np.arange(10) / 10]
+    values = np.cos(2 * np.pi * grid[0])
+    results = reweight.interpolate(values, grid, np.array([[0.95], [-0.05], [1.95]]), [True])
+    np.testing.assert_allclose(results, (values[0] + values[-1]) / 2)
+
+
+def test_get_ct():
+    bias = np.random.RandomState(0).uniform(0, 5, (3, 10, 8))
+    ct = reweight.get_ct(bias, 2.5, 10, stacked=True)
+    np.testing.assert_allclose(ct, [reweight.get_ct(b, 2.5, 10) for b in bias])
+    ref = 2.5 * np.log(np.sum(np.exp(bias[0] / 2.5 * 10 / 9)) / np.sum(np.exp(bias[0] / 2.5 / 9)))
+    np.testing.assert_allclose(ct[0], ref)
+    assert np.isclose(reweight.get_ct(np.full(5, 3.0), 2.5, 10), 3.0)  # a flat bias
+    assert np.isclose(reweight.get_ct(np.full(5, 3.0), 2.5, 1), 3.0)  # standard MetaD
+
+
+@pytest.mark.parametrize('batch_size', [reweight.BATCH_SIZE, 41 * 3])
+def test_iter_weights(monkeypatch, batch_size):
+    # a small batch size stacks only a few bias potentials at a time
+    monkeypatch.setattr(reweight, 'BATCH_SIZE', batch_size)
+    rng = np.random.RandomState(0)
+    grid = [np.linspace(-2, 2, 41)]
+    hills = {
+        'time': np.arange(20.0),
+        'center': rng.uniform(-1, 1, (20, 1)),
+        'sigma': np.full((20, 1), 0.3),
+        'height': np.full(20, 1.2),
+        'biasf': np.full(20, 6.0)
+    }
+    frames = np.column_stack([np.arange(0, 25, 0.5), grid[0][rng.randint(0, 41, 50)]])
+    kT = reweight.get_kT(300)
+    results = list(reweight.iter_weights(np.array_split(frames, 7), hills, grid, kT))
+    np.testing.assert_array_equal(np.concatenate([r[0] for r in results]), frames)
+    bias, ct, weights = [np.concatenate([r[k] for r in results]) for k in [1, 2, 3]]
+    for t, s, v, c in zip(frames[:, 0], frames[:, 1], bias, ct):
+        n = int(np.sum(hills['time'] < t))  # the Gaussians deposited before the frame
+        values = fes.sum_hills(hills, grid, bias=True, stop=n)
+        np.testing.assert_allclose(v, values[np.argmin(np.abs(grid[0] - s))], atol=1e-12)
+        np.testing.assert_allclose(c, reweight.get_ct(values, kT, 6.0), atol=1e-12)
+    np.testing.assert_allclose(weights, np.exp((bias - ct) / kT))
+
+
+def test_deposit_rows():
+    rng = np.random.RandomState(1)
+    grid = [np.linspace(-2, 2, 21), np.linspace(0, 1, 10, endpoint=False)]
+    center, sigma = rng.uniform([-1, 0], [1, 1], (30, 2)), np.full((30, 2), [0.4, 0.1])
+    height, rows = rng.uniform(0.5, 1, 30), np.sort(rng.randint(0, 4, 30))
+    stack = np.zeros((4, 21, 10))
+    fes.deposit(stack, grid, center, sigma, height, periodic=[False, True], rows=rows)
+    points = rng.uniform([-2, 0], [2, 1], (50, 2))
+    frames = rng.randint(0, 4, 50)
+    results = reweight.interpolate(stack, grid, points, [False, True], frames)
+    for k in range(4):
+        values = np.zeros((21, 10))
+        fes.deposit(values, grid, center[rows == k], sigma[rows == k], height[rows == k], periodic=[False, True])
+        np.testing.assert_allclose(stack[k], values)
+        np.testing.assert_allclose(results[frames == k],
+                                   reweight.interpolate(values, grid, points[frames == k], [False, True]))
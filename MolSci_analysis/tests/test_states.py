@@ -0,0 +1,96 @@
+"""
+Unit tests for the analysis of discrete states.
+"""
+import pytest
+import numpy as np
+from MolSci_analysis import states
+
+
+def test_count_states():
+    rng = np.random.RandomState(0)
+    traj = states.get_states(rng.randint(0, 12, 10000) + rng.uniform(-0.1, 0.1, 10000))
+    ref = np.array([np.sum(traj == i) for i in range(12)])
+    np.testing.assert_array_equal(states.count_states(traj), ref)
+    # chunk by chunk, with the counts extended for new states
+    counts = np.zeros(0, dtype=int)
+    for chunk in np.array_split(np.sort(traj), 7):
+        counts = states.count_states(chunk, counts)
+    np.testing.assert_array_equal(counts, ref)
+    with pytest.raises(ValueError):
+        states.get_states(np.array([0, -1]))
+
+
+def test_iter_states(tmp_path):
+    fnames = []
+    for k in range(2):
+        fname = str(tmp_path / ('COLVAR_%s' % k))
+        with open(fname, 'w') as f:
+            f.write('#! FIELDS time lambda\n')
+            for t in range(50):
+                f.write('%s %s\n' % (t, (t + k) % 5))
+        fnames.append(fname)
+    chunks = list(states.iter_states(fnames, 'lambda', chunk_rows=8))
+    assert len(chunks) == 14
+    time = np.concatenate([chunk[0] for chunk in chunks])
+    counts = np.zeros(0, dtype=int)
+    for _, traj in chunks:
+        counts = states.count_states(traj, counts)
+    np.testing.assert_array_equal(time, list(range(50)) * 2)
+    np.testing.assert_array_equal(counts, [20] * 5)
+
+
+def test_run_lengths():
+    values, starts, lengths = states.run_lengths(np.array([2, 2, 0, 1, 1, 1, 2]))
+    np.testing.assert_array_equal(values, [2, 0, 1, 2])
+    np.testing.assert_array_equal(starts, [0, 2, 3, 6])
+    np.testing.assert_array_equal(lengths, [2, 1, 3, 1])
+    assert len(states.run_lengths(np.zeros(0, dtype=int))[0]) == 0
+
+
+def test_TransitionCounter():
+    rng = np.random.RandomState(1)
+    # a random walk over 6 states with sticky steps
+    traj = np.clip(np.cumsum(rng.choice([-1, 0, 0, 0, 1], 5000)), -2, 3) + 2
+    traj = np.abs(traj)
+    time = np.arange(5000) * 2.0
+    # brute-force references
+    transitions = np.zeros((traj.max() + 1, traj.max() + 1), dtype=int)
+    for i, j in zip(traj[:-1], traj[1:]):
+        transitions[i, j] += 1
+    bounds = [0] + [k for k in range(1, 5000) if traj[k] != traj[k - 1]]
+    dwell_states = [traj[k] for k in bounds[1:-1]]
+    dwell_times = [time[b] - time[a] for a, b in zip(bounds[1:-1], bounds[2:])]
+    arrivals, last = [], None
+    for k in bounds:
+        if traj[k] in (0, 5) and traj[k] != last:
+            arrivals.append((traj[k], time[k]))
+            last = traj[k]
+    t_lower = [t for s, t in arrivals if s == 0]
+    for n_chunks in (1, 7, 1000):
+        counter = states.TransitionCounter(ends=(0, 5))
+        for t, chunk in zip(np.array_split(time, n_chunks), np.array_split(traj, n_chunks)):
+            counter.update(t, chunk)
+        np.testing.assert_array_equal(counter.transitions, transitions)
+        np.testing.assert_array_equal(counter.get_dwell_times()[0], dwell_states)
+        np.testing.assert_allclose(counter.get_dwell_times()[1], dwell_times)
+        np.testing.assert_allclose(counter.get_round_trips(), np.diff(t_lower))
+    mean = counter.get_mean_dwell_times()
+    assert np.isclose(mean[3], np.mean([t for s, t in zip(dwell_states, dwell_times) if s == 3]))
+
+
+def test_CheckpointCounter():
+    rng = np.random.RandomState(2)
+    traj = np.minimum(np.arange(1000) // 100, rng.randint(0, 8, 1000))
+    time = 10 + np.arange(1000) * 0.5
+    times_ref = list(10 + np.arange(1, 10) * 50.0) + [time[-1]]
+    counts_ref = [np.bincount(traj[time <= t], minlength=8) for t in times_ref]
+    for n_chunks in (1, 3, 400):
+        counter = states.CheckpointCounter(50)
+        for t, chunk in zip(np.array_split(time, n_chunks), np.array_split(traj, n_chunks)):
+            counter.update(t, chunk)
+        times, counts = counter.get_counts()
+        np.testing.assert_allclose(times, times_ref)
+        np.testing.assert_array_equal(counts, counts_ref)
+    n_ratio, c_max, c_min = states.get_flatness(counts)
+    np.testing.assert_array_equal(c_max, np.max(counts_ref, axis=1))
+    assert np.isinf(n_ratio[0]) and n_ratio[-1] == c_max[-1] / c_min[-1]
@@ -0,0 +1,34 @@
+"""
+Unit tests for the streaming summary statistics.
+"""
+import numpy as np
+from MolSci_analysis.stats import RunningStats
+
+
+def test_RunningStats():
+    rng = np.random.RandomState(0)
+    x, y = np.arange(10000) * 0.1, 1e6 + rng.normal(0, 1, 10000)  # large offset for the cancellation
+    ref = RunningStats().update(y, x).find_closest(y, x)
+    assert ref.n == len(y)
+    assert np.isclose(ref.mean, np.mean(y), rtol=1e-15)
+    assert np.isclose(ref.std, np.std(y), rtol=1e-10)
+    assert np.isclose(ref.rmsf, np.std(y) / np.mean(y))
+    assert ref.x_max == x[np.argmax(y)] and ref.x_min == x[np.argmin(y)]
+    assert ref.y_avg == y[np.argmin(np.abs(y - np.mean(y)))]
+    # chunk by chunk, and merged from the stats of two halves
+    chunked = RunningStats()
+    for xc, yc in zip(np.array_split(x, 37), np.array_split(y, 37)):
+        chunked.update(yc, xc)
+    merged = RunningStats().update(y[:4000], x[:4000]).merge(RunningStats().update(y[4000:], x[4000:]))
+    for stats in (chunked, merged):
+        for xc, yc in zip(np.array_split(x, 5), np.array_split(y, 5)):
+            stats.find_closest(yc, xc)
+        assert stats.n == ref.n
+        assert np.isclose(stats.mean, ref.mean, rtol=1e-15) and np.isclose(stats.std, ref.std, rtol=1e-10)
+        assert (stats.max, stats.x_max, stats.min, stats.x_min) == (ref.max, ref.x_max, ref.min, ref.x_min)
+        assert (stats.x_avg, stats.y_avg) == (ref.x_avg, ref.y_avg)
+    # the first of tied extrema
+    stats = RunningStats().update(np.array([1.0, 3.0]), np.array([0, 1]))
+    stats.update(np.array([3.0, 1.0]), np.array([2, 3]))
+    assert stats.x_max == 1 and stats.x_min == 0
+    assert np.isnan(RunningStats().std)
@@ -53,7 +53,9 @@ setup(
             'COLVAR_hist = MolSci_analysis.COLVAR_hist:main',
             'bias_evolution = MolSci_analysis.bias_evolution:main',
             'convert_energy = MolSci_analysis.convert_energy:main',
-            'combine_plots = MolSci_analysis.combine_plots:main'
+            'combine_plots = MolSci_analysis.combine_plots:main',
+            'sum_hills = MolSci_analysis.sum_hills:main',
+            'autocorr = MolSci_analysis.autocorr:main'
         ],
     },
 